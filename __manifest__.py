@@ -11,7 +11,9 @@
     'data': [
         'security/security.xml',
         'security/ir.model.access.csv',
+        'data/ir_cron_data.xml',
         'views/faculties_view.xml',
+        'views/audit_log_view.xml',
         'views/students_view.xml',
         'views/departments_view.xml',
         'views/courses_view.xml',
@@ -37,13 +39,25 @@
         'views/academic_position_entry_view.xml',
         'views/lecturer_view.xml',
         'views/academic_fee_entries_view.xml',
+        'views/fee_reprice_view.xml',
         'views/academic_fees_view.xml',
         'views/academic_payment_entries_view.xml',
         'views/payment_types_view.xml',
         'views/student_ledgers_view.xml',
         'views/legacy_payment_view.xml',
+        'views/student_debtor_report_view.xml',
+        'views/instrumentation_view.xml',
+        'views/import_run_view.xml',
+        'views/student_transcript_view.xml',
+        'views/student_result_publication_view.xml',
+        'views/ledger_close_view.xml',
+        'views/surcharge_view.xml',
+        'views/ledger_audit_view.xml',
         'wizard/academic_payment_wizard_view.xml',
         'wizard/ledger_entry_wizard_view.xml',
+        'wizard/student_photo_wizard_view.xml',
+        'wizard/student_classification_wizard_view.xml',
+        'wizard/student_score_sheet_wizard_view.xml',
         'report/reports.xml',
         'report/student_ledger_report_template.xml',
         'report/student_ledger_detail_report_template.xml',
@@ -51,6 +65,7 @@
         'report/payment_entry_report_template.xml',
         'report/email_templates.xml',
         'report/ledger_entry_by_name_report_template.xml',
+        'report/student_transcript_report_template.xml',
         'views/menu.xml'
     ],
     'demo': [
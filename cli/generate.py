@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+import argparse
+import logging
+import os
+import sys
+
+import odoo
+from odoo.cli import Command
+from odoo.tools import config
+
+_logger = logging.getLogger(__name__)
+
+
+class QuickledgerGenerate(Command):
+    """ Generates a synthetic university population for load and benchmark work """
+
+    def run(self, cmdargs):
+        parser = argparse.ArgumentParser(prog="%s quickledgergenerate" % os.path.basename(sys.argv[0]),
+                                         description=self.__doc__)
+        parser.add_argument('--students-per-programme', type=int, default=100,
+                            help="Students admitted into every programme (default 100)")
+        parser.add_argument('--sessions', type=int, default=4,
+                            help="Most recent sessions to register the students in (default 4)")
+        parser.add_argument('--courses-per-level', type=int, default=6,
+                            help="Courses per level and semester for programmes without a catalogue")
+        parser.add_argument('--paid-ratio', type=float, default=0.6,
+                            help="Share of fee entries settled in full (default 0.6)")
+        parser.add_argument('--staging-rows', type=int, default=0,
+                            help="New rows to queue in each staging import table")
+        parser.add_argument('--programmes', default='',
+                            help="Comma separated programme ids, all programmes by default")
+        parser.add_argument('--chunk', type=int, default=5,
+                            help="Programmes generated, and committed, per transaction")
+        parser.add_argument('--prefix', default='GEN', help="Prefix of the generated matriculation numbers")
+        parser.add_argument('--seed', type=float, default=0.42, help="Random seed between -1 and 1")
+        opts, unknown = parser.parse_known_args(cmdargs)
+
+        config.parse_config(unknown)
+        dbname = config['db_name']
+        if not dbname:
+            sys.exit("A database is required, use -d <database>")
+
+        registry = odoo.registry(dbname)
+        with odoo.api.Environment.manage(), registry.cursor() as cr:
+            env = odoo.api.Environment(cr, odoo.SUPERUSER_ID, {})
+            Programme = env['quickledger.programme']
+            if opts.programmes:
+                programmes = Programme.browse([int(p) for p in opts.programmes.split(",")]).exists()
+            else:
+                programmes = Programme.search([])
+            totals = {}
+            # Seeded once, the random sequence of the connection runs on across the chunks instead of repeating
+            cr.execute("SELECT setseed(%s)", (opts.seed,))
+            starts = range(0, len(programmes), opts.chunk)
+            for number, index in enumerate(starts):
+                # The staging rows are shared out between the chunks, the first ones taking the remainder
+                staging_rows = opts.staging_rows // len(starts) + (number < opts.staging_rows % len(starts))
+                summary = env['quickledger.data.generator'].generate(
+                    programmes=programmes[index:index + opts.chunk],
+                    students_per_programme=opts.students_per_programme,
+                    sessions=opts.sessions,
+                    courses_per_level=opts.courses_per_level,
+                    paid_ratio=opts.paid_ratio,
+                    staging_rows=staging_rows,
+                    prefix=opts.prefix,
+                    seed=None)
+                cr.commit()
+                for key, value in summary.items():
+                    totals[key] = totals.get(key, 0) + value
+                _logger.info("Programmes %s/%s generated", min(index + opts.chunk, len(programmes)),
+                             len(programmes))
+            print(", ".join("%s: %s" % (key, totals[key]) for key in sorted(totals)))
@@ -1,3 +1,14 @@
 # -*- coding: utf-8 -*-
 
-from . import models
\ No newline at end of file
+from . import instrumentation
+from . import import_run
+from . import audit_log
+from . import models
+from . import student_debtor_report
+from . import data_generator
+from . import student_transcript
+from . import student_result_publication
+from . import ledger_close
+from . import surcharge
+from . import fee_reprice
+from . import ledger_audit
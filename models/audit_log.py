@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+from contextlib import contextmanager
+from odoo import models, fields, api
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+@contextmanager
+def buffered_audit(env, operation):
+    """ Runs a bulk operation with chatter tracking off and yields the environment to run it in
+
+    Records of the audited models remember their old values the first time they change, the new values are read
+    once when the operation ends and the differences written to the audit log in one INSERT. Nested operations
+    share the buffer of the outermost one.
+    """
+    if env.context.get('audit_buffer') is not None:
+        yield env
+        return
+    buffer = {}
+    yield env(context=dict(env.context, tracking_disable=True, audit_buffer=buffer))
+    env['quickledger.audit.log']._write_buffer(buffer, operation)
+
+
+class AuditMixin(models.AbstractModel):
+    """ Old values of the audited fields kept in the audit buffer of a bulk operation, see ``buffered_audit``
+
+    Records created by the operation are logged with empty old values.
+    """
+    _name = 'quickledger.audit.mixin'
+    _description = 'Buffered Audit Mixin'
+
+    _audit_fields = []
+    _audit_student_field = 'student_id'
+
+    def _audit_value(self, name):
+        """ The value of a field as the audit log shows it """
+        field = self._fields[name]
+        value = self[name]
+        if field.type == 'many2one':
+            return value.display_name or ''
+        if field.type == 'boolean':
+            return 'Yes' if value else 'No'
+        if field.type == 'selection':
+            return dict(field._description_selection(self.env)).get(value, '') if value else ''
+        return str(value) if value or value == 0 else ''
+
+    def _audit_snapshot(self, values=None):
+        """ Keeps the current values of the records not yet in the audit buffer
+
+        Set-based updates that know the old values already, such as an approval, pass them in ``values``.
+        """
+        buffer = self.env.context.get('audit_buffer')
+        if buffer is None:
+            return
+        for record in self:
+            key = (self._name, record.id)
+            if key not in buffer:
+                buffer[key] = dict(values) if values else {name: record._audit_value(name)
+                                                            for name in self._audit_fields}
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super(AuditMixin, self).create(vals_list)
+        # New records had no values, so every audited field they are created with is logged
+        records._audit_snapshot({name: '' for name in self._audit_fields})
+        return records
+
+    def write(self, vals):
+        self._audit_snapshot()
+        return super(AuditMixin, self).write(vals)
+
+
+class AuditLog(models.Model):
+    """ Old and new values of the audited fields changed by bulk operations, one row per record and field """
+    _name = 'quickledger.audit.log'
+    _description = 'Audit Log'
+    _order = 'date desc, id desc'
+    _rec_name = 'operation'
+    _log_access = False
+
+    date = fields.Datetime('Date', readonly=True, index=1)
+    user_id = fields.Many2one('res.users', 'User', readonly=True)
+    operation = fields.Char('Operation', readonly=True)
+    student_id = fields.Many2one('quickledger.student', 'Student', readonly=True, index=1, ondelete='cascade')
+    model = fields.Char('Model', readonly=True)
+    res_id = fields.Integer('Record', readonly=True, index=1)
+    field_name = fields.Char('Field', readonly=True)
+    old_value = fields.Text('Old Value', readonly=True)
+    new_value = fields.Text('New Value', readonly=True)
+
+    @api.model
+    def _write_buffer(self, buffer, operation):
+        """ Compares the buffered old values with the current ones and logs the differences in one INSERT """
+        snapshots = {}
+        for (model, res_id), old in buffer.items():
+            snapshots.setdefault(model, {})[res_id] = old
+        rows = []
+        for model, olds in snapshots.items():
+            self.env[model].flush()
+            for record in self.env[model].browse(list(olds)).exists():
+                student_id = record[record._audit_student_field].id or None
+                for name, old_value in olds[record.id].items():
+                    new_value = record._audit_value(name)
+                    if new_value != old_value:
+                        rows.append((model, record.id, student_id, record._fields[name].string, old_value, new_value))
+        if rows:
+            self.env.cr.execute("""
+                INSERT INTO quickledger_audit_log (date, user_id, operation, model, res_id, student_id, field_name,
+                                                   old_value, new_value)
+                SELECT now() at time zone 'UTC', %s, %s, v.*
+                  FROM unnest(%s::varchar[], %s::int[], %s::int[], %s::varchar[], %s::text[], %s::text[]) AS v
+            """, [self.env.uid, operation] + [list(column) for column in zip(*rows)])
+            _logger.info("%s: %s changes of %s records audited", operation, len(rows), len(buffer))
+        return len(rows)
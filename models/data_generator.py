@@ -0,0 +1,428 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api
+import logging
+import time
+
+_logger = logging.getLogger(__name__)
+
+AUDIT_COLUMNS = "create_uid, create_date, write_uid, write_date"
+AUDIT_VALUES = "%(uid)s, %(now)s, %(uid)s, %(now)s"
+
+
+class DataGenerator(models.AbstractModel):
+    """ Builds a synthetic university population for load and benchmark work.
+
+    Programmes, levels, sessions and the faculty fee schedules already in the database (typically the
+    demo data) are used as the reference structure; students, registrations, fee entries, payments,
+    course results and staging import rows are written with set-based SQL and the stored totals are
+    filled in with aggregates, so no record goes through the ORM one at a time.
+    """
+    _name = 'quickledger.data.generator'
+    _description = 'Synthetic Data Generator'
+
+    @api.model
+    def _get_school(self):
+        School = self.env['quickledger.school']
+        return School.search([('name', '=', 'Nnamdi Azikiwe University')], limit=1) or School.search([], limit=1)
+
+    @api.model
+    def generate(self, programmes=None, students_per_programme=100, sessions=4, courses_per_level=6,
+                 paid_ratio=0.6, staging_rows=0, prefix='GEN', seed=0.42):
+        """ Generates students for the given programmes (all of them by default) and returns a summary
+
+        ``seed`` reseeds the random sequence of the connection, None carries on with it, as a caller generating
+        in several calls on one connection does after seeding it once.
+        """
+        started = time.time()
+        programmes = programmes if programmes is not None else self.env['quickledger.programme'].search([])
+        session_ids = self.env['academic.session'].search([], order='sequence desc', limit=sessions).ids[::-1]
+        semester = self.env['quickledger.semester'].search([('code', '=', '1st')], limit=1) or \
+            self.env['quickledger.semester'].search([], limit=1)
+        school = self._get_school()
+        if not programmes or not session_ids or not semester:
+            raise ValueError("Programmes, sessions and semesters must exist before generating data")
+
+        self.env['base'].flush()
+        params = {'uid': self.env.uid,
+                  'now': fields.Datetime.now(),
+                  'programmes': tuple(programmes.ids),
+                  'count': students_per_programme,
+                  'sessions': session_ids,
+                  'nsessions': len(session_ids),
+                  'semester': semester.id,
+                  'school': school.id or None,
+                  'scheme': school.grading_scheme_id.id or None,
+                  'courses': courses_per_level,
+                  'paid_ratio': paid_ratio,
+                  'staging': staging_rows,
+                  'staging_per_programme': -(-staging_rows // len(programmes)),
+                  'prefix': prefix}
+        cr = self.env.cr
+        if seed is not None:
+            cr.execute("SELECT setseed(%s)", (seed,))
+        summary = {'students': self._generate_students(params)}
+        self._generate_books(params)
+        summary['courses'] = self._generate_courses(params)
+        summary['registrations'] = self._generate_registrations(params)
+        summary['fee_entries'] = self._generate_fee_entries(params)
+        summary['payments'] = self._generate_payments(params)
+        summary['results'] = self._generate_results(params)
+        self._update_totals(params)
+        if staging_rows:
+            summary['staging_rows'] = self._generate_staging_rows(params)
+        self.env['base'].invalidate_cache()
+        summary['seconds'] = round(time.time() - started, 2)
+        _logger.info("Generated %s", summary)
+        return summary
+
+    def _generate_students(self, params):
+        cr = self.env.cr
+        cr.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS quickledger_gen_student (id integer PRIMARY KEY);
+            TRUNCATE quickledger_gen_student;
+        """)
+        cr.execute("""
+            WITH new_students AS (
+                INSERT INTO quickledger_student (name, matriculation_number, programme_id, department_id,
+                                                 entry_status_id, diploma_id, faculty_id, school_id,
+                                                 number_of_certificates, balance_brought_forward, {audit})
+                     SELECT initcap(%(prefix)s) || ' Student ' || p.id || '-' || g,
+                            %(prefix)s || '/' || p.id || '/' || g,
+                            p.id, p.department_id, p.entry_status_id, p.diploma_id, p.faculty_id, %(school)s,
+                            '1', 0, {values}
+                       FROM quickledger_programme p
+                 CROSS JOIN generate_series(1, %(count)s) g
+                      WHERE p.id IN %(programmes)s
+                ON CONFLICT (matriculation_number) DO NOTHING
+                  RETURNING id)
+            INSERT INTO quickledger_gen_student (id) SELECT id FROM new_students
+        """.format(audit=AUDIT_COLUMNS, values=AUDIT_VALUES), params)
+        count = cr.rowcount
+        cr.execute("ANALYZE quickledger_gen_student")
+        return count
+
+    def _generate_books(self, params):
+        cr = self.env.cr
+        cr.execute("""
+            INSERT INTO student_ledger (student_id, matriculation_number, programme_id, school_id, opening_balance,
+                                        balance_carried_forward, current_charges, total_amount_due,
+                                        total_amount_paid, total_balance, {audit})
+                 SELECT s.id, s.matriculation_number, s.programme_id, %(school)s, 0, 0, 0, 0, 0, 0, {values}
+                   FROM quickledger_student s
+                   JOIN quickledger_gen_student g ON g.id = s.id
+        """.format(audit=AUDIT_COLUMNS, values=AUDIT_VALUES), params)
+        cr.execute("""
+            UPDATE quickledger_student s
+               SET ledger_id = l.id
+              FROM student_ledger l, quickledger_gen_student g
+             WHERE g.id = s.id AND l.student_id = s.id
+        """)
+        cr.execute("""
+            INSERT INTO student_result (student_id, programme_id, cgpa, {audit})
+                 SELECT s.id, s.programme_id, 0, {values}
+                   FROM quickledger_student s
+                   JOIN quickledger_gen_student g ON g.id = s.id
+        """.format(audit=AUDIT_COLUMNS, values=AUDIT_VALUES), params)
+
+    def _generate_courses(self, params):
+        """ Programmes without a catalogue get courses_per_level courses per level and semester """
+        cr = self.env.cr
+        cr.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS quickledger_gen_level (id integer, type_id integer, sequence integer);
+            TRUNCATE quickledger_gen_level;
+            INSERT INTO quickledger_gen_level
+                 SELECT DISTINCT ON (type_id, sequence) id, type_id, sequence
+                   FROM quickledger_level
+               ORDER BY type_id, sequence, id;
+        """)
+        cr.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS quickledger_gen_course (course_id integer, programme_id integer,
+                                                                    level_id integer, semester_id integer,
+                                                                    name varchar, code varchar);
+            TRUNCATE quickledger_gen_course;
+            INSERT INTO quickledger_gen_course (programme_id, level_id, semester_id, name, code)
+                 SELECT p.id, lvl.id, sem.id,
+                        'Generated Course ' || p.id || '-' || lvl.sequence || sem.sequence || n,
+                        'G' || p.id || ' ' || lvl.sequence || sem.sequence || lpad(n::text, 2, '0')
+                   FROM quickledger_programme p
+                   JOIN quickledger_diploma d ON d.id = p.diploma_id
+                   JOIN quickledger_gen_level lvl ON lvl.type_id = d.type_id AND lvl.sequence <= p.duration
+             CROSS JOIN quickledger_semester sem
+             CROSS JOIN generate_series(1, %(courses)s) n
+                  WHERE p.id IN %(programmes)s
+                    AND NOT EXISTS (SELECT 1 FROM programme_course_entry c WHERE c.programme_id = p.id);
+        """, params)
+        cr.execute("""
+            WITH new_courses AS (
+                INSERT INTO programme_course (name, code, semester_id, diploma_id, {audit})
+                     SELECT c.name, c.code, c.semester_id, p.diploma_id, {values}
+                       FROM quickledger_gen_course c
+                       JOIN quickledger_programme p ON p.id = c.programme_id
+                  RETURNING id, code)
+            UPDATE quickledger_gen_course c SET course_id = n.id FROM new_courses n WHERE n.code = c.code
+        """.format(audit=AUDIT_COLUMNS, values=AUDIT_VALUES), params)
+        cr.execute("""
+            INSERT INTO programme_course_entry (name, code, semester_id, units, course_id, programme_id, level_id,
+                                                {audit})
+                 SELECT name, code, semester_id, 2 + (random() * 2)::int, course_id, programme_id, level_id, {values}
+                   FROM quickledger_gen_course
+        """.format(audit=AUDIT_COLUMNS, values=AUDIT_VALUES), params)
+        return cr.rowcount
+
+    def _generate_registrations(self, params):
+        """ One registration per student and session, climbing a level each session """
+        cr = self.env.cr
+        cr.execute("""
+            INSERT INTO student_registration (entry_date, student_id, matriculation_number, level_id, session_id,
+                                              semester_id, programme_id, faculty_id, department_id, diploma_id,
+                                              state, total_credit_units, total_charges, gpa, {audit})
+                 SELECT COALESCE(sess.date_start, (CURRENT_DATE - (%(nsessions)s - ss.k) * 365)::date),
+                        s.id, s.matriculation_number, lvl.id, sess.id, %(semester)s, s.programme_id, s.faculty_id,
+                        s.department_id, s.diploma_id, 'Approved', 0, 0, 0, {values}
+                   FROM quickledger_gen_student g
+                   JOIN quickledger_student s ON s.id = g.id
+                   JOIN quickledger_programme p ON p.id = s.programme_id
+                   JOIN quickledger_diploma d ON d.id = s.diploma_id
+             CROSS JOIN unnest(%(sessions)s::int[]) WITH ORDINALITY AS ss(id, k)
+                   JOIN academic_session sess ON sess.id = ss.id
+                   JOIN quickledger_gen_level lvl ON lvl.type_id = d.type_id AND lvl.sequence = ss.k
+                  WHERE ss.k <= p.duration
+        """.format(audit=AUDIT_COLUMNS, values=AUDIT_VALUES), params)
+        return cr.rowcount
+
+    def _generate_fee_entries(self, params):
+        """ Applies the faculty classification fee schedule of each registration's level """
+        cr = self.env.cr
+        cr.execute("""
+            INSERT INTO academic_fee_entry (fee_id, description, type_id, amount_due, amount_paid, balance,
+                                            entry_date, registration_id, ledger_id, student_id, programme_id,
+                                            session_id, school_id, level_id, faculty_id, department_id, {audit})
+                 SELECT f.id, f.description, f.type_id, f.amount, 0, f.amount, r.entry_date, r.id, s.ledger_id,
+                        r.student_id, r.programme_id, r.session_id, COALESCE(f.school_id, %(school)s), r.level_id,
+                        r.faculty_id, r.department_id, {values}
+                   FROM student_registration r
+                   JOIN quickledger_gen_student g ON g.id = r.student_id
+                   JOIN quickledger_student s ON s.id = r.student_id
+                   JOIN quickledger_faculty fa ON fa.id = r.faculty_id
+                   JOIN academic_fee f ON f.classification_id = fa.classification_id AND f.level_id = r.level_id
+        """.format(audit=AUDIT_COLUMNS, values=AUDIT_VALUES), params)
+        return cr.rowcount
+
+    def _generate_payments(self, params):
+        """ Settles fees in full, in half or not at all and records one payment per registration """
+        cr = self.env.cr
+        cr.execute("""
+            UPDATE academic_fee_entry e
+               SET amount_paid = round(e.amount_due * p.fraction, 2),
+                   balance = e.amount_due - round(e.amount_due * p.fraction, 2),
+                   payment_date = e.entry_date + 30
+              FROM (SELECT e2.id,
+                           CASE WHEN random() < %(paid_ratio)s THEN 1.0
+                                WHEN random() < 0.5 THEN 0.5
+                                ELSE 0.0 END AS fraction
+                      FROM academic_fee_entry e2
+                      JOIN quickledger_gen_student g ON g.id = e2.student_id) p
+             WHERE p.id = e.id
+        """, params)
+        cr.execute("""
+            WITH paid AS (
+                SELECT e.registration_id, SUM(e.amount_paid) AS amount, SUM(e.amount_due) AS amount_due,
+                       MAX(e.payment_date) AS payment_date
+                  FROM academic_fee_entry e
+                  JOIN quickledger_gen_student g ON g.id = e.student_id
+                 WHERE e.amount_paid > 0
+              GROUP BY e.registration_id),
+            new_payments AS (
+                INSERT INTO academic_payment_entry (student_id, programme_id, faculty_id, department_id, ledger_id,
+                                                    level_id, session_id, amount, teller_number, payment_date,
+                                                    school_id, amount_due, balance, {audit})
+                     SELECT r.student_id, r.programme_id, r.faculty_id, r.faculty_id, s.ledger_id, r.level_id,
+                            r.session_id, paid.amount, 'GEN' || r.id, paid.payment_date, %(school)s,
+                            paid.amount_due, paid.amount_due - paid.amount, {values}
+                       FROM paid
+                       JOIN student_registration r ON r.id = paid.registration_id
+                       JOIN quickledger_student s ON s.id = r.student_id
+                  RETURNING id, student_id, session_id)
+            INSERT INTO payment_fee_rel (payment_id, fee_id)
+                 SELECT n.id, e.id
+                   FROM new_payments n
+                   JOIN academic_fee_entry e ON e.student_id = n.student_id AND e.session_id = n.session_id
+                  WHERE e.amount_paid > 0
+        """.format(audit=AUDIT_COLUMNS, values=AUDIT_VALUES), params)
+        cr.execute("""
+            SELECT count(*) FROM academic_payment_entry p JOIN quickledger_gen_student g ON g.id = p.student_id
+        """)
+        return cr.fetchone()[0]
+
+    def _generate_results(self, params):
+        """ Registers every catalogue course of the level and grades a random score """
+        cr = self.env.cr
+        cr.execute("""
+            INSERT INTO student_registration_entry (registration_id, student_id, programme_id, level_id, session_id,
+                                                    course_id, semester_id, is_brought_forward, {audit})
+                 SELECT r.id, r.student_id, r.programme_id, c.level_id, r.session_id, c.id, c.semester_id, false,
+                        {values}
+                   FROM student_registration r
+                   JOIN quickledger_gen_student g ON g.id = r.student_id
+                   JOIN programme_course_entry c ON c.programme_id = r.programme_id AND c.level_id = r.level_id
+                ON CONFLICT DO NOTHING
+        """.format(audit=AUDIT_COLUMNS, values=AUDIT_VALUES), params)
+        cr.execute("""
+            INSERT INTO student_result_entry (entry_date, student_id, programme_id, reg_number, student_result_id,
+                                              session_id, semester_id, course_id, level_id, course_name,
+                                              course_code, units, ca_score, test_score, practicals_score, score,
+                                              school_id, registration_id, status, {audit})
+                 SELECT r.entry_date, r.student_id, r.programme_id, r.matriculation_number, b.id, r.session_id,
+                        c.semester_id, c.id, c.level_id, c.name, c.code, c.units, floor(random() * 61),
+                        floor(random() * 31), 0, 0, %(school)s, r.id, 'Approved', {values}
+                   FROM student_registration_entry re
+                   JOIN quickledger_gen_student g ON g.id = re.student_id
+                   JOIN student_registration r ON r.id = re.registration_id
+                   JOIN programme_course_entry c ON c.id = re.course_id
+                   JOIN student_result b ON b.student_id = r.student_id
+                ON CONFLICT DO NOTHING
+        """.format(audit=AUDIT_COLUMNS, values=AUDIT_VALUES), params)
+        count = cr.rowcount
+        cr.execute("""
+            UPDATE student_result_entry e
+               SET score = e.ca_score + e.test_score + e.practicals_score
+              FROM quickledger_gen_student g
+             WHERE g.id = e.student_id
+        """)
+        if params['scheme']:
+            cr.execute("""
+                UPDATE student_result_entry e
+                   SET grade_id = gr.id, points = gr.point, is_pass_mark = gr.is_pass_mark,
+                       points_obtained = gr.point * e.units
+                  FROM quickledger_grade gr, quickledger_gen_student g
+                 WHERE g.id = e.student_id
+                   AND gr.grading_scheme_id = %(scheme)s
+                   AND e.score BETWEEN gr.min_grade AND gr.max_grade
+            """, params)
+        return count
+
+    def _update_totals(self, params):
+        """ Fills the stored totals the ORM computes would have written """
+        cr = self.env.cr
+        cr.execute("""
+            UPDATE student_registration r
+               SET total_charges = x.amount_due
+              FROM (SELECT e.registration_id, SUM(e.amount_due) AS amount_due
+                      FROM academic_fee_entry e
+                      JOIN quickledger_gen_student g ON g.id = e.student_id
+                  GROUP BY e.registration_id) x
+             WHERE x.registration_id = r.id
+        """)
+        cr.execute("""
+            UPDATE student_registration r
+               SET total_credit_units = x.units,
+                   gpa = COALESCE(trunc((x.points / NULLIF(x.approved_units, 0))::numeric, 2), 0)
+              FROM (SELECT e.registration_id, SUM(e.units) AS units,
+                           SUM(e.points * e.units) FILTER (WHERE e.status = 'Approved') AS points,
+                           SUM(e.units) FILTER (WHERE e.status = 'Approved') AS approved_units
+                      FROM student_result_entry e
+                      JOIN quickledger_gen_student g ON g.id = e.student_id
+                  GROUP BY e.registration_id) x
+             WHERE x.registration_id = r.id
+        """)
+        cr.execute("""
+            UPDATE student_result b
+               SET cgpa = x.cgpa,
+                   honours_id = (SELECT h.id FROM quickledger_honour h
+                                  WHERE x.cgpa BETWEEN h.lower_bound AND h.upper_bound
+                               ORDER BY h.id LIMIT 1)
+              FROM (SELECT e.student_result_id,
+                           trunc((SUM(e.points * e.units) / NULLIF(SUM(e.units), 0))::numeric, 2) AS cgpa
+                      FROM student_result_entry e
+                      JOIN quickledger_gen_student g ON g.id = e.student_id
+                     WHERE e.status = 'Approved'
+                  GROUP BY e.student_result_id) x
+             WHERE x.student_result_id = b.id AND x.cgpa IS NOT NULL
+        """)
+        cr.execute("""
+            UPDATE student_ledger l
+               SET total_amount_due = l.opening_balance + COALESCE(f.amount_due, 0),
+                   total_amount_paid = COALESCE(p.amount, 0),
+                   total_balance = COALESCE(f.balance, 0),
+                   current_charges = COALESCE(f.current_charges, 0)
+              FROM quickledger_gen_student g
+         LEFT JOIN (SELECT e.student_id, SUM(e.amount_due) AS amount_due, SUM(e.balance) AS balance,
+                           SUM(e.amount_due) FILTER (WHERE e.session_id = %(last_session)s) AS current_charges
+                      FROM academic_fee_entry e
+                      JOIN quickledger_gen_student g2 ON g2.id = e.student_id
+                  GROUP BY e.student_id) f ON f.student_id = g.id
+         LEFT JOIN (SELECT pe.student_id, SUM(pe.amount) AS amount
+                      FROM academic_payment_entry pe
+                      JOIN quickledger_gen_student g3 ON g3.id = pe.student_id
+                  GROUP BY pe.student_id) p ON p.student_id = g.id
+             WHERE l.student_id = g.id
+        """, {'last_session': params['sessions'][-1]})
+
+    def _generate_staging_rows(self, params):
+        """ New rows for every importer, shaped like the sanitised output of their create() """
+        cr = self.env.cr
+        total = 0
+        cr.execute("""
+            INSERT INTO academic_legacy_student_result (session, course, level, dept, semester, matric, practicals,
+                                                        exam, test, total, status, {audit})
+                 SELECT replace(sess.code, ' ', ''), e.course_code, lvl.code, d.code, lower(sem.code),
+                        e.reg_number, 0, e.ca_score, e.test_score, e.score, 'New', {values}
+                   FROM student_result_entry e
+                   JOIN quickledger_gen_student g ON g.id = e.student_id
+                   JOIN academic_session sess ON sess.id = e.session_id
+                   JOIN quickledger_level lvl ON lvl.id = e.level_id
+                   JOIN quickledger_semester sem ON sem.id = e.semester_id
+                   JOIN quickledger_student s ON s.id = e.student_id
+                   JOIN quickledger_department d ON d.id = s.department_id
+                  LIMIT %(staging)s
+        """.format(audit=AUDIT_COLUMNS, values=AUDIT_VALUES), params)
+        total += cr.rowcount
+        cr.execute("""
+            INSERT INTO legacy_payment (name, payment_date, level, dept, matric, session, amount, purpose, status,
+                                        {audit})
+                 SELECT s.name, to_char(e.entry_date, 'DD/MM/YY'), lvl.code, d.code, s.matriculation_number,
+                        replace(sess.code, ' ', ''), e.balance::text, initcap(pt.name), 'New', {values}
+                   FROM academic_fee_entry e
+                   JOIN quickledger_gen_student g ON g.id = e.student_id
+                   JOIN quickledger_student s ON s.id = e.student_id
+                   JOIN quickledger_department d ON d.id = s.department_id
+                   JOIN quickledger_level lvl ON lvl.id = e.level_id
+                   JOIN academic_session sess ON sess.id = e.session_id
+                   JOIN payment_type pt ON pt.id = e.type_id
+                  WHERE e.balance > 0
+                  LIMIT %(staging)s
+        """.format(audit=AUDIT_COLUMNS, values=AUDIT_VALUES), params)
+        total += cr.rowcount
+        cr.execute("""
+            INSERT INTO academic_legacy_student (name, matric, level, dept, status, {audit})
+                 SELECT initcap(%(prefix)s) || ' Admission ' || p.id || '-' || n,
+                        'NAU/' || split_part(sess.code, '/', 1) || '/' || %(prefix)s || p.id || lpad(n::text, 6, '0'),
+                        lvl.code, d.code, 'New', {values}
+                   FROM quickledger_programme p
+                   JOIN quickledger_department d ON d.id = p.department_id
+                   JOIN quickledger_diploma dip ON dip.id = p.diploma_id
+                   JOIN quickledger_gen_level gl ON gl.type_id = dip.type_id AND gl.sequence = 1
+                   JOIN quickledger_level lvl ON lvl.id = gl.id
+                   JOIN academic_session sess ON sess.id = (%(sessions)s::int[])[%(nsessions)s]
+             CROSS JOIN generate_series(1, %(staging_per_programme)s) n
+                  WHERE p.id IN %(programmes)s
+                  LIMIT %(staging)s
+        """.format(audit=AUDIT_COLUMNS, values=AUDIT_VALUES), params)
+        total += cr.rowcount
+        cr.execute("""
+            INSERT INTO academic_school_course (title, code, units, semester, level, department, diploma, status,
+                                                {audit})
+                 SELECT initcap(c.name), c.code, c.units::text, sem.code, lvl.code, d.name, dip.code, 'New',
+                        {values}
+                   FROM programme_course_entry c
+                   JOIN quickledger_programme p ON p.id = c.programme_id
+                   JOIN quickledger_department d ON d.id = p.department_id
+                   JOIN quickledger_diploma dip ON dip.id = p.diploma_id
+                   JOIN quickledger_level lvl ON lvl.id = c.level_id
+                   JOIN quickledger_semester sem ON sem.id = c.semester_id
+                  WHERE c.programme_id IN %(programmes)s
+                  LIMIT %(staging)s
+        """.format(audit=AUDIT_COLUMNS, values=AUDIT_VALUES), params)
+        total += cr.rowcount
+        return total
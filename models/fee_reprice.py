@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+
+from collections import Counter
+from odoo import models, fields, api, exceptions
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+class AcademicFeeReprice(models.Model):
+    """ A corrected fee amount carried to the unpaid entries of a session, kept as the audit record of the change """
+    _name = 'academic.fee.reprice'
+    _description = 'Fee Re-pricing'
+    _order = 'create_date desc'
+    _rec_name = 'fee_id'
+
+    fee_id = fields.Many2one('academic.fee', 'Fee', required=True, ondelete='cascade', index=1)
+    session_id = fields.Many2one('academic.session', 'Session', required=True)
+    old_amount = fields.Float('Previous Amount', readonly=True)
+    amount = fields.Float('New Amount', required=True)
+    update_fee = fields.Boolean('Update Fee', default=True, help="Also bill new registrations the new amount")
+    state = fields.Selection(string='Status', selection=[('draft', 'Draft'), ('done', 'Done')], default='draft',
+                             readonly=True)
+    entry_count = fields.Integer('Entries Re-priced', readonly=True)
+    ledger_count = fields.Integer('Ledgers', readonly=True)
+    amount_change = fields.Float('Change in Amount Due', readonly=True)
+    reason = fields.Text('Reason')
+
+    @api.constrains('amount')
+    def _check_amount_greater_than_zero(self):
+        for reprice in self:
+            if reprice.amount <= 0:
+                raise exceptions.ValidationError('Fee Amount must be greater than 0')
+
+    def _reprice_entries(self):
+        """ Sets the new amount due on every unpaid or part-paid entry of the fee and session with one UPDATE
+
+        Entries already paid more than the new amount keep theirs rather than go into credit. Returns (entry,
+        ledger, previous amount due, registration) of the entries changed.
+        """
+        self.ensure_one()
+        FeeEntry = self.env['academic.fee.entry']
+        FeeEntry.flush(['fee_id', 'session_id', 'amount_due', 'amount_paid', 'balance'])
+        self.env.cr.execute("""
+            UPDATE academic_fee_entry fe
+               SET amount_due = %(amount)s, balance = %(amount)s - COALESCE(fe.amount_paid, 0),
+                   write_date = now() at time zone 'UTC', write_uid = %(uid)s
+              FROM academic_fee_entry old
+             WHERE old.id = fe.id AND fe.fee_id = %(fee)s AND fe.session_id = %(session)s
+               AND COALESCE(fe.amount_paid, 0) < fe.amount_due AND fe.amount_due <> %(amount)s
+               AND COALESCE(fe.amount_paid, 0) <= %(amount)s
+         RETURNING fe.id, fe.ledger_id, old.amount_due, fe.registration_id
+        """, {'amount': self.amount, 'uid': self.env.uid, 'fee': self.fee_id.id, 'session': self.session_id.id})
+        return self.env.cr.fetchall()
+
+    @api.model
+    def _refresh_charges(self, registration_ids):
+        """ Re-sums the charges of the registrations with one grouped UPDATE, and the current charges of the
+        ledgers whose latest registration is one of them
+        """
+        if not registration_ids:
+            return
+        self.env['student.registration'].flush(['total_charges'])
+        self.env['student.ledger'].flush(['current_charges'])
+        self.env.cr.execute("""
+            UPDATE student_registration r
+               SET total_charges = x.amount_due
+              FROM (SELECT registration_id, SUM(amount_due) AS amount_due
+                      FROM academic_fee_entry
+                     WHERE registration_id IN %s
+                  GROUP BY registration_id) x
+             WHERE x.registration_id = r.id
+        """, (tuple(registration_ids),))
+        self.env.cr.execute("""
+            UPDATE student_ledger l
+               SET current_charges = r.total_charges
+              FROM student_registration r
+             WHERE r.id IN %s AND l.student_id = r.student_id
+               AND r.id = (SELECT MAX(latest.id) FROM student_registration latest
+                            WHERE latest.student_id = r.student_id)
+         RETURNING l.id
+        """, (tuple(registration_ids),))
+        ledger_ids = [row[0] for row in self.env.cr.fetchall()]
+        self.env['student.registration'].browse(registration_ids).invalidate_cache(['total_charges'])
+        self.env['student.ledger'].browse(ledger_ids).invalidate_cache(['current_charges'])
+
+    def action_apply(self):
+        for reprice in self.filtered(lambda r: r.state == 'draft'):
+            if reprice.session_id.is_closed:
+                raise exceptions.UserError("Fees of {} are locked by its year-end close".format(
+                    reprice.session_id.name))
+            rows = reprice._reprice_entries()
+            # The amount the entries were billed, which is not the fee's own after a re-pricing that left it alone
+            old_amounts = Counter(float(row[2] or 0) for row in rows)
+            old_amount = old_amounts.most_common(1)[0][0] if old_amounts else reprice.fee_id.amount
+            entries = self.env['academic.fee.entry'].browse([row[0] for row in rows])
+            entries.invalidate_cache(['amount_due', 'balance', 'write_date', 'write_uid'])
+            entries.modified(['amount_due', 'balance'])
+            # Registration charges only depend on the fee entries themselves, so they are re-summed here, and the
+            # ledgers take the change of their totals as a delta
+            reprice._refresh_charges(list(set(row[3] for row in rows if row[3])))
+            deltas = {}
+            for _entry_id, ledger_id, old_amount_due, _registration_id in rows:
+                change = reprice.amount - float(old_amount_due or 0)
+                delta = deltas.setdefault(ledger_id, {'total_amount_due': 0.0, 'total_balance': 0.0})
+                delta['total_amount_due'] += change
+                delta['total_balance'] += change
+            self.env['student.ledger']._apply_deltas(deltas)
+            if reprice.update_fee:
+                reprice.fee_id.amount = reprice.amount
+            reprice.write({'state': 'done', 'old_amount': old_amount, 'entry_count': len(rows),
+                           'ledger_count': len(set(row[1] for row in rows if row[1])),
+                           'amount_change': float(sum(reprice.amount - float(row[2] or 0) for row in rows))})
+            self.env['base'].flush()
+            _logger.info("Fee %s re-priced to %s for %s: %s entries", reprice.fee_id.name, reprice.amount,
+                         reprice.session_id.name, len(rows))
+        return True
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+
+from datetime import timedelta
+from odoo import models, fields, api
+import logging
+import time
+from .audit_log import buffered_audit
+
+_logger = logging.getLogger(__name__)
+
+
+class ImportMixin(models.AbstractModel):
+    """ Telemetry and retry bookkeeping shared by the staging import models """
+    _name = 'quickledger.import.mixin'
+    _description = 'Staging Import Mixin'
+
+    # A failed row is retried after 5, 10, 20, 40... minutes and dead-lettered once the budget is spent
+    _retry_limit = 5
+    _retry_backoff = 300
+
+    retry_count = fields.Integer('Retries', default=0, readonly=True)
+    next_retry_date = fields.Datetime('Next Retry', readonly=True)
+
+    @api.model
+    def _claimable_domain(self, status):
+        if status == 'Failed':
+            return [('status', '=', 'Failed'),
+                    '|', ('next_retry_date', '=', False), ('next_retry_date', '<=', fields.Datetime.now())]
+        return [('status', '=', status)]
+
+    @api.model
+    def claim(self, limit=350):
+        """ New rows first, then failed rows whose backoff has elapsed """
+        return self.search(self._claimable_domain('New'), limit=limit) or \
+            self.search(self._claimable_domain('Failed'), limit=limit, order='next_retry_date, id')
+
+    def action_requeue(self):
+        self.write({'status': 'New', 'retry_count': 0, 'next_retry_date': False, 'remarks': False})
+
+    def _process_batch(self):
+        """ Processes the rows one at a time; importers with a set-based path override this """
+        for record in self:
+            _logger.debug("Processing %s %s", record._name, record.id)
+            record.action_process()
+            record._import_phase(None)
+
+    def _import_phase(self, phase):
+        """ Closes the running phase of the import clock and opens ``phase`` (None stops the clock) """
+        stats = self.env.context.get('import_stats')
+        if stats is None:
+            return
+        now = time.perf_counter()
+        if stats.get('phase'):
+            stats[stats['phase']] = stats.get(stats['phase'], 0.0) + now - stats['since']
+        stats['phase'] = phase
+        stats['since'] = now
+
+    def _import_failed(self, error, retry=True):
+        """ Returns the values recording the failure of this row, dead-lettering it past the retry budget
+
+        Rows that can never succeed, such as duplicates, are dead-lettered at once with ``retry=False``.
+        """
+        self.ensure_one()
+        stats = self.env.context.get('import_stats')
+        if stats is not None:
+            errors = stats.setdefault('errors', {})
+            error_class = type(error).__name__
+            errors[error_class] = errors.get(error_class, 0) + 1
+
+        retry_count = self.retry_count + 1 if self.status == 'Failed' else self.retry_count
+        if not retry or retry_count >= self._retry_limit:
+            return {'status': 'Dead', 'remarks': error, 'retry_count': retry_count, 'next_retry_date': False}
+        delay = timedelta(seconds=self._retry_backoff * 2 ** retry_count)
+        return {'status': 'Failed', 'remarks': error, 'retry_count': retry_count,
+                'next_retry_date': fields.Datetime.now() + delay}
+
+
+class ImportRun(models.Model):
+    _name = 'quickledger.import.run'
+    _description = 'Import Run'
+    _order = 'start_date desc'
+
+    name = fields.Char('Name', readonly=True)
+    staging_model = fields.Char('Staging Model', readonly=True, index=1)
+    start_date = fields.Datetime('Started', readonly=True)
+    end_date = fields.Datetime('Finished', readonly=True)
+    duration = fields.Float('Duration (s)', readonly=True)
+    rows_claimed = fields.Integer('Rows Claimed', readonly=True)
+    rows_processed = fields.Integer('Rows Processed', readonly=True)
+    rows_failed = fields.Integer('Rows Failed', readonly=True)
+    rows_per_sec = fields.Float('Rows/Second', readonly=True, group_operator='avg')
+    lookup_seconds = fields.Float('Lookups (s)', readonly=True)
+    write_seconds = fields.Float('Writes (s)', readonly=True)
+    failure_ids = fields.One2many('quickledger.import.run.failure', 'run_id', 'Failures', readonly=True)
+
+    @api.model
+    def run(self, records):
+        """ Processes the claimed staging rows and records how the run went """
+        stats = {'lookup': 0.0, 'write': 0.0, 'errors': {}}
+        start_date = fields.Datetime.now()
+        started = time.perf_counter()
+        with buffered_audit(self.env, records._description) as env:
+            records.with_env(env).with_context(import_stats=stats)._process_batch()
+        duration = time.perf_counter() - started
+
+        records.invalidate_cache(['status'])
+        processed = len(records.filtered(lambda r: r.status == 'Processed'))
+        failed = len(records) - processed
+        run = self.create({
+            'name': "{} {}".format(records._description, fields.Datetime.to_string(start_date)),
+            'staging_model': records._name,
+            'start_date': start_date,
+            'end_date': fields.Datetime.now(),
+            'duration': duration,
+            'rows_claimed': len(records),
+            'rows_processed': processed,
+            'rows_failed': failed,
+            'rows_per_sec': len(records) / duration if duration else 0.0,
+            'lookup_seconds': stats['lookup'],
+            'write_seconds': stats['write'],
+            'failure_ids': [(0, 0, {'error_class': error_class, 'count': count})
+                            for error_class, count in stats['errors'].items()],
+        })
+        _logger.info("%s: %s claimed, %s processed, %s failed in %.2fs", records._name, len(records),
+                     processed, failed, duration)
+        return run
+
+
+class ImportRunFailure(models.Model):
+    _name = 'quickledger.import.run.failure'
+    _description = 'Import Run Failures'
+    _order = 'count desc'
+    _rec_name = 'error_class'
+
+    run_id = fields.Many2one('quickledger.import.run', 'Run', required=True, ondelete='cascade', index=1)
+    staging_model = fields.Char(related='run_id.staging_model', store=True, readonly=True)
+    error_class = fields.Char('Error Class', readonly=True)
+    count = fields.Integer('Failures', readonly=True)
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api, tools
+import functools
+import logging
+import os
+import threading
+import time
+
+_logger = logging.getLogger(__name__)
+
+PARAM_ENABLED = 'quickledger.instrumentation_enabled'
+
+# Each process adds its counters to the shared table at most this often, in seconds
+FLUSH_INTERVAL = 60
+
+_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_stats = {}
+_next_flush = 0.0
+
+
+def _merge(stats, name, calls, records, seconds, max_seconds, queries):
+    stat = stats.setdefault(name, {'calls': 0, 'records': 0, 'seconds': 0.0, 'max_seconds': 0.0, 'queries': 0})
+    stat['calls'] += calls
+    stat['records'] += records
+    stat['seconds'] += seconds
+    stat['queries'] += queries
+    stat['max_seconds'] = max(stat['max_seconds'], max_seconds)
+
+
+def record(name, elapsed, queries, records):
+    with _lock:
+        _merge(_stats, name, 1, records, elapsed, elapsed, queries)
+
+
+def snapshot(reset=False):
+    global _stats
+    with _lock:
+        stats = {name: dict(stat) for name, stat in _stats.items()}
+        if reset:
+            _stats = {}
+    return stats
+
+
+def flush(registry):
+    """ Adds the counters of this process to its rows of the shared table and resets them
+
+    The rows are written on a cursor of their own, so they survive a rollback of the instrumented transaction,
+    and keyed by process so workers never update the same row.
+    """
+    global _next_flush
+    if not _flush_lock.acquire(blocking=False):
+        return
+    try:
+        _next_flush = time.time() + FLUSH_INTERVAL
+        stats = snapshot(reset=True)
+        if not stats:
+            return
+        names = list(stats)
+        try:
+            with registry.cursor() as cr:
+                cr.execute("""
+                    INSERT INTO quickledger_instrumentation_stat AS s (pid, name, calls, records, seconds,
+                                                                       max_seconds, queries)
+                         SELECT %s, * FROM unnest(%s::varchar[], %s::int[], %s::int[], %s::float8[],
+                                                  %s::float8[], %s::int[])
+                    ON CONFLICT (pid, name) DO UPDATE
+                            SET calls = s.calls + EXCLUDED.calls, records = s.records + EXCLUDED.records,
+                                seconds = s.seconds + EXCLUDED.seconds, queries = s.queries + EXCLUDED.queries,
+                                max_seconds = GREATEST(s.max_seconds, EXCLUDED.max_seconds)
+                """, (os.getpid(), names, [stats[n]['calls'] for n in names], [stats[n]['records'] for n in names],
+                      [stats[n]['seconds'] for n in names], [stats[n]['max_seconds'] for n in names],
+                      [stats[n]['queries'] for n in names]))
+        except Exception:
+            _logger.exception("Could not flush the hot path counters, keeping them for the next flush")
+            with _lock:
+                for name, stat in stats.items():
+                    _merge(_stats, name, **stat)
+    finally:
+        _flush_lock.release()
+
+
+def instrumented(name):
+    """ Counts calls, wall time and SQL queries of a method; a cached flag test when disabled """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if not self.env['quickledger.instrumentation']._is_enabled():
+                return method(self, *args, **kwargs)
+            cr = self.env.cr
+            queries = cr.sql_log_count
+            start = time.perf_counter()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - start, cr.sql_log_count - queries, len(self))
+                if time.time() >= _next_flush:
+                    flush(self.env.registry)
+        return wrapper
+    return decorator
+
+
+class InstrumentationStat(models.Model):
+    """ Counters flushed by the worker processes, one row per process and method """
+    _name = 'quickledger.instrumentation.stat'
+    _description = 'Hot Path Counters'
+    _log_access = False
+
+    pid = fields.Integer('Process', readonly=True)
+    name = fields.Char('Method', readonly=True)
+    calls = fields.Integer('Calls', readonly=True)
+    records = fields.Integer('Records', readonly=True)
+    seconds = fields.Float('Seconds', readonly=True)
+    max_seconds = fields.Float('Max Seconds', readonly=True)
+    queries = fields.Integer('SQL Queries', readonly=True)
+
+    _sql_constraints = [
+        ('instrumentation_stat_uniq', 'UNIQUE (pid, name)', 'One row of counters per process and method!')]
+
+
+class Instrumentation(models.TransientModel):
+    """ Read-only view over the counters of every worker """
+    _name = 'quickledger.instrumentation'
+    _description = 'Hot Path Instrumentation'
+    _order = 'total_ms desc'
+
+    name = fields.Char('Method', readonly=True)
+    calls = fields.Integer('Calls', readonly=True)
+    records = fields.Integer('Records', readonly=True)
+    total_ms = fields.Float('Total (ms)', readonly=True)
+    avg_ms = fields.Float('Average (ms)', readonly=True)
+    max_ms = fields.Float('Max (ms)', readonly=True)
+    queries = fields.Integer('SQL Queries', readonly=True)
+    queries_per_call = fields.Float('Queries/Call', readonly=True)
+
+    @api.model
+    @tools.ormcache()
+    def _is_enabled(self):
+        """ Cached per process; set_param clears the caches and every worker drops them on its next request """
+        value = self.env['ir.config_parameter'].sudo().get_param(PARAM_ENABLED, 'False')
+        return value not in ('False', 'false', '0', '')
+
+    @api.model
+    def _get_stats(self):
+        """ Counters flushed by every process plus those of this one not flushed yet """
+        stats = snapshot()
+        self.env.cr.execute("""
+            SELECT name, SUM(calls), SUM(records), SUM(seconds), MAX(max_seconds), SUM(queries)
+              FROM quickledger_instrumentation_stat
+          GROUP BY name
+        """)
+        for name, calls, records, seconds, max_seconds, queries in self.env.cr.fetchall():
+            _merge(stats, name, calls, records, seconds, max_seconds, queries)
+        return stats
+
+    @api.model
+    def _reset_stats(self):
+        snapshot(reset=True)
+        self.env.cr.execute("DELETE FROM quickledger_instrumentation_stat")
+
+    @api.model
+    def _prepare_lines(self, stats):
+        lines = []
+        for name, stat in stats.items():
+            calls = stat['calls'] or 1
+            lines.append({'name': name,
+                          'calls': stat['calls'],
+                          'records': stat['records'],
+                          'total_ms': stat['seconds'] * 1000,
+                          'avg_ms': stat['seconds'] * 1000 / calls,
+                          'max_ms': stat['max_seconds'] * 1000,
+                          'queries': stat['queries'],
+                          'queries_per_call': float(stat['queries']) / calls})
+        return lines
+
+    @api.model
+    def action_open(self):
+        lines = self.create(self._prepare_lines(self._get_stats()))
+        action = self.env.ref('quickledger.quickledger_instrumentation_action_window').read()[0]
+        action['domain'] = [('id', 'in', lines.ids)]
+        return action
+
+    @api.model
+    def action_enable(self):
+        self.env['ir.config_parameter'].sudo().set_param(PARAM_ENABLED, 'True')
+        return self.action_open()
+
+    @api.model
+    def action_disable(self):
+        self.env['ir.config_parameter'].sudo().set_param(PARAM_ENABLED, 'False')
+        return self.action_open()
+
+    @api.model
+    def action_reset(self):
+        self._reset_stats()
+        return self.action_open()
+
+    @api.model
+    def dump_stats(self):
+        """ Scheduled: logs and resets the counters gathered by every worker """
+        for line in sorted(self._prepare_lines(self._get_stats()), key=lambda l: -l['total_ms']):
+            _logger.info("%(name)s calls=%(calls)d records=%(records)d total=%(total_ms).1fms "
+                         "avg=%(avg_ms).1fms max=%(max_ms).1fms queries=%(queries)d "
+                         "queries/call=%(queries_per_call).1f", line)
+        self._reset_stats()
+        return True
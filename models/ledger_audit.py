@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api, sql_db
+from concurrent.futures import ThreadPoolExecutor
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+from . import ledger_totals
+
+_logger = logging.getLogger(__name__)
+
+
+def _audit_chunk(connection_info, first_id, last_id):
+    """ Runs ledger_totals as a script in a process of its own: the drifted LEDGER_TOTALS_QUERY rows of an id range
+
+    The process starts from a bare interpreter instead of a fork of this worker, so it inherits none of its
+    connections, locks or registry, and gets the connection arguments on stdin rather than its command line.
+    """
+    chunk = json.dumps({'connection': connection_info, 'first': first_id, 'last': last_id})
+    process = subprocess.run([sys.executable, ledger_totals.__file__], input=chunk, stdout=subprocess.PIPE,
+                             stderr=subprocess.PIPE, universal_newlines=True)
+    if process.returncode:
+        raise RuntimeError("Ledgers {} to {} could not be audited: {}".format(first_id, last_id,
+                                                                               process.stderr.strip()))
+    return json.loads(process.stdout)
+
+
+class StudentLedgerAudit(models.Model):
+    """ Checks the stored totals of every ledger against its fees and payments, chunks audited in parallel """
+    _name = 'student.ledger.audit'
+    _description = 'Ledger Audit'
+    _order = 'create_date desc'
+
+    @api.model
+    def _default_workers(self):
+        return max(1, (os.cpu_count() or 2) - 1)
+
+    name = fields.Char('Name', required=True, default=lambda self: 'Ledger Audit {}'.format(
+        fields.Datetime.to_string(fields.Datetime.now())))
+    workers = fields.Integer('Worker Processes', default=_default_workers)
+    chunk_size = fields.Integer('Ledgers per Chunk', default=5000, required=True)
+    state = fields.Selection(string='Status',
+                             selection=[('draft', 'Draft'),
+                                        ('done', 'Done'),
+                                        ('failed', 'Failed')], default='draft', readonly=True)
+    ledger_count = fields.Integer('Ledgers Audited', readonly=True)
+    drift_count = fields.Integer('Ledgers Drifted', readonly=True)
+    repaired_count = fields.Integer('Ledgers Repaired', readonly=True)
+    balance_drift = fields.Float('Balance Drift', readonly=True, help="Sum of the stored balances less the expected")
+    duration = fields.Float('Duration (s)', readonly=True)
+    line_ids = fields.One2many('student.ledger.audit.line', 'audit_id', 'Drift', readonly=True)
+    remarks = fields.Text('Remarks', readonly=True)
+
+    def _get_chunks(self):
+        """ (first id, last id) of consecutive runs of chunk_size ledgers, from one query """
+        self.env.cr.execute("""
+            SELECT MIN(id), MAX(id), COUNT(*)
+              FROM (SELECT id, (ROW_NUMBER() OVER (ORDER BY id) - 1) / %s AS chunk FROM student_ledger) x
+          GROUP BY chunk
+          ORDER BY 1
+        """, (max(1, self.chunk_size),))
+        return self.env.cr.fetchall()
+
+    def _audit(self):
+        """ Audits the chunks of ledgers in worker processes and records the ledgers that drifted
+
+        Each process opens its own connection and so sees committed data only, as the scheduled audit does.
+        """
+        self.ensure_one()
+        started = time.perf_counter()
+        chunks = self._get_chunks()
+        connection_info = sql_db.connection_info_for(self.env.cr.dbname)[1]
+        rows = []
+        workers = max(1, self.workers)
+        # The threads only wait on the audit processes
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_audit_chunk, connection_info, first_id, last_id)
+                       for first_id, last_id, _count in chunks]
+            for done, future in enumerate(futures, start=1):
+                rows += future.result()
+                _logger.info("Ledger audit %s: %s/%s chunks, %s drifted", self.name, done, len(chunks), len(rows))
+
+        self.env['student.ledger.audit.line'].create([{
+            'audit_id': self.id,
+            'ledger_id': row[0],
+            'total_amount_due': row[1],
+            'total_amount_paid': row[2],
+            'total_balance': row[3],
+            'expected_amount_due': row[4],
+            'expected_amount_paid': row[5],
+            'expected_balance': row[6],
+            'amount_unallocated': float(row[5]) - float(row[7]),
+        } for row in rows])
+        self.write({'state': 'done', 'remarks': False, 'ledger_count': sum(chunk[2] for chunk in chunks),
+                    'drift_count': len(rows), 'repaired_count': 0,
+                    'balance_drift': sum(float(row[3]) - float(row[6]) for row in rows),
+                    'duration': time.perf_counter() - started})
+
+    def action_run(self):
+        for audit in self:
+            audit.line_ids.unlink()
+            try:
+                with self.env.cr.savepoint():
+                    audit._audit()
+            except Exception as e:
+                _logger.exception("Ledger audit %s failed", audit.name)
+                audit.write({'state': 'failed', 'remarks': str(e)})
+        return True
+
+    def action_repair(self):
+        """ Re-sums and overwrites the totals of every drifted ledger not repaired yet """
+        self.mapped('line_ids').filtered(lambda line: not line.repaired).action_repair()
+
+    @api.model
+    def run_scheduled(self):
+        """ Scheduled: audits every ledger and keeps the report, repairs are left to the bursary """
+        self.create({}).action_run()
+        return True
+
+
+class StudentLedgerAuditLine(models.Model):
+    _name = 'student.ledger.audit.line'
+    _description = 'Ledger Audit Drift'
+    _order = 'id'
+    _rec_name = 'ledger_id'
+
+    audit_id = fields.Many2one('student.ledger.audit', 'Audit', required=True, ondelete='cascade', index=1)
+    ledger_id = fields.Many2one('student.ledger', 'Ledger', required=True, ondelete='cascade', readonly=True)
+    matriculation_number = fields.Char(related='ledger_id.matriculation_number', readonly=True)
+    total_amount_due = fields.Float('Amount Due', readonly=True)
+    expected_amount_due = fields.Float('Expected Amount Due', readonly=True)
+    total_amount_paid = fields.Float('Amount Paid', readonly=True)
+    expected_amount_paid = fields.Float('Expected Amount Paid', readonly=True)
+    total_balance = fields.Float('Balance', readonly=True)
+    expected_balance = fields.Float('Expected Balance', readonly=True)
+    amount_unallocated = fields.Float('Unallocated Payments', readonly=True,
+                                      help="Payments not allocated to any fee, which no repair can fix")
+    repaired = fields.Boolean('Repaired', readonly=True)
+
+    def action_repair(self):
+        ledgers = self.mapped('ledger_id')
+        ledgers._repair_totals()
+        self.write({'repaired': True})
+        for audit in self.mapped('audit_id'):
+            audit.repaired_count = len(audit.line_ids.filtered('repaired'))
+        return True
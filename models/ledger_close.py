@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api
+import logging
+import time
+
+_logger = logging.getLogger(__name__)
+
+
+class StudentLedgerClose(models.Model):
+    """ Year-end close of a session: carries every ledger's closing balance forward, a chunk of ledgers at a time
+
+    Each chunk is committed with its checkpoint, the highest ledger id closed so far, so an interrupted close
+    picks up where it stopped on the next run.
+    """
+    _name = 'student.ledger.close'
+    _description = 'Year-End Close'
+    _order = 'create_date desc'
+    _rec_name = 'session_id'
+
+    session_id = fields.Many2one('academic.session', 'Session', required=True)
+    chunk_size = fields.Integer('Ledgers per Chunk', default=2000, required=True)
+    state = fields.Selection(string='Status',
+                             selection=[('draft', 'Draft'),
+                                        ('queued', 'Queued'),
+                                        ('done', 'Done'),
+                                        ('failed', 'Failed')], default='draft', readonly=True)
+    last_ledger_id = fields.Integer('Checkpoint', readonly=True, help="Highest ledger id closed so far")
+    ledger_count = fields.Integer('Ledgers', readonly=True)
+    closed_count = fields.Integer('Closed', readonly=True)
+    total_carried_forward = fields.Float('Balance Carried Forward', readonly=True)
+    total_charges = fields.Float('Session Charges', readonly=True)
+    start_date = fields.Datetime('Started', readonly=True)
+    end_date = fields.Datetime('Finished', readonly=True)
+    remarks = fields.Text('Remarks', readonly=True)
+
+    def action_queue(self):
+        """ Locks the session's fee entries and queues the close, resuming from the checkpoint of a failed one """
+        for record in self:
+            vals = {'state': 'queued', 'remarks': False}
+            if record.state == 'draft':
+                vals.update({'last_ledger_id': 0, 'closed_count': 0, 'total_carried_forward': 0.0,
+                             'total_charges': 0.0, 'ledger_count': self.env['student.ledger'].search_count([]),
+                             'start_date': False, 'end_date': False})
+            record.write(vals)
+            record.session_id.is_closed = True
+
+    def action_draft(self):
+        """ Reopens the session of a close that has not finished """
+        for record in self:
+            record.write({'state': 'draft'})
+            record.session_id.is_closed = False
+
+    def _get_closing_balances(self, ledger_ids):
+        """ [(ledger, carried forward, session charges)] of a chunk of ledgers from one aggregate over their fees
+
+        The carried forward balance is the balance brought forward plus the unpaid fees of every session up to
+        the closed one, the charges are the fees billed in the closed session.
+        """
+        self.ensure_one()
+        self.env['academic.fee.entry'].flush(['ledger_id', 'session_id', 'amount_due', 'amount_paid', 'balance'])
+        self.env.cr.execute("""
+            SELECT l.id,
+                   ABS(COALESCE(s.balance_brought_forward, 0))
+                       + COALESCE(SUM(fe.balance) FILTER (WHERE fe.session_id IS NULL OR ses.sequence <= %(sequence)s
+                                                          OR fe.session_id = %(session)s), 0),
+                   COALESCE(SUM(fe.amount_due) FILTER (WHERE fe.session_id = %(session)s), 0)
+              FROM student_ledger l
+              JOIN quickledger_student s ON s.id = l.student_id
+         LEFT JOIN academic_fee_entry fe ON fe.ledger_id = l.id
+         LEFT JOIN academic_session ses ON ses.id = fe.session_id
+             WHERE l.id IN %(ledgers)s
+          GROUP BY l.id, s.balance_brought_forward
+          ORDER BY l.id
+        """, {'sequence': self.session_id.sequence, 'session': self.session_id.id, 'ledgers': tuple(ledger_ids)})
+        return self.env.cr.fetchall()
+
+    def _close_next_chunk(self):
+        """ Closes the next chunk of ledgers after the checkpoint with one UPDATE """
+        self.ensure_one()
+        self.env.cr.execute("SELECT id FROM student_ledger WHERE id > %s ORDER BY id LIMIT %s",
+                            (self.last_ledger_id, max(1, self.chunk_size)))
+        ledger_ids = [row[0] for row in self.env.cr.fetchall()]
+        if not ledger_ids:
+            self.write({'state': 'done', 'end_date': fields.Datetime.now()})
+            return
+        balances = self._get_closing_balances(ledger_ids)
+        self.env.cr.execute("""
+            UPDATE student_ledger l
+               SET balance_carried_forward = v.carried_forward, current_charges = v.charges,
+                   write_date = now() at time zone 'UTC', write_uid = %s
+              FROM unnest(%s::int[], %s::numeric[], %s::numeric[]) AS v(id, carried_forward, charges)
+             WHERE l.id = v.id
+        """, (self.env.uid, [b[0] for b in balances], [b[1] for b in balances], [b[2] for b in balances]))
+        self.env['student.ledger'].browse(ledger_ids).invalidate_cache(['balance_carried_forward', 'current_charges',
+                                                                         'write_date', 'write_uid'])
+        self.write({'last_ledger_id': ledger_ids[-1],
+                    'closed_count': self.closed_count + len(ledger_ids),
+                    'total_carried_forward': self.total_carried_forward + float(sum(b[1] for b in balances)),
+                    'total_charges': self.total_charges + float(sum(b[2] for b in balances))})
+
+    @api.model
+    def process_queue(self, time_limit=600):
+        """ Scheduled: closes queued sessions chunk by chunk, committing each chunk with its checkpoint """
+        started = time.time()
+        for close in self.search([('state', '=', 'queued')], order='create_date'):
+            if not close.start_date:
+                close.start_date = fields.Datetime.now()
+            while close.state == 'queued' and time.time() - started < time_limit:
+                try:
+                    close._close_next_chunk()
+                    self.env.cr.commit()
+                except Exception as e:
+                    self.env.cr.rollback()
+                    self.env.clear()
+                    _logger.exception("Year-end close of %s failed", close.session_id.name)
+                    close.write({'state': 'failed', 'remarks': str(e)})
+                    self.env.cr.commit()
+                _logger.info("Year-end close of %s: %s/%s ledgers", close.session_id.name, close.closed_count,
+                             close.ledger_count)
+            if time.time() - started >= time_limit:
+                break
+        return True
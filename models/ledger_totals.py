@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+""" Ledger totals check shared by the ORM and the audit workers
+
+Imports nothing from odoo: the ledger audit runs this file as a script in processes of their own, which read a
+chunk as JSON on stdin, {"connection": psycopg2 connect arguments, "first": id, "last": id}, and write its drifted
+rows as JSON on stdout.
+"""
+
+import json
+import psycopg2
+import sys
+
+# Stored and re-summed totals of the ledgers whose id matches the {ledgers} condition:
+# id, stored due, paid, balance, expected due, paid, balance, fee payments allocated
+LEDGER_TOTALS_QUERY = """
+    SELECT l.id,
+           COALESCE(l.total_amount_due, 0), COALESCE(l.total_amount_paid, 0), COALESCE(l.total_balance, 0),
+           COALESCE(l.opening_balance, 0) + COALESCE(f.amount_due, 0),
+           COALESCE(p.amount, 0),
+           ABS(COALESCE(s.balance_brought_forward, 0)) + COALESCE(f.balance, 0),
+           COALESCE(f.amount_paid, 0)
+      FROM student_ledger l
+      JOIN quickledger_student s ON s.id = l.student_id
+ LEFT JOIN (SELECT ledger_id, SUM(amount_due) AS amount_due, SUM(COALESCE(amount_paid, 0)) AS amount_paid,
+                   SUM(amount_due - COALESCE(amount_paid, 0)) AS balance
+              FROM academic_fee_entry
+             WHERE ledger_id {ledgers}
+          GROUP BY ledger_id) f ON f.ledger_id = l.id
+ LEFT JOIN (SELECT ledger_id, SUM(amount) AS amount
+              FROM academic_payment_entry
+             WHERE ledger_id {ledgers}
+          GROUP BY ledger_id) p ON p.ledger_id = l.id
+     WHERE l.id {ledgers}
+"""
+
+
+def has_drifted(row):
+    """ Whether a LEDGER_TOTALS_QUERY row has a stored total off by a kobo or more """
+    return any(abs(float(stored) - float(expected)) >= 0.01 for stored, expected in zip(row[1:4], row[4:7]))
+
+
+def audit_chunk(connection_info, first_id, last_id):
+    """ The drifted LEDGER_TOTALS_QUERY rows of an id range, read on a connection of its own """
+    connection = psycopg2.connect(**connection_info)
+    try:
+        with connection.cursor() as cr:
+            cr.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
+            cr.execute(LEDGER_TOTALS_QUERY.format(ledgers='BETWEEN %(first)s AND %(last)s'),
+                       {'first': first_id, 'last': last_id})
+            return [[row[0]] + [float(value) for value in row[1:]] for row in cr.fetchall() if has_drifted(row)]
+    finally:
+        connection.close()
+
+
+def main():
+    chunk = json.load(sys.stdin)
+    json.dump(audit_chunk(chunk['connection'], chunk['first'], chunk['last']), sys.stdout)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,12 +3,66 @@
 import base64
 from odoo import models, fields, api, tools, exceptions
 from odoo.modules.module import get_module_resource
+from .instrumentation import instrumented
+from .ledger_totals import LEDGER_TOTALS_QUERY, has_drifted
 import logging
 import re
 
 _logger = logging.getLogger(__name__)
 
 
+def _create_index(cr, indexname, tablename, expressions, where=None):
+    """ Creates a composite, optionally partial, index unless it already exists """
+    if tools.index_exists(cr, indexname):
+        return
+    query = 'CREATE INDEX "{}" ON "{}" ({})'.format(indexname, tablename, ", ".join(expressions))
+    if where:
+        query += " WHERE {}".format(where)
+    cr.execute(query)
+    _logger.info("Index %s created on %s", indexname, tablename)
+
+
+# Fields of a fee entry the year-end close of its session freezes, amount_paid stays open to payments
+LOCKED_FEE_FIELDS = ('amount_due', 'fee_id', 'ledger_id', 'registration_id')
+
+
+def sum_deltas(*deltas):
+    """ Adds up {ledger: {total field: delta}} mappings """
+    result = {}
+    for delta in deltas:
+        for ledger_id, amounts in delta.items():
+            total = result.setdefault(ledger_id, {})
+            for name, amount in amounts.items():
+                total[name] = total.get(name, 0.0) + amount
+    return result
+
+
+def truncate_gpa(points, units):
+    """ Points over units cut, not rounded, to two decimals as the result books record it """
+    if not units:
+        return 0.00
+    return int(round(points / units * 100, 6)) / 100.0
+
+
+# Student photo field -> the box its image is resized to, aspect ratio preserved
+PHOTO_SIZES = {'image': (1024, 1024), 'image_medium': (128, 128), 'image_small': (64, 64)}
+
+
+def resize_photo(image):
+    """ The full (1024px), medium (128px) and small (64px) sizes of a base64 encoded photo """
+    if not image:
+        return {field: False for field in PHOTO_SIZES}
+    return {field: tools.image_process(image, size=size) for field, size in PHOTO_SIZES.items()}
+
+
+def _create_staging_index(cr, tablename):
+    """ Staging queues are only ever scanned for rows that still need processing """
+    _create_index(cr, "{}_claimable_idx".format(tablename), tablename, ['status', 'id'],
+                  where="status IN ('New', 'Failed')")
+    _create_index(cr, "{}_retry_due_idx".format(tablename), tablename, ['next_retry_date', 'id'],
+                  where="status = 'Failed'")
+
+
 class Semester(models.Model):
     """ Defining an academic year """
     _name = "quickledger.semester"
@@ -184,6 +238,9 @@ class AcademicSession(models.Model):
     description = fields.Text('Description')
     date_start = fields.Date("Start Date")
     date_end = fields.Date("End Date")
+    is_closed = fields.Boolean('Closed', readonly=True, help="Set by the year-end close, fee entries of the session "
+                                                           "can no longer be billed, changed or removed, "
+                                                           "only paid")
 
 
 class Student(models.Model):
@@ -237,35 +294,59 @@ class Student(models.Model):
          'UNIQUE (matriculation_number)',
          'Student Matriculation number already exist!')]
 
-    def _create_student_result(self, student):
+    def _create_student_results(self):
+        """ One result book per student, linked through student_id """
         StudentResultBook = self.env['student.result']
-        vals = {'student_id': student.id, 'programme_id': student.programme_id.id}
-        result_book = StudentResultBook.create(vals)
-        return result_book
-    
-    def _create_ledger(self, student):
-        vals = {'student_id': student.id}
-        if student.balance_brought_forward > 0:
-            vals['balance_brought_forward'] = -1 * student.balance_brought_forward
-        else:
-            vals['balance_brought_forward'] = student.balance_brought_forward
+        return StudentResultBook.create([{'student_id': student.id, 'programme_id': student.programme_id.id}
+                                         for student in self])
+
+    def _create_ledgers(self):
+        """ One ledger per student, linked back with a single UPDATE rather than a write per student """
+        vals_list = []
+        for student in self:
+            vals = {'student_id': student.id}
+            if student.balance_brought_forward > 0:
+                vals['balance_brought_forward'] = -1 * student.balance_brought_forward
+            else:
+                vals['balance_brought_forward'] = student.balance_brought_forward
+            vals_list.append(vals)
 
         StudentLedger = self.env['student.ledger']
-        ledger = StudentLedger.create(vals)
-        return ledger
+        ledgers = StudentLedger.create(vals_list)
+        self.env.cr.execute("""
+            UPDATE quickledger_student s
+               SET ledger_id = l.id
+              FROM student_ledger l
+             WHERE l.student_id = s.id AND s.id IN %s
+        """, (tuple(self.ids),))
+        self.invalidate_cache(['ledger_id'], self.ids)
+        return ledgers
 
     def write(self, vals):
-        return super(Student, self).write(vals)
+        if 'image' in vals and 'image_small' not in vals:
+            vals.update(resize_photo(vals['image']))
+        if 'balance_brought_forward' not in vals:
+            return super(Student, self).write(vals)
+        # The ledger balance counts the balance b/f whatever its sign
+        before = {student.ledger_id.id: {'total_balance': -abs(student.balance_brought_forward or 0.0)}
+                  for student in self}
+        result = super(Student, self).write(vals)
+        after = {student.ledger_id.id: {'total_balance': abs(student.balance_brought_forward or 0.0)}
+                 for student in self}
+        self.env['student.ledger']._apply_deltas(sum_deltas(before, after))
+        return result
 
-    @api.model
-    def create(self, vals):
-        vals['name'] = str(vals['name']).title()
-        new_record = super(Student, self).create(vals)
-        ledger = self._create_ledger(new_record)
-        new_record.write({'ledger_id': ledger.id})
-        result_book = self._create_student_result(new_record)
-        new_record.write({'result_book_ids': [(4, result_book.id)]})
-        return new_record
+    @api.model_create_multi
+    @instrumented('quickledger.student.create')
+    def create(self, vals_list):
+        for vals in vals_list:
+            vals['name'] = str(vals['name']).title()
+            if vals.get('image') and 'image_small' not in vals:
+                vals.update(resize_photo(vals['image']))
+        new_records = super(Student, self).create(vals_list)
+        new_records._create_ledgers()
+        new_records._create_student_results()
+        return new_records
 
     def name_get(self):
         result = []
@@ -294,12 +375,11 @@ class Honour(models.Model):
     def compute_gpa(self, results):
         """ This will calculates the cumulative grade point average(CGPA) given a domain"""
         approved_results = results.filtered(lambda r: r.status == 'Approved')
-        total_credits = sum([result.units for result in approved_results])
-        total_points = sum([result.points * result.units for result in approved_results])
+        totals = self.env['student.result.entry']._sum_grade_points('id', approved_results.ids)
+        total_points = sum(points for points, _units in totals.values())
+        total_credits = sum(units for _points, units in totals.values())
         if total_points:
-            cgpa_in_str = str(total_points / total_credits)
-            cgpa_in_float = float(cgpa_in_str[0:4])
-            return cgpa_in_float
+            return truncate_gpa(total_points, total_credits)
         else:
             return 0.00
 
@@ -357,6 +437,11 @@ class HonourScheme(models.Model):
                                    ('no_allow_replacement',
                                     'No Grades Replacement'),
                                ])
+    replacement_policy = fields.Selection(string="Replaced By",
+                                          selection=[('latest', 'Latest Attempt'),
+                                                     ('best', 'Best Attempt')],
+                                          default='latest',
+                                          help="Attempt of a course that counts when grades replacement is allowed")
     honour_ids = fields.One2many(
         'quickledger.honour', 'honour_scheme_id', 'Honour Scheme')
 
@@ -415,11 +500,15 @@ class ProgrammeCourseEntry(models.Model):
     code = fields.Char(related="course_id.code", string='Code', readonly=True, store=True)
     semester_id = fields.Many2one(related="course_id.semester_id", string='Semester', readonly=True, store=True)
     units = fields.Integer("Units", required=True, default=1)
-    course_id = fields.Many2one('programme.course', 'Prerequisite')
+    course_id = fields.Many2one('programme.course', 'Prerequisite', index=1)
     programme_id = fields.Many2one('quickledger.programme', 'Department')
     level_id = fields.Many2one('quickledger.level', 'Level', required=True)
     option_id = fields.Many2one('quickledger.programme.option', 'Option', required=False)
 
+    def init(self):
+        _create_index(self.env.cr, 'programme_course_entry_programme_level_semester_idx', self._table,
+                      ['programme_id', 'level_id', 'semester_id'])
+
     def name_get(self):
         result = []
         for record in self:
@@ -432,7 +521,8 @@ class StudentResultBook(models.Model):
     _description = 'Collection Student Academic Record'
     _name = 'student.result'
     _order = 'student_id,programme_id'
-    _inherit = ['mail.thread']
+    _inherit = ['mail.thread', 'quickledger.audit.mixin']
+    _audit_fields = ['cgpa', 'honours_id']
 
     _sql_constraints = [
         ('student_result_book_uniq',
@@ -459,32 +549,27 @@ class StudentResultBook(models.Model):
 
     @api.depends('entry_ids')
     def _compute_outstanding_results(self):
+        carry_overs = self.env['student.result.entry']._get_carry_overs(self.mapped('student_id').ids)
         for record in self:
-            res = []
-            failed_courses = record.entry_ids.filtered(lambda c: c.grade_id.is_pass_mark == False and
-                                                                 c.status == 'Approved')
-            passed_courses = record.entry_ids.filtered(lambda c: c.grade_id.is_pass_mark == True)
-            for failed_course in failed_courses:
-                if failed_course.id not in passed_courses.ids:
-                    res.append(failed_course.id)
-
-            record.outstanding_result_ids = res
+            record.outstanding_result_ids = list(carry_overs.get(record.student_id.id, {}).values())
 
     @api.depends('entry_ids')
     def _compute_outstanding_courses(self):
         for record in self:
-            record.outstanding_course_ids = [entry.course_id.id for entry in record.outstanding_result_ids]
+            record.outstanding_course_ids = record.outstanding_result_ids.mapped('course_id')
 
     @api.depends('entry_ids')
     def _compute_approved_results(self):
         for record in self:
             record.approved_result_ids = record.mapped('entry_ids').filtered(lambda result: result.status == 'Approved')
 
+    @instrumented('student.result.compute_cgpa')
     def compute_cgpa(self):
         """ This will calculates the cumulative grade point average(CGPA) given a domain"""
+        totals = self._get_cgpa_totals() if self else {}
         for record in self:
-            approved_results = record.entry_ids.filtered(lambda r: r.status == 'Approved')
-            cgpa = self.env['quickledger.honour'].compute_gpa(approved_results)
+            points, units = totals.get(record.id, (0.0, 0))
+            cgpa = truncate_gpa(points, units) if points else 0.00
 
             return cgpa
 
@@ -504,12 +589,65 @@ class StudentResultBook(models.Model):
 
     @api.depends('cgpa')
     def _compute_honour(self):
+        honours = self.env['quickledger.honour'].search([])
         for record in self:
             if record.cgpa > 0.00:
-                honours = self.env['quickledger.honour'].search([])
                 honour = honours.filtered(lambda h: h.lower_bound <= record.cgpa <= h.upper_bound)
                 record.honours_id = honour[0]
 
+    @api.model
+    def _search_cohort(self, programme, session=False, level=False):
+        """ Result books of a programme, narrowed to the students registered in a session and/or level """
+        domain = [('programme_id', '=', programme.id)]
+        if session or level:
+            registration_domain = [('programme_id', '=', programme.id)]
+            if session:
+                registration_domain.append(('session_id', '=', session.id))
+            if level:
+                registration_domain.append(('level_id', '=', level.id))
+            registrations = self.env['student.registration'].search_read(registration_domain, ['student_id'])
+            domain.append(('student_id', 'in', list(set(r['student_id'][0] for r in registrations))))
+        return self.search(domain, order='id')
+
+    def _get_cgpa_totals(self):
+        """ (points, units) of the approved results of every book, from one grouped aggregate """
+        return self.env['student.result.entry']._sum_grade_points('student_result_id', self.ids)
+
+    def _update_classification(self, classification):
+        """ Writes {book_id: (cgpa, honour_id)} back in a single UPDATE, without per-book recomputes """
+        if not classification:
+            return
+        book_ids = list(classification)
+        self.browse(book_ids)._audit_snapshot()
+        self.env.cr.execute("""
+            UPDATE student_result b
+               SET cgpa = v.cgpa, honours_id = v.honours_id, write_date = now() at time zone 'UTC',
+                   write_uid = %s
+              FROM unnest(%s::int[], %s::float8[], %s::int[]) AS v(id, cgpa, honours_id)
+             WHERE b.id = v.id
+        """, (self.env.uid, book_ids, [classification[b][0] for b in book_ids],
+              [classification[b][1] for b in book_ids]))
+        self.browse(book_ids).invalidate_cache(['cgpa', 'honours_id', 'write_date', 'write_uid'])
+
+    def classify(self):
+        """ CGPA and class of degree of a whole cohort: one aggregate, honours banded in memory, one UPDATE """
+        if not self:
+            return {}
+        self.flush(['cgpa', 'honours_id'])
+        honours = self.env['quickledger.honour'].search([])
+        totals = self._get_cgpa_totals()
+        classification = {}
+        summary = {}
+        for book_id in self.ids:
+            points, units = totals.get(book_id, (0.0, 0))
+            cgpa = truncate_gpa(points, units) if points else 0.00
+            honour = next((h for h in honours if cgpa > 0.00 and h.lower_bound <= cgpa <= h.upper_bound), None)
+            classification[book_id] = (cgpa, honour.id if honour else None)
+            name = honour.name if honour else 'Unclassified'
+            summary[name] = summary.get(name, 0) + 1
+        self._update_classification(classification)
+        return summary
+
     def name_get(self):
         result = []
         for record in self:
@@ -528,7 +666,8 @@ class StudentRegistrationEntry(models.Model):
          'UNIQUE (student_id, course_id, session_id)',
          'Student, Course and Session must be unique!')]
 
-    registration_id = fields.Many2one('student.registration', 'Registration', required=True, ondelete='cascade')
+    registration_id = fields.Many2one('student.registration', 'Registration', required=True, ondelete='cascade',
+                                      index=1)
     student_id = fields.Many2one(related='registration_id.student_id', string='Student', store=True, readonly=True)
     programme_id = fields.Many2one(related='registration_id.programme_id', string='Programme', store=True,
                                    readonly=True)
@@ -553,7 +692,8 @@ class StudentRegistrationEntry(models.Model):
 class StudentRegistration(models.Model):
     _description = 'Student Registration'
     _name = 'student.registration'
-    _inherit = ["mail.thread"]
+    _inherit = ["mail.thread", 'quickledger.audit.mixin']
+    _audit_fields = ['state', 'gpa']
     _rec_name = 'student_id'
 
     _sql_constraints = [
@@ -606,6 +746,10 @@ class StudentRegistration(models.Model):
                                           compute='_compute_approved_results', readonly=True)
 
 
+    def init(self):
+        _create_index(self.env.cr, 'student_registration_student_session_semester_idx', self._table,
+                      ['student_id', 'session_id', 'semester_id'])
+
     @api.onchange('programme_id')
     def programme_id_changed(self):
         domain = {}
@@ -651,20 +795,45 @@ class StudentRegistration(models.Model):
             record.approved_result_ids = record.mapped('result_ids').filtered(
                 lambda result: result.status == 'Approved')
 
+    def _refresh_gpa(self):
+        """ Semester GPA of every registration from one grouped aggregate of its approved results, one UPDATE
+
+        Result entries call this whenever their scores, status or registration change, so the GPA is kept on
+        the registration instead of being recomputed on each of its entries.
+        """
+        if not self:
+            return
+        self.env['student.result.entry'].flush(['registration_id', 'points', 'units', 'status'])
+        self.env.cr.execute("""
+            SELECT registration_id, SUM(points * units), SUM(units)
+              FROM student_result_entry
+             WHERE registration_id IN %s AND status = 'Approved'
+          GROUP BY registration_id
+        """, (tuple(self.ids),))
+        totals = {registration_id: (points or 0.0, units or 0)
+                  for registration_id, points, units in self.env.cr.fetchall()}
+        gpas = []
+        for registration_id in self.ids:
+            points, units = totals.get(registration_id, (0.0, 0))
+            gpas.append(truncate_gpa(points, units) if points else 0.00)
+        self._audit_snapshot()
+        self.env.cr.execute("""
+            UPDATE student_registration r
+               SET gpa = v.gpa, write_date = now() at time zone 'UTC', write_uid = %s
+              FROM unnest(%s::int[], %s::float8[]) AS v(id, gpa)
+             WHERE r.id = v.id AND r.gpa IS DISTINCT FROM v.gpa
+        """, (self.env.uid, self.ids, gpas))
+        self.invalidate_cache(['gpa', 'write_date', 'write_uid'])
+
     def action_recompute_cgpa(self):
-        for record in self:
-            if record.result_ids:
-                approved_results = record.approved_result_ids
-                gpa = self.env['quickledger.honour'].compute_gpa(approved_results)
-                record.write({'gpa': gpa})
+        self._refresh_gpa()
 
     def action_approve_registration(self):
         self.write({'state': 'Approved'})
 
     def action_close_registration(self):
-        results = self.result_ids.filtered(lambda r: r.status == 'Approved')
-        gpa = self.env['quickledger.honour'].compute_gpa(results)
-        self.write({'state': 'Closed', 'gpa': gpa})
+        self.write({'state': 'Closed'})
+        self._refresh_gpa()
 
     @api.depends('result_ids')
     def _compute_results(self):
@@ -750,6 +919,7 @@ class StudentRegistration(models.Model):
          ledger.write({'current_charges' : self.total_charges})
  
     
+    @instrumented('student.registration._create_fee_entries')
     def _create_fee_entries(self):
         AcademicFeeEntry = self.env['academic.fee.entry']
         AcademicProgramme = self.env['quickledger.programme']
@@ -791,22 +961,48 @@ class StudentRegistration(models.Model):
         return True
 
     def _create_course_entries(self):
-        level_id = self.level_id.id
-        semester_id = self.semester_id.id
-        programme_id = self.programme_id.id
-        student_id = self.student_id.id
-        #  option_id = registration.student_id.option_id.id if registration.student_id.option_id else None
-        courses = self._get_courses(programme_id, level_id, semester_id)
-        outstanding_course_ids = self._get_outstanding_courses(student_id, semester_id)
+        """ Registers the level courses and carry-overs of a batch of registrations with one multi-create
 
-        for course in courses:
-            StudentRegistrationEntry.create({'registration_id': self.id, 'course_id': course.id})
-
-        for course_id in outstanding_course_ids:
-            self.env['student.registration.entry'].create({'registration_id': self.id,
-                                                           'course_id': course_id, 'is_brought_forward': True})
+        Course lists are fetched once per (programme, level, semester) and carry-overs once per semester.
+        """
+        if not self:
+            return True
+        #  option_id = registration.student_id.option_id.id if registration.student_id.option_id else None
+        courses = {}
+        carry_overs = {}
+        for registration in self:
+            key = (registration.programme_id.id, registration.level_id.id, registration.semester_id.id)
+            if key not in courses:
+                courses[key] = [course.id for course in self._get_courses(*key)]
+        for semester in self.mapped('semester_id'):
+            students = self.filtered(lambda r: r.semester_id == semester).mapped('student_id')
+            carry_overs[semester.id] = self.env['student.result.entry']._get_carry_overs(students.ids, semester.id)
+
+        StudentRegistrationEntry = self.env['student.registration.entry']
+        registered = set((entry['student_id'][0], entry['session_id'][0], entry['course_id'][0]) for entry in
+                         StudentRegistrationEntry.search_read([('student_id', 'in', self.mapped('student_id').ids),
+                                                               ('session_id', 'in', self.mapped('session_id').ids)],
+                                                              ['student_id', 'session_id', 'course_id']))
+        vals_list = []
+        for registration in self:
+            student_id = registration.student_id.id
+            key = (registration.programme_id.id, registration.level_id.id, registration.semester_id.id)
+            # Registrations without a semester get their level courses only
+            outstanding = carry_overs.get(registration.semester_id.id, {}).get(student_id, {})
+            for course_id, is_brought_forward in [(c, False) for c in courses[key]] + \
+                    [(c, True) for c in outstanding]:
+                entry_key = (student_id, registration.session_id.id, course_id)
+                if entry_key in registered:
+                    continue
+                registered.add(entry_key)
+                vals_list.append({'registration_id': registration.id, 'course_id': course_id,
+                                  'is_brought_forward': is_brought_forward})
+        StudentRegistrationEntry.create(vals_list)
         return True
 
+    def action_register_courses(self):
+        return self._create_course_entries()
+
     def get_course_entry(self, course_id, ):
         return self.env['student.registration.entry'].search([('registration_id', '=', self.id),
                                                               ('course_id', '=', course_id)])
@@ -824,17 +1020,18 @@ class StudentRegistration(models.Model):
         courses = []
         domain = [('level_id', '=', level_id), ('semester_id', '=', semester_id), ('programme_id', '=', programme_id)]
         all_courses = self.env['programme.course.entry'].search(domain)
-        _logger.info("All available courses {}".format(all_courses))
+        _logger.debug("All available courses %s", all_courses)
         # programme = self.env['quickledger.programme'].browse(programme_id)
         for course in all_courses:  # programme.course_ids.filtered(lambda c: c.semester_id.id == semester_id and c.level_id.id == level_id):
             courses.append(course)
         return courses
 
     def _get_outstanding_courses(self, student_id, semester_id):
-        results = self.env['student.result'].search([('student_id', '=', student_id)])
-        return results.outstanding_course_ids.filtered(lambda c: c.semester_id.id == semester_id).ids
+        carry_overs = self.env['student.result.entry']._get_carry_overs([student_id], semester_id)
+        return list(carry_overs.get(student_id, {}))
 
     @api.model
+    @instrumented('student.registration.create')
     def create(self, vals):
         is_legacy = False
         if vals.get('is_legacy', False):
@@ -846,7 +1043,7 @@ class StudentRegistration(models.Model):
             return registration
         # else:
             # self._create_student_result_entries(student_result)
-        #     self._create_course_entries()
+        registration._create_course_entries()
             
         # if registration.semester_id.code == '1st':
         registration._update_balance_carried_forward()
@@ -863,7 +1060,10 @@ class StudentRegistration(models.Model):
 class StudentResultBookEntry(models.Model):
     _description = 'Student Academic Record'
     _name = 'student.result.entry'
+    _inherit = ['quickledger.audit.mixin']
     _order = 'entry_date, session_id, semester_id, level_id'
+    _audit_fields = ['ca_score', 'test_score', 'practicals_score', 'score', 'grade_id', 'is_pass_mark', 'status',
+                     'remarks']
 
     _sql_constraints = [
         ('student_result_uniq',
@@ -882,7 +1082,7 @@ class StudentResultBookEntry(models.Model):
     student_id = fields.Many2one(comodel_name='quickledger.student', string='Student')
     programme_id = fields.Many2one(related='student_id.programme_id', store=True, string='Programme', readonly=True)
     reg_number = fields.Char(related='student_id.matriculation_number', store=True, string='Reg #', readonly=True)
-    student_result_id = fields.Many2one('student.result', 'Result Book')
+    student_result_id = fields.Many2one('student.result', 'Result Book', index=1)
     session_id = fields.Many2one('academic.session', 'Session')
     semester_id = fields.Many2one(comodel_name='quickledger.semester', string='Semester', readonly=True)
     course_id = fields.Many2one(comodel_name='programme.course.entry', string='Course', readonly=True)
@@ -891,7 +1091,7 @@ class StudentResultBookEntry(models.Model):
     course_code = fields.Char(related="course_id.code", string='Course Code', readonly=True, store=True)
     units = fields.Integer(related='course_id.units', string='Units', readonly=True, store=True)
     remarks = fields.Text('Remarks', track_visibility="all")
-    gpa = fields.Float("GPA", compute='_compute_gpa',  store=True)
+    gpa = fields.Float("GPA", compute='_compute_gpa', help="Share of the semester GPA earned by this course")
     ca_score = fields.Float('Examination Score', track_visibility="onchange")
     test_score = fields.Float('Test Score', track_visibility="onchange")
     points = fields.Float(related="grade_id.point", string='Points', readonly=True, store=True)
@@ -905,7 +1105,7 @@ class StudentResultBookEntry(models.Model):
     school_id = fields.Many2one('quickledger.school', 'School', default=_default_school)
     is_pass_mark = fields.Boolean(compute='_compute_is_pass_mark', string="Is Pass Mark?", store=True, readonly=True,
                                   track_visibility="onchange")
-    registration_id = fields.Many2one('student.registration', 'Registration')
+    registration_id = fields.Many2one('student.registration', 'Registration', index=1)
     status = fields.Selection(
         string="Status",
         selection=[
@@ -913,6 +1113,13 @@ class StudentResultBookEntry(models.Model):
             ('Pending', 'Pending Approval'),
             ('Approved', 'Approved')], default='Draft')
 
+    # Fields that move the semester GPA kept on the registration
+    _gpa_fields = ('ca_score', 'test_score', 'practicals_score', 'score', 'status', 'course_id', 'registration_id')
+
+    def init(self):
+        _create_index(self.env.cr, 'student_result_entry_course_session_idx', self._table,
+                      ['course_id', 'session_id'])
+
     def name_get(self):
         result = []
         for record in self:
@@ -920,15 +1127,164 @@ class StudentResultBookEntry(models.Model):
             result.append((record.id, name))
         return result
 
+    @api.model
+    def _get_carry_overs(self, student_ids, semester_id=False):
+        """ {student: {course: latest failed result}} of the courses whose latest approved attempt is a fail
+
+        A course failed with no later pass is carried over; one grouped query covers any number of students.
+        """
+        if not student_ids:
+            return {}
+        self.flush(['student_id', 'course_id', 'session_id', 'entry_date', 'is_pass_mark', 'status'])
+        query = """
+            SELECT r.student_id, r.course_id,
+                   (array_agg(r.id ORDER BY ses.sequence DESC NULLS LAST, r.entry_date DESC NULLS LAST, r.id DESC))[1]
+              FROM student_result_entry r
+              JOIN programme_course_entry c ON c.id = r.course_id
+         LEFT JOIN academic_session ses ON ses.id = r.session_id
+             WHERE r.student_id IN %s AND r.status = 'Approved'
+        """
+        params = [tuple(student_ids)]
+        if semester_id:
+            query += " AND c.semester_id = %s"
+            params.append(semester_id)
+        query += """
+          GROUP BY r.student_id, r.course_id
+            HAVING NOT (array_agg(COALESCE(r.is_pass_mark, FALSE)
+                                  ORDER BY ses.sequence DESC NULLS LAST, r.entry_date DESC NULLS LAST, r.id DESC))[1]
+        """
+        self.env.cr.execute(query, params)
+        carry_overs = {}
+        for student_id, course_id, result_id in self.env.cr.fetchall():
+            carry_overs.setdefault(student_id, {})[course_id] = result_id
+        return carry_overs
+
+    @api.model
+    def _sum_grade_points(self, column, ids):
+        """ (points, units) of approved results filtered on ``column`` and grouped by result book
+
+        Where the school's honour scheme allows grades replacement only one attempt of a course counts,
+        the latest or the best one as the scheme says, picked by a window over the attempts.
+        """
+        assert column in ('id', 'student_result_id')
+        if not ids:
+            return {}
+        self.flush(['student_result_id', 'course_id', 'session_id', 'school_id', 'points', 'units', 'status'])
+        self.env['quickledger.honour.scheme'].flush(['options', 'replacement_policy'])
+        self.env.cr.execute("""
+            WITH attempts AS (
+                SELECT r.student_result_id, r.points, r.units,
+                       hs.options = 'allow_grade_replacement' AS replaces,
+                       ROW_NUMBER() OVER (
+                           PARTITION BY r.student_id, r.course_id
+                               ORDER BY CASE WHEN hs.replacement_policy = 'best' THEN r.points END DESC NULLS LAST,
+                                        ses.sequence DESC NULLS LAST, r.entry_date DESC NULLS LAST, r.id DESC
+                       ) AS attempt
+                  FROM student_result_entry r
+             LEFT JOIN academic_session ses ON ses.id = r.session_id
+             LEFT JOIN quickledger_school s ON s.id = r.school_id
+             LEFT JOIN quickledger_honour_scheme hs ON hs.id = s.honour_scheme_id
+                 WHERE r.{} IN %s AND r.status = 'Approved'
+            )
+            SELECT student_result_id, SUM(points * units), SUM(units)
+              FROM attempts
+             WHERE replaces IS NOT TRUE OR attempt = 1
+          GROUP BY student_result_id
+        """.format(column), (tuple(ids),))
+        return {book_id: (points or 0.0, units or 0) for book_id, points, units in self.env.cr.fetchall()}
+
+    @api.model
+    def apply_score_sheet(self, course, session, rows):
+        """ Records the scores of one course and session keyed by reg number, ``rows`` is {reg #: {field: score}}
+
+        Result entries are matched by reg number in one query and registered students without one get theirs
+        from a single multi-create. Entries sharing the same scores are written together, so the grade fields
+        are recomputed once for the whole sheet.
+        """
+        rows = {reg_number.strip().upper(): scores for reg_number, scores in rows.items() if reg_number}
+        summary = {'updated': 0, 'created': 0, 'unmatched': []}
+        if not rows:
+            return summary
+        self.flush(['reg_number', 'course_id', 'session_id'])
+        self.env.cr.execute("""
+            SELECT upper(reg_number), id
+              FROM student_result_entry
+             WHERE course_id = %s AND session_id = %s AND upper(reg_number) IN %s
+        """, (course.id, session.id, tuple(rows)))
+        entries = dict(self.env.cr.fetchall())
+
+        missing = tuple(reg_number for reg_number in rows if reg_number not in entries)
+        vals_list = []
+        if missing:
+            self.env['student.registration.entry'].flush(['registration_id', 'student_id', 'course_id',
+                                                          'session_id'])
+            self.env.cr.execute("""
+                SELECT upper(s.matriculation_number), s.id, b.id, reg.id, reg.semester_id, reg.level_id
+                  FROM student_registration_entry re
+                  JOIN student_registration reg ON reg.id = re.registration_id
+                  JOIN quickledger_student s ON s.id = re.student_id
+             LEFT JOIN student_result b ON b.student_id = s.id
+                 WHERE re.course_id = %s AND re.session_id = %s AND upper(s.matriculation_number) IN %s
+            """, (course.id, session.id, missing))
+            for reg_number, student_id, book_id, registration_id, semester_id, level_id in self.env.cr.fetchall():
+                vals = {'student_result_id': book_id,
+                        'student_id': student_id,
+                        'course_id': course.id,
+                        'semester_id': semester_id,
+                        'level_id': level_id,
+                        'session_id': session.id,
+                        'registration_id': registration_id,
+                        'status': 'Pending'}
+                vals.update(rows[reg_number])
+                vals_list.append(vals)
+                entries[reg_number] = None
+        summary['unmatched'] = sorted(reg_number for reg_number in rows if reg_number not in entries)
+
+        groups = {}
+        for reg_number, entry_id in entries.items():
+            if entry_id:
+                groups.setdefault(tuple(sorted(rows[reg_number].items())), []).append(entry_id)
+        ResultEntry = self.with_context(defer_gpa_refresh=True)
+        entry_ids = []
+        for scores, ids in groups.items():
+            ResultEntry.browse(ids).write(dict(scores))
+            entry_ids += ids
+        summary['updated'] = len(entry_ids)
+        if vals_list:
+            entry_ids += ResultEntry.create(vals_list).ids
+            summary['created'] = len(vals_list)
+        self.browse(entry_ids).mapped('registration_id')._refresh_gpa()
+        return summary
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super(StudentResultBookEntry, self).create(vals_list)
+        if not self.env.context.get('defer_gpa_refresh'):
+            records.mapped('registration_id')._refresh_gpa()
+        return records
+
     def write(self, vals):
+        refresh = not self.env.context.get('defer_gpa_refresh') and any(f in vals for f in self._gpa_fields)
+        registrations = self.mapped('registration_id') if refresh else None
+        records = self
+        result = True
         if 'score' in vals or 'ca_score' in vals or 'test_score' in vals or 'practicals_score' in vals or 'status' in vals:
-            if self.status == "Draft":
-                vals['status'] = 'Pending'
-            else:
-                points = self.grade_id.point * self.units
-                vals['points_obtained'] = points
+            # Scoring a draft entry submits it for approval, whatever else the recordset holds
+            drafts = self.filtered(lambda r: r.status == 'Draft')
+            if drafts and vals.get('status') != 'Pending':
+                result = super(StudentResultBookEntry, drafts).write(dict(vals, status='Pending'))
+                records = self - drafts
+
+        result = super(StudentResultBookEntry, records).write(vals) and result
+        if refresh:
+            (registrations | self.mapped('registration_id'))._refresh_gpa()
+        return result
 
-        return super(StudentResultBookEntry, self).write(vals)
+    def unlink(self):
+        registrations = self.mapped('registration_id')
+        result = super(StudentResultBookEntry, self).unlink()
+        registrations.exists()._refresh_gpa()
+        return result
 
     @api.constrains('practicals_score', 'test_score', 'ca_score')
     def _check_score_lesser_than_100(self):
@@ -962,21 +1318,20 @@ class StudentResultBookEntry(models.Model):
 
     @api.depends('ca_score', 'practicals_score', 'test_score')
     def _compute_grade(self):
+        grades = {}
         for record in self:
             grading_scheme = record.school_id.grading_scheme_id
             total_score = record.ca_score + record.practicals_score + record.test_score
-            record.grade_id = grading_scheme.get_grade(total_score)
+            if (grading_scheme.id, total_score) not in grades:
+                grades[grading_scheme.id, total_score] = grading_scheme.get_grade(total_score)
+            record.grade_id = grades[grading_scheme.id, total_score]
 
-    @api.depends('ca_score', 'practicals_score', 'test_score')
+    @api.depends('grade_id.is_pass_mark')
     def _compute_is_pass_mark(self):
         for record in self:
-            grading_scheme = record.school_id.grading_scheme_id
-            total_score = record.ca_score + record.practicals_score + record.test_score
-            grade_id = grading_scheme.get_grade(total_score)
-            grade = self.env['quickledger.grade'].browse(grade_id)
-            record.is_pass_mark = grade.is_pass_mark
+            record.is_pass_mark = record.grade_id.is_pass_mark
 
-    @api.depends('ca_score', 'practicals_score', 'test_score')
+    @api.depends('grade_id.point', 'units')
     def _compute_points_obtained(self):
         for record in self:
             if record.grade_id:
@@ -988,12 +1343,11 @@ class StudentResultBookEntry(models.Model):
             total_score = record.ca_score + record.practicals_score + record.test_score
             record.score = total_score
             
-    @api.depends('registration_id.entry_ids')
+    @api.depends('points_obtained', 'registration_id.total_credit_units')
     def _compute_gpa(self):
         for record in self:
-            if record.registration_id and record.registration_id.entry_ids:
-                if record.registration_id.total_credit_units:
-                    record.gpa = record.points_obtained/record.registration_id.total_credit_units
+            total_credit_units = record.registration_id.total_credit_units
+            record.gpa = record.points_obtained / total_credit_units if total_credit_units else 0.0
 
 
 class StudentLedger(models.Model):
@@ -1005,16 +1359,17 @@ class StudentLedger(models.Model):
     def _default_school(self):
         return self.env['quickledger.school'].search([('name', '=', 'Nnamdi Azikiwe University')], limit=1)
 
-    student_id = fields.Many2one(comodel_name='quickledger.student', string='Student', required=True)
-    image = fields.Binary(string='Passport', related="student_id.image", stored=True)
+    student_id = fields.Many2one(comodel_name='quickledger.student', string='Student', required=True, index=1)
+    image = fields.Binary(string='Passport', related="student_id.image")
+    image_medium = fields.Binary(string='Passport', related="student_id.image_medium")
+    image_small = fields.Binary(string='Passport', related="student_id.image_small")
     matriculation_number = fields.Char(related="student_id.matriculation_number", readonly=True, store=True)
     programme_id = fields.Many2one(related='student_id.programme_id', string='Programme', store=True, readonly=True)
-    total_amount_paid = fields.Monetary(compute='_compute_amount_paid', currency_field='currency_id',
-                                        string="Total Amount Paid", store=True, readonly=True)
-    total_amount_due = fields.Monetary(compute='_compute_amount_due', currency_field='currency_id',
-                                       string="Total Amount Due", store=True, readonly=True)
-    total_balance = fields.Monetary(compute='_compute_balance', currency_field='currency_id', string="Amount Outstanding",
-                                    store=True, readonly=True)
+    # Totals are kept up to date by the deltas of fee, payment and balance b/f changes, see _apply_deltas
+    total_amount_paid = fields.Monetary(currency_field='currency_id', string="Total Amount Paid", readonly=True)
+    total_amount_due = fields.Monetary(currency_field='currency_id', string="Total Amount Due", readonly=True)
+    total_balance = fields.Monetary(currency_field='currency_id', string="Amount Outstanding", readonly=True,
+                                    index=True)
     balance_brought_forward = fields.Monetary(currency_field='currency_id', related="student_id.balance_brought_forward",
                                                string="Balance B/F", readonly=True)
     opening_balance = fields.Monetary(currency_field='currency_id', string="Opening Debit Balance", readonly=True)
@@ -1031,11 +1386,98 @@ class StudentLedger(models.Model):
                                     string="Completed Payments", readonly=True)
     current_charges = fields.Monetary(currency_field='currency_id', string="Current Charges/Fees", readonly=True)
     
+    @api.model_create_multi
+    def create(self, vals_list):
+        for vals in vals_list:
+            student = self.env['quickledger.student'].browse(vals['student_id'])
+            vals['opening_balance'] = student.balance_brought_forward
+        ledgers = super(StudentLedger, self).create(vals_list)
+        ledgers._repair_totals()
+        return ledgers
+
     @api.model
-    def create(self, vals):
-        student = self.env['quickledger.student'].browse(vals['student_id'])
-        vals['opening_balance'] = student.balance_brought_forward
-        return super(StudentLedger, self).create(vals)
+    @instrumented('student.ledger._apply_deltas')
+    def _apply_deltas(self, deltas):
+        """ Adds {ledger: {total field: delta}} to the stored totals with a single UPDATE
+
+        Paying a fee or billing one moves the totals by its own amount instead of re-summing the whole history
+        of the ledger, and the increments hold under concurrent payments on the same ledger.
+        """
+        deltas = {ledger_id: delta for ledger_id, delta in deltas.items() if ledger_id and any(delta.values())}
+        if not deltas:
+            return
+        ledger_ids = list(deltas)
+        self.flush(['total_amount_due', 'total_amount_paid', 'total_balance'])
+        self.env.cr.execute("""
+            UPDATE student_ledger l
+               SET total_amount_due = COALESCE(l.total_amount_due, 0) + v.amount_due,
+                   total_amount_paid = COALESCE(l.total_amount_paid, 0) + v.amount_paid,
+                   total_balance = COALESCE(l.total_balance, 0) + v.balance
+              FROM unnest(%s::int[], %s::numeric[], %s::numeric[], %s::numeric[])
+                   AS v(id, amount_due, amount_paid, balance)
+             WHERE l.id = v.id
+        """, (ledger_ids,
+              [deltas[l].get('total_amount_due', 0.0) for l in ledger_ids],
+              [deltas[l].get('total_amount_paid', 0.0) for l in ledger_ids],
+              [deltas[l].get('total_balance', 0.0) for l in ledger_ids]))
+        self.browse(ledger_ids).invalidate_cache(['total_amount_due', 'total_amount_paid', 'total_balance'])
+
+    def _get_totals(self):
+        """ LEDGER_TOTALS_QUERY rows of these ledgers """
+        if not self:
+            return []
+        self.env['academic.fee.entry'].flush(['ledger_id', 'amount_due', 'amount_paid'])
+        self.env['academic.payment.entry'].flush(['ledger_id', 'amount'])
+        self.env['quickledger.student'].flush(['balance_brought_forward'])
+        self.flush(['total_amount_due', 'total_amount_paid', 'total_balance', 'opening_balance'])
+        self.env.cr.execute(LEDGER_TOTALS_QUERY.format(ledgers='IN %(ledgers)s'), {'ledgers': tuple(self.ids)})
+        return self.env.cr.fetchall()
+
+    @api.model
+    def _get_expected_totals(self, ledger_ids):
+        """ {ledger: (amount due, amount paid, balance)} re-summed from the fee and payment entries """
+        return {row[0]: row[4:7] for row in self.browse(ledger_ids)._get_totals()}
+
+    def _find_drift(self):
+        """ {ledger: (expected due, paid, balance)} of the ledgers whose stored totals are off by a kobo or more """
+        return {row[0]: row[4:7] for row in self._get_totals() if has_drifted(row)}
+
+    def _repair_totals(self, expected=None):
+        """ Overwrites the stored totals with the re-summed ones, ``expected`` as _get_expected_totals returns """
+        if expected is None:
+            expected = self._get_expected_totals(self.ids)
+        if not expected:
+            return
+        ledger_ids = list(expected)
+        self.env.cr.execute("""
+            UPDATE student_ledger l
+               SET total_amount_due = v.amount_due, total_amount_paid = v.amount_paid, total_balance = v.balance
+              FROM unnest(%s::int[], %s::numeric[], %s::numeric[], %s::numeric[])
+                   AS v(id, amount_due, amount_paid, balance)
+             WHERE l.id = v.id
+        """, (ledger_ids, [expected[l][0] for l in ledger_ids], [expected[l][1] for l in ledger_ids],
+              [expected[l][2] for l in ledger_ids]))
+        self.browse(ledger_ids).invalidate_cache(['total_amount_due', 'total_amount_paid', 'total_balance'])
+
+    @api.model
+    @instrumented('student.ledger.reconcile_totals')
+    def reconcile_totals(self, chunk_size=5000):
+        """ Scheduled: re-sums every ledger a chunk at a time and repairs the totals that drifted """
+        last_id = 0
+        drifted = 0
+        while True:
+            self.env.cr.execute("SELECT id FROM student_ledger WHERE id > %s ORDER BY id LIMIT %s",
+                                (last_id, chunk_size))
+            ledger_ids = [row[0] for row in self.env.cr.fetchall()]
+            if not ledger_ids:
+                break
+            drift = self.browse(ledger_ids)._find_drift()
+            self._repair_totals(drift)
+            self.env.cr.commit()
+            drifted += len(drift)
+            last_id = ledger_ids[-1]
+        _logger.info("Ledger totals reconciled, %s ledgers had drifted", drifted)
+        return drifted
     
     def preview_ledger(self):
         self.ensure_one()
@@ -1099,24 +1541,6 @@ class StudentLedger(models.Model):
                     fee_ids.append(fee.id)
             record.update({'paid_fee_ids': [(6, 0, fee_ids)]})
 
-    @api.depends('payment_entry_ids')
-    def _compute_amount_paid(self):
-        for record in self:
-            record.total_amount_paid = sum([payment.amount for payment in record.payment_entry_ids])
-
-    @api.depends('fee_entry_ids.balance', 'payment_entry_ids')
-    def _compute_balance(self):
-        for record in self:
-            balance = abs(record.balance_brought_forward) + sum([fee.balance for fee in record.fee_entry_ids])
-            # amount_paid = sum([payment.amount for payment in record.payment_entry_ids])
-            record.total_balance = balance
-
-    @api.depends('fee_entry_ids.amount_due')
-    def _compute_amount_due(self):
-        for record in self:
-            total_amount_due = record.opening_balance + sum([fee.amount_due for fee in record.fee_entry_ids])
-            record.total_amount_due = total_amount_due
-    
     def name_get(self):
         result = []
         for record in self:
@@ -1168,7 +1592,7 @@ class AcademicPaymentEntry(models.Model):
     programme_id = fields.Many2one(related='student_id.programme_id', string='Programme', readonly=True, store=True)
     faculty_id = fields.Many2one(related='student_id.faculty_id', string='Faculty', readonly=True, store=True)
     department_id = fields.Many2one(related='student_id.faculty_id', string='Department', readonly=True, store=True)
-    ledger_id = fields.Many2one('student.ledger', string='Ledger', readonly=True)
+    ledger_id = fields.Many2one('student.ledger', string='Ledger', readonly=True, index=1)
     level_id = fields.Many2one('quickledger.level', string='Level', required=True)
     session_id = fields.Many2one('academic.session', 'Session', required=True)
     amount = fields.Monetary('Amount Paid', currency_field='currency_id', readonly=True)
@@ -1190,6 +1614,34 @@ class AcademicPaymentEntry(models.Model):
             result.append((record.id, name))
         return result
 
+    def _get_ledger_deltas(self, sign=1):
+        """ {ledger: {total field: amount}} these payments add to the ledger totals, or take off with ``sign=-1`` """
+        deltas = {}
+        for payment in self:
+            delta = deltas.setdefault(payment.ledger_id.id, {'total_amount_paid': 0.0})
+            delta['total_amount_paid'] += sign * (payment.amount or 0.0)
+        return deltas
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        payments = super(AcademicPaymentEntry, self).create(vals_list)
+        self.env['student.ledger']._apply_deltas(payments._get_ledger_deltas())
+        return payments
+
+    def write(self, vals):
+        moves_ledger = 'amount' in vals or 'ledger_id' in vals
+        before = self._get_ledger_deltas(-1) if moves_ledger else {}
+        result = super(AcademicPaymentEntry, self).write(vals)
+        if moves_ledger:
+            self.env['student.ledger']._apply_deltas(sum_deltas(before, self._get_ledger_deltas()))
+        return result
+
+    def unlink(self):
+        deltas = self._get_ledger_deltas(-1)
+        result = super(AcademicPaymentEntry, self).unlink()
+        self.env['student.ledger']._apply_deltas(deltas)
+        return result
+
     @api.depends('amount')
     def _compute_balance(self):
         for record in self:
@@ -1223,9 +1675,9 @@ class AcademicFeeEntry(models.Model):
     amount_paid = fields.Monetary('Amount Paid', currency_field='currency_id')
     entry_date = fields.Date('Entry Date', default=_get_default_date)
     payment_date = fields.Date('Payment Date', default=_get_default_date)
-    registration_id = fields.Many2one('student.registration', 'Registration')
+    registration_id = fields.Many2one('student.registration', 'Registration', index=1)
     ledger_entry_id = fields.Many2one('student.ledger.entry', string='Ledger Entry', readonly=True)
-    ledger_id = fields.Many2one('student.ledger', string='Ledger', readonly=True)
+    ledger_id = fields.Many2one('student.ledger', string='Ledger', readonly=True, index=1)
     student_id = fields.Many2one(related='registration_id.student_id', store=True, readonly=True)
     programme_id = fields.Many2one(related='registration_id.programme_id', string='Programme', store=True,
                                    readonly=True)
@@ -1239,17 +1691,58 @@ class AcademicFeeEntry(models.Model):
     school_id = fields.Many2one('quickledger.school', 'School', default=_default_school)
     faculty_id = fields.Many2one(related='registration_id.faculty_id', string='Faculty', store=True, readonly=True)
     department_id = fields.Many2one(related='registration_id.department_id', string='Department', store=True, readonly=True)
-
-    @api.model
-    def create(self, vals):
-        vals['amount_due'] = self.env['academic.fee'].browse(vals['fee_id']).amount
-        fee = super(AcademicFeeEntry, self).create(vals)
-        return fee
+    penalty_for_id = fields.Many2one('academic.fee.entry', 'Surcharge For', readonly=True, index=1,
+                                     help="Fee whose payment term this late payment surcharge was charged for")
+
+    def init(self):
+        _create_index(self.env.cr, 'academic_fee_entry_type_session_idx', self._table, ['type_id', 'session_id'])
+        _create_index(self.env.cr, 'academic_fee_entry_session_unpaid_idx', self._table,
+                      ['session_id', 'entry_date'], where='balance > 0')
+
+    def _check_session_open(self):
+        """ Billing of a closed session is locked, payments against its fees are still taken """
+        closed = self.mapped('session_id').filtered('is_closed')
+        if closed:
+            raise exceptions.UserError("Fees of {} are locked by its year-end close".format(
+                ", ".join(closed.mapped('name'))))
+
+    def _get_ledger_deltas(self, sign=1):
+        """ {ledger: {total field: amount}} these entries add to the ledger totals, or take off with ``sign=-1`` """
+        deltas = {}
+        for fee in self:
+            delta = deltas.setdefault(fee.ledger_id.id, {'total_amount_due': 0.0, 'total_balance': 0.0})
+            delta['total_amount_due'] += sign * (fee.amount_due or 0.0)
+            delta['total_balance'] += sign * ((fee.amount_due or 0.0) - (fee.amount_paid or 0.0))
+        return deltas
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        for vals in vals_list:
+            vals['amount_due'] = self.env['academic.fee'].browse(vals['fee_id']).amount
+        fees = super(AcademicFeeEntry, self).create(vals_list)
+        fees._check_session_open()
+        self.env['student.ledger']._apply_deltas(fees._get_ledger_deltas())
+        return fees
     
     def write(self, vals):
+        if any(name in vals for name in LOCKED_FEE_FIELDS):
+            self._check_session_open()
+        moves_ledger = 'amount_due' in vals or 'amount_paid' in vals or 'ledger_id' in vals
+        before = self._get_ledger_deltas(-1) if moves_ledger else {}
         fee = super(AcademicFeeEntry, self).write(vals)
+        if 'registration_id' in vals:
+            self._check_session_open()
+        if moves_ledger:
+            self.env['student.ledger']._apply_deltas(sum_deltas(before, self._get_ledger_deltas()))
         return fee
 
+    def unlink(self):
+        self._check_session_open()
+        deltas = self._get_ledger_deltas(-1)
+        result = super(AcademicFeeEntry, self).unlink()
+        self.env['student.ledger']._apply_deltas(deltas)
+        return result
+
     def name_get(self):
         result = []
         for record in self:
@@ -1301,6 +1794,7 @@ class AcademicFee(models.Model):
     classification_id = fields.Many2one('quickledger.faculty.classification', string="Classification", required=True)
     number_of_certificates = fields.Selection(string="Number of Certicates", 
                                       selection=[('1', '1'), ('2', '2')], default="1")
+    reprice_ids = fields.One2many('academic.fee.reprice', 'fee_id', 'Re-pricing History', readonly=True)
     
     @api.model
     def create(self, vals):
@@ -1352,6 +1846,17 @@ class AcademicFee(models.Model):
 
         return {'value': v}
 
+    def action_reprice(self):
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_window',
+            'name': 'Re-price {}'.format(self.name),
+            'res_model': 'academic.fee.reprice',
+            'view_mode': 'form',
+            'target': 'new',
+            'context': {'default_fee_id': self.id, 'default_amount': self.amount},
+        }
+
 
 class PaymentType(models.Model):
     _name = 'payment.type'
@@ -1401,6 +1906,7 @@ class StateLga(models.Model):
 class LegacyStudentResult(models.Model):
     """ Defining Template For Student Result Import"""
     _name = "academic.legacy.student.result"
+    _inherit = ['quickledger.import.mixin']
     _description = "Legacy Student Result"
     _order = "matric asc"
     _rec_name = "course"
@@ -1418,12 +1924,15 @@ class LegacyStudentResult(models.Model):
     grade = fields.Char('Grade')
     status = fields.Selection(
         string='Status',
-        selection=[('New', 'New'), ('Failed', 'Failed'), ('Processed', 'Processed')],
+        selection=[('New', 'New'), ('Failed', 'Failed'), ('Dead', 'Dead Letter'), ('Processed', 'Processed')],
         default='New',
         readonly=True
     )
     remarks = fields.Char('Remarks')
 
+    def init(self):
+        _create_staging_index(self.env.cr, self._table)
+
     def _check_if_result_exist(self, student_id, course_id, session_id):
         domain = [('session_id', '=', session_id), ('student_id', '=', student_id), ('course_id', '=', course_id)]
         result = self.env['student.result.entry'].search_count(domain)
@@ -1496,20 +2005,21 @@ class LegacyStudentResult(models.Model):
         domain = [('student_id', '=', student_id), ('session_id', '=', session_id),
                   ('course_id', '=', course_id)]
         result = self.env['student.result.entry'].search(domain)
-        _logger.info("Executing update_result_record {} ".format(result))
+        _logger.debug("Executing update_result_record %s", result)
         if result:
-            _logger.info("Updating Result {}".format(result))
             vals = {'status': 'Approved', 'ca_score': self.exam, 'test_score': self.test,
                     'practicals_score': self.practicals}
             result.write(vals)
-            _logger.info("Result updated to {}".format(result))
+            _logger.debug("Result updated to %s", result)
 
+    @instrumented('academic.legacy.student.result.action_process')
     def action_process(self):
         for record in self:
             if record.status == "Processed":
                 return True
             else:
                 try:
+                    record._import_phase('lookup')
                     student = self.env['quickledger.student'].search([('matriculation_number', '=', record.matric)])
                     if not student:
                         raise ValueError("Student with the matric number {} was not found".format(record.matric))
@@ -1540,6 +2050,7 @@ class LegacyStudentResult(models.Model):
 
                     result_book = self.env['student.result'].search([('student_id', '=', student.id)])
                     registration = record.check_registration_record(student.id, session.id, semester.id)
+                    record._import_phase('write')
                     registration = registration if registration else record.create_registration_record(student,
                                                                                                        session.id,
                                                                                                        level.id,
@@ -1551,10 +2062,10 @@ class LegacyStudentResult(models.Model):
                     result_book.action_recompute_cgpa()
 
                 except ValueError as e:
-                    return record.write({'status': 'Failed', 'remarks': e})
+                    return record.write(record._import_failed(e))
 
                 except Exception as e:
-                    return record.write({'status': 'Failed', 'remarks': e})
+                    return record.write(record._import_failed(e))
 
                 return record.write({'status': 'Processed', 'remarks': 'Processed Successfully'})
 
@@ -1562,6 +2073,7 @@ class LegacyStudentResult(models.Model):
 class LegacyPayment(models.Model):
     """ Defining Template For Student Import"""
     _name = "legacy.payment"
+    _inherit = ['quickledger.import.mixin']
     _description = "Legacy Payment"
     _order = "matric asc"
 
@@ -1578,11 +2090,14 @@ class LegacyPayment(models.Model):
     purpose = fields.Char('PURPOSE', required=True)
     status = fields.Selection(
         string='Status',
-        selection=[('New', 'New'), ('Failed', 'Failed'), ('Processed', 'Processed')],
+        selection=[('New', 'New'), ('Failed', 'Failed'), ('Dead', 'Dead Letter'), ('Processed', 'Processed')],
         default='New',
         readonly=True
     )
     remarks = fields.Char('Remarks')
+
+    def init(self):
+        _create_staging_index(self.env.cr, self._table)
     
     def _is_valid_date(self, date_text):
         try:
@@ -1645,12 +2160,14 @@ class LegacyPayment(models.Model):
         return self.env['academic.payment.entry'].create(vals)
     
 
+    @instrumented('legacy.payment.action_process')
     def action_process(self):
         for record in self:
             if record.status == "Processed":
                 return True
             else:
                 try:
+                    record._import_phase('lookup')
                     transaction_details = {
                         'amount': record.amount, 
                         'payment_date': record.payment_date
@@ -1669,9 +2186,9 @@ class LegacyPayment(models.Model):
                     if record.teller_number:
                         transaction_details['teller_number'] = record.teller_number
                     
-                    dept = self.env['academic.department'].search(['|',
-                                                                   ('previous_code', '=', record.dept),
-                                                                   ('code', '=', record.dept)])
+                    dept = self.env['quickledger.department'].search(['|',
+                                                                     ('previous_code', '=', record.dept),
+                                                                     ('code', '=', record.dept)])
                     if not dept:
                         raise ValueError(f"Invalid Department Code {record.dept}")
                    
@@ -1680,18 +2197,18 @@ class LegacyPayment(models.Model):
                     if not level:
                         raise ValueError("Invalid Level {}".format(record.level))
                          
-                    diploma_id = level.diploma_id.id
-                    semester = self.env["academic.semester"].search([("code", '=', '1st')])
+                    semester = self.env["quickledger.semester"].search([("code", '=', '1st')], limit=1)
                     session = self.env["academic.session"].search([("code", '=', record.session)])
                    
                     if not session:
                         raise ValueError("Invalid Session {}".format(record.session))
                    
-                    student = self.env["student.student"].search([("matriculation_number", '=', record.matric)])
+                    student = self.env["quickledger.student"].search([("matriculation_number", '=', record.matric)])
                     if not student:
                         raise ValueError("Student with Matric Number {} not found".format(record.matric))
 
                     registration = self.env['student.registration'].search([('semester_id', '=', semester.id),('student_id', '=', student.id),('session_id', '=', session.id)])
+                    record._import_phase('write')
                     if not registration:
                         registration = self.env['student.registration'].create({
                             'student_id': student.id,
@@ -1732,11 +2249,11 @@ class LegacyPayment(models.Model):
                     self._create_payment_entry(student.id, session.id, level.id, transaction_details)                        
                 
                 except ValueError as e:
-                    record.write({'status': "Failed", 'remarks': e})
+                    record.write(record._import_failed(e))
                     return False
                 
                 except Exception as e:
-                    record.write({'status': "Failed", 'remarks': e})
+                    record.write(record._import_failed(e))
                     return False
                 
                 record.write({'status': "Processed", 'remarks': "Successfully"})
@@ -1746,6 +2263,7 @@ class LegacyPayment(models.Model):
 class LegacyStudent(models.Model):
     """ Defining Template For Student Import"""
     _name = "academic.legacy.student"
+    _inherit = ['quickledger.import.mixin']
     _description = "Legacy Student"
     _order = "matric asc"
 
@@ -1758,12 +2276,15 @@ class LegacyStudent(models.Model):
     dept = fields.Char('Dept', required=True)
     status = fields.Selection(
         string='Status',
-        selection=[('New', 'New'), ('Failed', 'Failed'), ('Processed', 'Processed')],
+        selection=[('New', 'New'), ('Failed', 'Failed'), ('Dead', 'Dead Letter'), ('Processed', 'Processed')],
         default='New',
         readonly=True
     )
     remarks = fields.Char('Remarks')
 
+    def init(self):
+        _create_staging_index(self.env.cr, self._table)
+
     # NAU/2001/484557
     def _get_admission_year(self):
         parts = str(self.matric).split("/")
@@ -1775,71 +2296,142 @@ class LegacyStudent(models.Model):
         else:
             raise ValueError("Invalid Registration Number {}".format(self.matric))
 
+    def _get_admission_session_code(self):
+        admission_year = self._get_admission_year()
+        return str(admission_year) + "/" + str(admission_year + 1)
+
+    def _map_programmes(self, departments):
+        """ Programmes of the departments keyed by (department, degree type), UME entry preferred """
+        default_status = self.env['quickledger.programme']._get_default_status()
+        programmes = {}
+        for programme in self.env['quickledger.programme'].search([('department_id', 'in', departments.ids)]):
+            key = (programme.department_id.id, programme.diploma_id.type_id.id)
+            if key not in programmes or programme.entry_status_id == default_status:
+                programmes[key] = programme
+        return programmes
+
+    @instrumented('academic.legacy.student.action_process')
     def action_process(self):
-        for record in self:
-            if record.status == "Processed":
-                return True
-            else:
-                try:
-                    vals = {'matriculation_number': record.matric}
-                    admission_year = self._get_admission_year()
-                    admission_year_upper_bound = int(admission_year) + 1
-                    code = str(admission_year) + "/" + str(admission_year_upper_bound)
-                    session = self.env['academic.session'].search([('code', '=', code)])
-
-                    if session:
-                        vals['admission_year_id'] = session.id
-                    else:
-                        raise ValueError("Invalid Registration number {}".format(record.matric))
-                    if record.phone:
-                        vals['phone'] = "0" + record.phone
-
-                    level = self.env['quickledger.level'].search([('code', '=', record.level)])
-                    if not level:
-                        raise ValueError("Invalid Level {}".format(record.level))
-
-                    diploma_id = level.diploma_id.id
-                    dept = self.env['quickledger.department'].search(
-                        ['|', ('code', '=', record.dept), ('previous_code', '=', record.dept)])
-
-                    if not dept:
-                        raise ValueError("Invalid Department Code {}".format(record.dept))
-                    programme = self.env['quickledger.programme'].search([('department_id', '=', dept.id),
-                                                                          ('diploma_id', '=', diploma_id)])
-                    
-                    if not programme:
-                        raise ValueError("Invalid Programme {} {} ".format(diploma_id.code, dept.name))
-
-                    vals['level_id'] = level.id
-                    vals['programme_id'] = programme.id
-
-                    # Searches to see if the record already exists
-                    student = self.env['quickledger.student'].search(
-                        [('matriculation_number', '=', vals['matriculation_number'])])
-                    if student:
-                        self.write({'status': 'Processed', 'remarks': 'Processed Successfully'})
-                        _logger.info("{} already exists".format(vals['matriculation_number']))
-                        return True
-                    else:
-                        self.env['quickledger.student'].create(vals)
-
-                except ValueError as v:
-                    # _logger.info(v)
-                    self.write({'status': 'Failed', 'remarks': v})
-                    return False
+        return self._process_batch()
 
-                except Exception as e:
-                    # _logger.info(e)
-                    self.write({'status': 'Failed', 'remarks': e})
-                    return False
+    def _process_batch(self):
+        """ Admits a whole staging batch with one lookup per master table and one student multi-create """
+        rows = self.filtered(lambda r: r.status != "Processed")
+        if not rows:
+            return True
+        rows._import_phase('lookup')
 
-                self.write({'status': 'Processed', 'remarks': 'Processed Successfully'})
-                return True
+        session_codes = {}
+        failures = {}
+        for record in rows:
+            try:
+                session_codes[record] = record._get_admission_session_code()
+            except ValueError as e:
+                failures[record] = e
+
+        sessions = self.env['academic.session'].search([('code', 'in', list(set(session_codes.values())))])
+        session_codes_found = set(sessions.mapped('code'))
+        levels = {level.code: level for level in
+                  self.env['quickledger.level'].search([('code', 'in', list(set(rows.mapped('level'))))])}
+        dept_codes = list(set(rows.mapped('dept')))
+        departments = self.env['quickledger.department'].search(
+            ['|', ('code', 'in', dept_codes), ('previous_code', 'in', dept_codes)])
+        departments_by_code = {dept.previous_code: dept for dept in departments if dept.previous_code}
+        departments_by_code.update({dept.code: dept for dept in departments})
+        programmes = self._map_programmes(departments)
+        existing = set(student['matriculation_number'] for student in self.env['quickledger.student'].search_read(
+            [('matriculation_number', 'in', rows.mapped('matric'))], ['matriculation_number']))
+
+        admissions = []
+        admitted_by = {}
+        duplicates = []
+        processed = self.browse()
+        for record in rows:
+            if record in failures:
+                continue
+            try:
+                if session_codes[record] not in session_codes_found:
+                    raise ValueError("Invalid Registration number {}".format(record.matric))
+
+                level = levels.get(record.level)
+                if not level:
+                    raise ValueError("Invalid Level {}".format(record.level))
+
+                dept = departments_by_code.get(record.dept)
+                if not dept:
+                    raise ValueError("Invalid Department Code {}".format(record.dept))
+
+                programme = programmes.get((dept.id, level.type_id.id))
+                if not programme:
+                    raise ValueError("Invalid Programme {} {} ".format(level.type_id.name, dept.name))
+            except ValueError as e:
+                failures[record] = e
+                continue
+
+            if record.matric in existing:
+                _logger.debug("%s already exists", record.matric)
+                processed |= record
+                continue
+            if record.matric in admitted_by:
+                duplicates.append(record)
+                continue
+            admitted_by[record.matric] = record
+
+            vals = {'name': record.name, 'matriculation_number': record.matric, 'programme_id': programme.id}
+            if record.application_number:
+                vals['application_number'] = record.application_number
+            if record.email:
+                vals['email'] = record.email
+            if record.phone:
+                vals['phone'] = "0" + record.phone
+            admissions.append((record, vals))
+
+        rows._import_phase('write')
+        processed |= self._create_admissions(admissions, failures)
+        # A row repeating a matric of this batch is done only once the row admitting it has been
+        for record in duplicates:
+            if admitted_by[record.matric] in processed:
+                processed |= record
+            else:
+                failures[record] = ValueError("{} was not admitted by the row it repeats".format(record.matric))
+        for record, error in failures.items():
+            record.write(record._import_failed(error))
+        processed.write({'status': 'Processed', 'remarks': 'Processed Successfully'})
+        rows._import_phase(None)
+        return not failures
+
+    def _create_admissions(self, admissions, failures):
+        """ Creates the students in one go, falling back to row by row to isolate the failing rows """
+        Student = self.env['quickledger.student']
+        created = self.browse([record.id for record, _vals in admissions])
+        if not admissions:
+            return created
+        Student.flush()
+        try:
+            with self.env.cr.savepoint():
+                Student.create([vals for _record, vals in admissions])
+                Student.flush()
+            return created
+        except Exception:
+            _logger.debug("Batch admission failed, retrying row by row")
+            self.env.clear()
+        created = self.browse()
+        for record, vals in admissions:
+            try:
+                with self.env.cr.savepoint():
+                    Student.create(vals)
+                    Student.flush()
+                created |= record
+            except Exception as e:
+                self.env.clear()
+                failures[record] = e
+        return created
 
 
 class SchoolCourse(models.Model):
     """ Defining Template For Course Import"""
     _name = "academic.school.course"
+    _inherit = ['quickledger.import.mixin']
     _description = "Course Import"
     _order = "title asc"
     _rec_name = "title"
@@ -1854,12 +2446,15 @@ class SchoolCourse(models.Model):
     option = fields.Char('Option', required=False)
     status = fields.Selection(
         string='Status',
-        selection=[('New', 'New'), ('Failed', 'Failed'), ('Processed', 'Processed')],
+        selection=[('New', 'New'), ('Failed', 'Failed'), ('Dead', 'Dead Letter'), ('Processed', 'Processed')],
         default='New',
         readonly=True
     )
     remarks = fields.Char('Remarks')
 
+    def init(self):
+        _create_staging_index(self.env.cr, self._table)
+
     def partition(self, data):
         if " " in data:
             return data
@@ -1867,100 +2462,152 @@ class SchoolCourse(models.Model):
             parts = re.split('(\d.*)', data)
             return "{} {}".format(parts[0], parts[1])
 
-    def create_course_record(self, diploma_id, code, name, semester_id):
-        vals = {'name': name, 'code': code, 'semester_id': semester_id, 'diploma_id': diploma_id}
-        course = self.env['programme.course'].create(vals)
-        return course
-
-    def create_course_entry_record(self, course_id, units, programme_id, level_id, option):
-        vals = {}
-        if option:
-            optionObj = self.env['quickledger.programme.option'].search(
-                [('name', '=ilike', option), ('programme_id', '=', programme_id)])
-            vals['option_id'] = optionObj.id
-
-        vals['course_id'] = course_id
-        vals['units'] = units
-        vals['programme_id'] = programme_id
-        vals['level_id'] = level_id
-        course_entry = self.env['programme.course.entry'].create(vals)
-
-        return course_entry
-
-    def check_for_course_record(self, code):
-        course = self.env['programme.course'].search([('code', '=', code)])
-        return course
-
-    def check_if_course_entry_exist(self, course_id, programme_id, option):
-        domain = [('course_id', '=', course_id), ('programme_id', '=', programme_id)]
-        if option:
-            optionObj = self.env['quickledger.programme.option'].search(
-                [('name', '=ilike', option), ('programme_id', '=', programme_id)])
-            domain = [('course_id', '=', course_id), ('programme_id', '=', programme_id),
-                      ('option_id', '=', optionObj.id)]
-
-        course = self.env['programme.course.entry'].search_count(domain)
-        return course > 0
-
+    def _is_cep(self):
+        return "CEP" in str(self.department) or "C.E.P" in str(self.department)
+
+    def _load_catalogue(self, codes):
+        """ Existing course codes and the (code, programme, option) entries already offered """
+        courses = {course['code']: course['id'] for course in
+                   self.env['programme.course'].search_read([('code', 'in', codes)], ['code'])}
+        codes_by_id = {course_id: code for code, course_id in courses.items()}
+        entries = set()
+        offered = set()
+        for entry in self.env['programme.course.entry'].search_read([('course_id', 'in', list(codes_by_id))],
+                                                                    ['course_id', 'programme_id', 'option_id']):
+            code = codes_by_id[entry['course_id'][0]]
+            programme_id = entry['programme_id'] and entry['programme_id'][0]
+            entries.add((code, programme_id, entry['option_id'] and entry['option_id'][0]))
+            offered.add((code, programme_id))
+        return courses, entries, offered
+
+    def _map_programmes(self):
+        """ Programmes keyed by (department, degree, CEP entry) for the departments named in the batch """
+        names = set(str(record.department).strip(" CEP").strip().lower() for record in self)
+        departments = self.env['quickledger.department'].search([]).filtered(lambda d: d.name.lower() in names)
+        cep = self.env['quickledger.entry.status'].search([('name', '=', "CEP")])
+        programmes = {}
+        for programme in self.env['quickledger.programme'].search([('department_id', 'in', departments.ids)]):
+            key = (programme.department_id.id, programme.diploma_id.id, bool(cep) and programme.entry_status_id == cep)
+            programmes.setdefault(key, programme)
+        return {dept.name.lower(): dept for dept in departments}, programmes
+
+    @instrumented('academic.school.course.action_process')
     def action_process(self):
-        for record in self:
-            if record.status == "Processed":
-                return True
-            else:
-                try:
-                    departmentName = record.department
-                    domainProgramme = []
-                    diploma = self.env["quickledger.diploma"].search([("code", '=ilike', record.diploma)])
-                    if not diploma:
-                        raise ValueError("Invalid Degree '{}'".format(record.diploma))
-                    
-                    domainProgramme.append(('diploma_id', '=', diploma.id))
-
-                    if str(record.department).find("CEP") or str(record.department).find("C.E.P"):
-                        entry_status = self.env['quickledger.entry.status'].search([('name', '=', "CEP")])
-                        domainProgramme.append(('entry_status_id', '=', entry_status.id))
-                    
-                    dept = self.env["quickledger.department"].search([("name", '=ilike', departmentName.strip(" CEP").strip())])
-                    if not dept:
-                        raise ValueError("Invalid Department '{}'".format(record.department))
-                    domainProgramme.append(('department_id', '=', dept.id))
-                    
-                    programme = self.env['quickledger.programme'].search(domainProgramme)
-
-                    if not programme:
-                        raise ValueError("Invalid Programme {} {} ".format(diploma.code, dept.name))
+        return self._process_batch()
 
-                    level = self.env["quickledger.level"].search([("code", '=', record.level)])
-                    if not level:
-                        raise ValueError("Invalid Level {}".format(record.level))
-                    semester = self.env["quickledger.semester"].search([("code", '=', record.semester)])
-                    if not semester:
-                        raise ValueError("Invalid Semester {}".format(record.semester))
-                    diploma_id = programme.diploma_id.id
-                    course = record.check_for_course_record(record.code)
-                    if course:
-                        course_entry = record.check_if_course_entry_exist(course.id, programme.id, record.option)
-                        if not course_entry:
-                            record.create_course_entry_record(course.id, record.units,
-                                                              programme.id, level.id, record.option)
-                        else:
-                            raise ValueError("{} already exist for {}".format(course.code, programme.name))
-                    else:
-                        course = record.create_course_record(diploma_id, record.code, record.title, semester.id)
-                        course_entry = record.check_if_course_entry_exist(course.id, programme.id, record.option)
-                        if not course_entry:
-                            record.create_course_entry_record(course.id, record.units, programme.id,
-                                                              level.id, record.option)
-                        else:
-                            raise ValueError("{} already exist for {}".format(course.code, programme.name))
-                except ValueError as e:
-                    record.write({'status': "Failed", 'remarks': e})
-                    return False
-                except Exception as e:
-                    record.write({'status': "Failed", 'remarks': e})
-                    return False
-                record.write({'status': "Processed", 'remarks': "Successfully"})
-                return True
+    def _process_batch(self):
+        """ Loads a catalogue batch against in-memory sets of the existing courses and course entries """
+        rows = self.filtered(lambda r: r.status != "Processed")
+        if not rows:
+            return True
+        rows._import_phase('lookup')
+
+        diplomas = {diploma.code.lower(): diploma for diploma in self.env['quickledger.diploma'].search([])}
+        departments, programmes = rows._map_programmes()
+        levels = {level.code: level for level in
+                  self.env['quickledger.level'].search([('code', 'in', list(set(rows.mapped('level'))))])}
+        semesters = {semester.code: semester for semester in
+                     self.env['quickledger.semester'].search([('code', 'in', list(set(rows.mapped('semester'))))])}
+        options = {}
+        for option in self.env['quickledger.programme.option'].search(
+                [('programme_id', 'in', [p.id for p in programmes.values()])]):
+            options.setdefault((option.programme_id.id, option.name.lower()), option.id)
+        courses, entries, offered = self._load_catalogue(list(set(rows.mapped('code'))))
+
+        failures = {}
+        duplicates = {}
+        new_courses = {}
+        new_entries = []
+        for record in rows:
+            try:
+                diploma = diplomas.get(str(record.diploma).lower())
+                if not diploma:
+                    raise ValueError("Invalid Degree '{}'".format(record.diploma))
+                dept = departments.get(str(record.department).strip(" CEP").strip().lower())
+                if not dept:
+                    raise ValueError("Invalid Department '{}'".format(record.department))
+                programme = programmes.get((dept.id, diploma.id, record._is_cep()))
+                if not programme:
+                    raise ValueError("Invalid Programme {} {} ".format(diploma.code, dept.name))
+                level = levels.get(record.level)
+                if not level:
+                    raise ValueError("Invalid Level {}".format(record.level))
+                semester = semesters.get(record.semester)
+                if not semester:
+                    raise ValueError("Invalid Semester {}".format(record.semester))
+            except ValueError as e:
+                failures[record] = e
+                continue
+
+            option_id = record.option and options.get((programme.id, record.option.lower())) or False
+            if (record.code, programme.id, option_id) in entries or \
+                    (not record.option and (record.code, programme.id) in offered):
+                duplicates[record] = ValueError("{} already exist for {}".format(record.code, programme.name))
+                continue
+            entries.add((record.code, programme.id, option_id))
+            offered.add((record.code, programme.id))
+
+            if record.code not in courses and record.code not in new_courses:
+                new_courses[record.code] = {'name': record.title, 'code': record.code, 'semester_id': semester.id,
+                                            'diploma_id': programme.diploma_id.id}
+            new_entries.append((record, {'course_code': record.code, 'units': record.units,
+                                         'programme_id': programme.id, 'level_id': level.id,
+                                         'option_id': option_id}))
+
+        rows._import_phase('write')
+        processed = self._create_catalogue(courses, new_courses, new_entries, failures)
+        for record, error in failures.items():
+            record.write(record._import_failed(error))
+        for record, error in duplicates.items():
+            record.write(record._import_failed(error, retry=False))
+        processed.write({'status': "Processed", 'remarks': "Successfully"})
+        rows._import_phase(None)
+        return not failures and not duplicates
+
+    def _create_catalogue(self, courses, new_courses, new_entries, failures):
+        """ Bulk creates the missing courses, then their entries, row by row only if the batch fails """
+        Course = self.env['programme.course']
+        CourseEntry = self.env['programme.course.entry']
+
+        def entry_vals(vals):
+            vals = dict(vals)
+            vals['course_id'] = courses[vals.pop('course_code')]
+            return vals
+
+        processed = self.browse([record.id for record, _vals in new_entries])
+        if not new_entries:
+            return processed
+        CourseEntry.flush()
+        try:
+            with self.env.cr.savepoint():
+                created = Course.create(list(new_courses.values()))
+                courses.update(zip(new_courses, created.ids))
+                CourseEntry.create([entry_vals(vals) for _record, vals in new_entries])
+                CourseEntry.flush()
+            return processed
+        except Exception:
+            _logger.debug("Batch catalogue import failed, retrying row by row")
+            self.env.clear()
+            for code in new_courses:
+                courses.pop(code, None)
+
+        processed = self.browse()
+        for record, vals in new_entries:
+            code = vals['course_code']
+            new_course = code not in courses
+            try:
+                with self.env.cr.savepoint():
+                    if new_course:
+                        courses[code] = Course.create(new_courses[code]).id
+                    CourseEntry.create(entry_vals(vals))
+                    CourseEntry.flush()
+                processed |= record
+            except Exception as e:
+                self.env.clear()
+                if new_course:
+                    courses.pop(code, None)
+                failures[record] = e
+        return processed
 
     @api.model
     def create(self, vals):
@@ -1985,45 +2632,24 @@ class AutoJobScheduler(models.Model):
     name = fields.Char('Name', required=True)
     description = fields.Char('Description')
 
+    @api.model
+    def _process_queue(self, model_name):
+        records = self.env[model_name].claim(limit=350)
+        if records:
+            return self.env['quickledger.import.run'].run(records)
+
     @api.model
     def process_result(self):
-        new_records = self.env['academic.legacy.student.result'].search([('status', '=', 'New')], limit=350)
-        if new_records:
-            for result in new_records:
-                _logger.info(" Processing New Student ****** {} ******".format(result.matric))
-                result.action_process()
-        else:
-            failed_records = self.env['academic.legacy.student.result'].search([('status', '=', 'Failed')], limit=350)
-            for result in failed_records:
-                _logger.info(" Processing Failed ****** {} ******".format(result.matric))
-                result.action_process()
+        return self._process_queue('academic.legacy.student.result')
 
     @api.model
     def process_student(self):
-        new_records = self.env['academic.legacy.student'].search([('status', '=', 'New')], limit=350)
-        if new_records:
-            for student in new_records:
-                _logger.info(" Processing New ****** {} ******".format(student.name))
-                student.action_process()
-        else:
-            failed_records = self.env['academic.legacy.student'].search([('status', '=', 'Failed')], limit=350)
-            for student in failed_records:
-                _logger.info(" Processing Failed ****** {} ******".format(student.name))
-                student.action_process()
+        return self._process_queue('academic.legacy.student')
 
     @api.model
     def process_course(self):
-        new_records = self.env['academic.school.course'].search([('status', '=', 'New')], limit=350)
-        if new_records:
-            for course in new_records:
-                _logger.info(" Processing New ****** {} ******".format(course.code))
-                course.action_process()
-        else:
-            failed_records = self.env['academic.school.course'].search([('status', '=', 'Failed')], limit=350)
-            for course in failed_records:
-                _logger.info(" Processing Failed ****** {} ******".format(course.code))
-                course.action_process()
-                
+        return self._process_queue('academic.school.course')
+
 
 class Credentials(models.Model):
     """ Credentials """
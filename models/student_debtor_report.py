@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api
+import logging
+
+_logger = logging.getLogger(__name__)
+
+AGE_BUCKETS = [('0_30', '0 - 30 Days'),
+               ('31_90', '31 - 90 Days'),
+               ('91_180', '91 - 180 Days'),
+               ('181_365', '181 - 365 Days'),
+               ('over_365', 'Over 1 Year')]
+
+
+class StudentDebtorReport(models.Model):
+    """ Ranked debtors with aged balances, served from a materialized summary table """
+    _name = 'student.debtor.report'
+    _description = 'Student Debtors Report'
+    _auto = False
+    _order = 'balance desc'
+    _rec_name = 'student_id'
+
+    ledger_id = fields.Many2one('student.ledger', 'Ledger', readonly=True)
+    student_id = fields.Many2one('quickledger.student', 'Student', readonly=True)
+    matriculation_number = fields.Char('Registration. No', readonly=True)
+    programme_id = fields.Many2one('quickledger.programme', 'Programme', readonly=True)
+    department_id = fields.Many2one('quickledger.department', 'Department', readonly=True)
+    faculty_id = fields.Many2one('quickledger.faculty', 'Faculty', readonly=True)
+    total_amount_due = fields.Float('Total Amount Due', readonly=True)
+    total_amount_paid = fields.Float('Total Amount Paid', readonly=True)
+    balance = fields.Float('Amount Outstanding', readonly=True)
+    oldest_entry_date = fields.Date('Oldest Unpaid Fee', readonly=True)
+    last_payment_date = fields.Date('Last Payment', readonly=True)
+    age_days = fields.Integer('Debt Age (Days)', readonly=True)
+    days_since_payment = fields.Integer('Days Since Payment', readonly=True)
+    age_bucket = fields.Selection(AGE_BUCKETS, string='Age', readonly=True)
+    balance_0_30 = fields.Float('0 - 30 Days', readonly=True)
+    balance_31_90 = fields.Float('31 - 90 Days', readonly=True)
+    balance_91_180 = fields.Float('91 - 180 Days', readonly=True)
+    balance_181_365 = fields.Float('181 - 365 Days', readonly=True)
+    balance_over_365 = fields.Float('Over 1 Year', readonly=True)
+
+    def _query(self):
+        return """
+            SELECT l.id AS id,
+                   l.id AS ledger_id,
+                   l.student_id AS student_id,
+                   s.matriculation_number AS matriculation_number,
+                   s.programme_id AS programme_id,
+                   s.department_id AS department_id,
+                   s.faculty_id AS faculty_id,
+                   COALESCE(l.total_amount_due, 0) AS total_amount_due,
+                   COALESCE(l.total_amount_paid, 0) AS total_amount_paid,
+                   l.total_balance AS balance,
+                   fe.oldest_entry_date AS oldest_entry_date,
+                   pe.last_payment_date AS last_payment_date,
+                   (CURRENT_DATE - fe.oldest_entry_date) AS age_days,
+                   (CURRENT_DATE - pe.last_payment_date) AS days_since_payment,
+                   CASE
+                       WHEN fe.oldest_entry_date IS NULL OR CURRENT_DATE - fe.oldest_entry_date <= 30 THEN '0_30'
+                       WHEN CURRENT_DATE - fe.oldest_entry_date <= 90 THEN '31_90'
+                       WHEN CURRENT_DATE - fe.oldest_entry_date <= 180 THEN '91_180'
+                       WHEN CURRENT_DATE - fe.oldest_entry_date <= 365 THEN '181_365'
+                       ELSE 'over_365'
+                   END AS age_bucket,
+                   COALESCE(fe.balance_0_30, 0) AS balance_0_30,
+                   COALESCE(fe.balance_31_90, 0) AS balance_31_90,
+                   COALESCE(fe.balance_91_180, 0) AS balance_91_180,
+                   COALESCE(fe.balance_181_365, 0) AS balance_181_365,
+                   COALESCE(fe.balance_over_365, 0) AS balance_over_365
+              FROM student_ledger l
+              JOIN quickledger_student s ON s.id = l.student_id
+              LEFT JOIN (
+                    SELECT ledger_id,
+                           MIN(entry_date) AS oldest_entry_date,
+                           SUM(balance) FILTER (WHERE CURRENT_DATE - entry_date <= 30) AS balance_0_30,
+                           SUM(balance) FILTER (WHERE CURRENT_DATE - entry_date BETWEEN 31 AND 90) AS balance_31_90,
+                           SUM(balance) FILTER (WHERE CURRENT_DATE - entry_date BETWEEN 91 AND 180) AS balance_91_180,
+                           SUM(balance) FILTER (WHERE CURRENT_DATE - entry_date BETWEEN 181 AND 365) AS balance_181_365,
+                           SUM(balance) FILTER (WHERE CURRENT_DATE - entry_date > 365) AS balance_over_365
+                      FROM academic_fee_entry
+                     WHERE balance > 0 AND ledger_id IS NOT NULL
+                  GROUP BY ledger_id) fe ON fe.ledger_id = l.id
+              LEFT JOIN (
+                    SELECT ledger_id, MAX(payment_date) AS last_payment_date
+                      FROM academic_payment_entry
+                     WHERE ledger_id IS NOT NULL
+                  GROUP BY ledger_id) pe ON pe.ledger_id = l.id
+             WHERE l.total_balance > 0
+        """
+
+    def init(self):
+        cr = self.env.cr
+        cr.execute("DROP MATERIALIZED VIEW IF EXISTS %s CASCADE" % self._table)
+        cr.execute("CREATE MATERIALIZED VIEW %s AS (%s)" % (self._table, self._query()))
+        # The unique index is required by REFRESH ... CONCURRENTLY, the others serve the top-N queries
+        cr.execute("CREATE UNIQUE INDEX %s_id_uniq ON %s (id)" % (self._table, self._table))
+        cr.execute("CREATE INDEX %s_balance_idx ON %s (balance DESC)" % (self._table, self._table))
+        cr.execute("CREATE INDEX %s_faculty_balance_idx ON %s (faculty_id, balance DESC)"
+                   % (self._table, self._table))
+        cr.execute("CREATE INDEX %s_programme_balance_idx ON %s (programme_id, balance DESC)"
+                   % (self._table, self._table))
+
+    @api.model
+    def refresh(self):
+        """ Rebuilds the summary table, called by the scheduler and the Refresh menu """
+        self.env['student.ledger'].flush()
+        self.env['academic.fee.entry'].flush()
+        self.env['academic.payment.entry'].flush()
+        self.env.cr.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY %s" % self._table)
+        self.invalidate_cache()
+        _logger.info("Debtors report refreshed")
+        return True
+
+    @api.model
+    def get_top_debtors(self, limit=500, faculty_id=None, programme_id=None):
+        domain = []
+        if faculty_id:
+            domain.append(('faculty_id', '=', faculty_id))
+        if programme_id:
+            domain.append(('programme_id', '=', programme_id))
+        return self.search(domain, limit=limit, order='balance desc')
+
+    def name_get(self):
+        result = []
+        for record in self:
+            name = "{0} - {1}".format(record.matriculation_number, record.student_id.name)
+            result.append((record.id, name))
+        return result
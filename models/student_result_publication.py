@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api
+import logging
+import time
+from .audit_log import buffered_audit
+
+_logger = logging.getLogger(__name__)
+
+
+class StudentResultPublication(models.Model):
+    """ Approves the pending results of a session and semester in the background, in one set-based pass """
+    _name = 'student.result.publication'
+    _description = 'Result Publication'
+    _order = 'create_date desc'
+
+    name = fields.Char('Name', required=True)
+    session_id = fields.Many2one('academic.session', 'Session', required=True)
+    semester_id = fields.Many2one('quickledger.semester', 'Semester', required=True)
+    faculty_id = fields.Many2one('quickledger.faculty', 'Faculty', help="Only results of this faculty")
+    programme_id = fields.Many2one('quickledger.programme', 'Programme', help="Only results of this programme")
+    state = fields.Selection(string='Status',
+                             selection=[('draft', 'Draft'),
+                                        ('queued', 'Queued'),
+                                        ('done', 'Done'),
+                                        ('failed', 'Failed')], default='draft', readonly=True)
+    result_count = fields.Integer('Results Approved', readonly=True)
+    student_count = fields.Integer('Students', readonly=True)
+    registration_count = fields.Integer('Registrations', readonly=True)
+    start_date = fields.Datetime('Started', readonly=True)
+    end_date = fields.Datetime('Finished', readonly=True)
+    duration = fields.Float('Duration (s)', readonly=True)
+    summary = fields.Text('Class of Degree', readonly=True)
+    remarks = fields.Text('Remarks', readonly=True)
+
+    @api.onchange('faculty_id')
+    def faculty_id_changed(self):
+        if self.faculty_id and self.programme_id.faculty_id != self.faculty_id:
+            self.programme_id = False
+        return {'domain': {'programme_id': [('faculty_id', '=', self.faculty_id.id)] if self.faculty_id else []}}
+
+    def action_queue(self):
+        self.write({'state': 'queued', 'result_count': 0, 'student_count': 0, 'registration_count': 0,
+                    'start_date': False, 'end_date': False, 'duration': 0.0, 'summary': False, 'remarks': False})
+
+    def action_draft(self):
+        self.write({'state': 'draft'})
+
+    def _approve_results(self):
+        """ Moves every pending result in scope to Approved with one UPDATE
+
+        Returns the (registration, result book) pairs of the approved rows. Going around write(), which would
+        refresh the GPA of each registration again, the approvals are put in the audit buffer here.
+        """
+        self.ensure_one()
+        ResultEntry = self.env['student.result.entry']
+        ResultEntry.flush()
+        # Only a faculty needs the programme joined, results without a programme are approved otherwise
+        query = """
+            UPDATE student_result_entry r
+               SET status = 'Approved', write_date = now() at time zone 'UTC', write_uid = %s
+              {}
+             WHERE r.status = 'Pending' AND r.session_id = %s AND r.semester_id = %s
+        """.format("FROM quickledger_programme p" if self.faculty_id else "")
+        params = [self.env.uid, self.session_id.id, self.semester_id.id]
+        if self.faculty_id:
+            query += " AND p.id = r.programme_id AND p.faculty_id = %s"
+            params.append(self.faculty_id.id)
+        if self.programme_id:
+            query += " AND r.programme_id = %s"
+            params.append(self.programme_id.id)
+        self.env.cr.execute(query + " RETURNING r.id, r.registration_id, r.student_result_id", params)
+        rows = self.env.cr.fetchall()
+        ResultEntry.invalidate_cache(['status', 'write_date', 'write_uid'])
+        ResultEntry.browse([row[0] for row in rows])._audit_snapshot({'status': 'Pending'})
+        return [row[1:] for row in rows]
+
+    def _publish(self):
+        self.ensure_one()
+        started = time.perf_counter()
+        self.start_date = fields.Datetime.now()
+        rows = self._approve_results()
+        registrations = self.env['student.registration'].browse(set(r[0] for r in rows if r[0]))
+        books = self.env['student.result'].browse(set(r[1] for r in rows if r[1]))
+        registrations._refresh_gpa()
+        summary = books.classify()
+        duration = time.perf_counter() - started
+        _logger.info("Result publication %s: %s results of %s students approved in %.2fs", self.name, len(rows),
+                     len(books), duration)
+        self.write({'state': 'done', 'result_count': len(rows), 'student_count': len(books),
+                    'registration_count': len(registrations), 'end_date': fields.Datetime.now(),
+                    'duration': duration,
+                    'summary': "\n".join("{}: {}".format(name, count) for name, count in sorted(summary.items()))})
+
+    @api.model
+    def process_queue(self):
+        """ Scheduled: publishes the queued batches one transaction each """
+        for publication in self.search([('state', '=', 'queued')], order='create_date'):
+            try:
+                with buffered_audit(self.env, publication.name) as env:
+                    publication.with_env(env)._publish()
+                self.env.cr.commit()
+            except Exception as e:
+                self.env.cr.rollback()
+                self.env.clear()
+                _logger.exception("Result publication %s failed", publication.name)
+                publication.write({'state': 'failed', 'remarks': str(e)})
+                self.env.cr.commit()
+        return True
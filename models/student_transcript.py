@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api
+import base64
+import logging
+import time
+
+_logger = logging.getLogger(__name__)
+
+
+class StudentTranscriptBatch(models.Model):
+    """ Transcripts of a whole class, rendered in the background one chunk of students at a time """
+    _name = 'student.transcript.batch'
+    _description = 'Transcript Batch'
+    _order = 'create_date desc'
+
+    name = fields.Char('Name', required=True)
+    programme_id = fields.Many2one('quickledger.programme', 'Programme', required=True)
+    session_id = fields.Many2one('academic.session', 'Session', help="Only students registered in this session")
+    level_id = fields.Many2one('quickledger.level', 'Level', help="Only students registered at this level")
+    chunk_size = fields.Integer('Students per File', default=200, required=True)
+    state = fields.Selection(string='Status',
+                             selection=[('draft', 'Draft'),
+                                        ('queued', 'Queued'),
+                                        ('done', 'Done'),
+                                        ('failed', 'Failed')], default='draft', readonly=True)
+    result_ids = fields.Many2many('student.result', string='Result Books', readonly=True)
+    student_count = fields.Integer('Students', readonly=True)
+    rendered_count = fields.Integer('Rendered', readonly=True)
+    start_date = fields.Datetime('Started', readonly=True)
+    end_date = fields.Datetime('Finished', readonly=True)
+    attachment_ids = fields.Many2many('ir.attachment', string='Transcripts', readonly=True)
+    remarks = fields.Text('Remarks', readonly=True)
+
+    def action_queue(self):
+        for record in self:
+            books = self.env['student.result']._search_cohort(record.programme_id, record.session_id,
+                                                              record.level_id)
+            record.write({'state': 'queued' if books else 'done', 'result_ids': [(6, 0, books.ids)], 'student_count': len(books),
+                          'rendered_count': 0, 'attachment_ids': [(5, 0, 0)], 'start_date': False,
+                          'end_date': False, 'remarks': False})
+
+    def action_draft(self):
+        self.write({'state': 'draft'})
+
+    def _render_next_chunk(self):
+        """ Renders the next chunk of transcripts into one PDF attached to the batch """
+        self.ensure_one()
+        book_ids = sorted(self.result_ids.ids)
+        chunk = book_ids[self.rendered_count:self.rendered_count + max(1, self.chunk_size)]
+        report = self.env.ref('quickledger.action_report_student_transcript')
+        pdf, _format = report.render_qweb_pdf(chunk)
+        attachment = self.env['ir.attachment'].create({
+            'name': "{} {}-{}.pdf".format(self.name, self.rendered_count + 1, self.rendered_count + len(chunk)),
+            'type': 'binary',
+            'datas': base64.b64encode(pdf),
+            'res_model': self._name,
+            'res_id': self.id,
+            'mimetype': 'application/pdf',
+        })
+        rendered_count = self.rendered_count + len(chunk)
+        vals = {'rendered_count': rendered_count, 'attachment_ids': [(4, attachment.id)]}
+        if rendered_count >= len(book_ids):
+            vals.update({'state': 'done', 'end_date': fields.Datetime.now()})
+        self.write(vals)
+
+    @api.model
+    def process_queue(self, time_limit=600):
+        """ Scheduled: renders queued batches chunk by chunk, committing each chunk so a run can resume """
+        started = time.time()
+        for batch in self.search([('state', '=', 'queued')], order='create_date'):
+            if not batch.start_date:
+                batch.start_date = fields.Datetime.now()
+            while batch.state == 'queued' and time.time() - started < time_limit:
+                try:
+                    batch._render_next_chunk()
+                    self.env.cr.commit()
+                except Exception as e:
+                    self.env.cr.rollback()
+                    self.env.clear()
+                    _logger.exception("Transcript batch %s failed", batch.name)
+                    batch.write({'state': 'failed', 'remarks': str(e)})
+                    self.env.cr.commit()
+                _logger.info("Transcript batch %s: %s/%s rendered", batch.name, batch.rendered_count,
+                             batch.student_count)
+            if time.time() - started >= time_limit:
+                break
+        return True
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api, exceptions
+import logging
+import time
+
+_logger = logging.getLogger(__name__)
+
+
+class FeeSurchargeRun(models.Model):
+    """ Late payment surcharges of a session: every fee short of its payment term by the cutoff date is charged
+    the surcharge fee once, the whole session found by one query and charged by one multi-create
+    """
+    _name = 'academic.surcharge.run'
+    _description = 'Late Payment Surcharge'
+    _order = 'cutoff_date desc, id desc'
+
+    @api.model
+    def _get_default_date(self):
+        return fields.Date.from_string(fields.Date.today())
+
+    name = fields.Char('Name', required=True)
+    session_id = fields.Many2one('academic.session', 'Session', required=True)
+    cutoff_date = fields.Date('Cutoff Date', required=True, default=_get_default_date,
+                              help="Fees billed by this date must have met their payment terms")
+    penalty_fee_id = fields.Many2one('academic.fee', 'Surcharge', required=True,
+                                     domain=[('type_id.is_penalty', '=', True)],
+                                     help="Fee charged once for every fee short of its payment term")
+    state = fields.Selection(string='Status',
+                             selection=[('draft', 'Draft'),
+                                        ('scheduled', 'Scheduled'),
+                                        ('done', 'Done'),
+                                        ('failed', 'Failed')], default='draft', readonly=True)
+    line_ids = fields.One2many('academic.surcharge.run.line', 'run_id', 'Faculties', readonly=True)
+    entry_count = fields.Integer('Fees in Breach', readonly=True)
+    amount_outstanding = fields.Float('Amount Outstanding', readonly=True)
+    amount_surcharged = fields.Float('Surcharges', readonly=True)
+    is_preview = fields.Boolean('Preview', readonly=True)
+    end_date = fields.Datetime('Charged On', readonly=True)
+    remarks = fields.Text('Remarks', readonly=True)
+
+    @api.constrains('penalty_fee_id')
+    def _check_penalty_fee(self):
+        for run in self:
+            if not run.penalty_fee_id.type_id.is_penalty:
+                raise exceptions.ValidationError('The surcharge must be a fee of a surcharge payment type')
+
+    def _get_breaches(self):
+        """ [(fee entry, registration, ledger, faculty, balance)] of the fees short of their term by the cutoff
+
+        A fee on a term of 25% or 50% breaches it with less than that share paid, a fee paid at once with any
+        balance left. Surcharges themselves and fees already surcharged are left out.
+        """
+        self.ensure_one()
+        self.env['academic.fee.entry'].flush(['fee_id', 'session_id', 'entry_date', 'amount_due', 'amount_paid',
+                                              'balance', 'penalty_for_id', 'registration_id', 'ledger_id',
+                                              'faculty_id'])
+        self.env['academic.fee'].flush(['term_id', 'type_id'])
+        self.env.cr.execute("""
+            SELECT fe.id, fe.registration_id, fe.ledger_id, fe.faculty_id, fe.balance
+              FROM academic_fee_entry fe
+              JOIN academic_fee f ON f.id = fe.fee_id
+              JOIN payment_type t ON t.id = f.type_id
+             WHERE fe.session_id = %s AND fe.entry_date <= %s AND fe.balance > 0
+               AND t.is_penalty IS NOT TRUE
+               AND COALESCE(fe.amount_paid, 0) < fe.amount_due * COALESCE(f.term_id, '100')::numeric / 100
+               AND NOT EXISTS (SELECT 1 FROM academic_fee_entry p WHERE p.penalty_for_id = fe.id)
+          ORDER BY fe.id
+        """, (self.session_id.id, self.cutoff_date))
+        return self.env.cr.fetchall()
+
+    def _summarise(self, breaches, preview):
+        """ Replaces the faculty lines with the counts and amounts of ``breaches`` """
+        self.ensure_one()
+        surcharge = self.penalty_fee_id.amount
+        faculties = {}
+        for _entry_id, _registration_id, _ledger_id, faculty_id, balance in breaches:
+            line = faculties.setdefault(faculty_id, {'faculty_id': faculty_id, 'entry_count': 0,
+                                                     'amount_outstanding': 0.0, 'amount_surcharged': 0.0})
+            line['entry_count'] += 1
+            line['amount_outstanding'] += float(balance)
+            line['amount_surcharged'] += surcharge
+        self.write({'line_ids': [(5, 0, 0)] + [(0, 0, line) for line in faculties.values()],
+                    'entry_count': len(breaches),
+                    'amount_outstanding': sum(line['amount_outstanding'] for line in faculties.values()),
+                    'amount_surcharged': surcharge * len(breaches),
+                    'is_preview': preview})
+
+    def action_preview(self):
+        """ Dry run: counts and amounts per faculty, nothing is charged """
+        for run in self:
+            run._summarise(run._get_breaches(), True)
+
+    def action_schedule(self):
+        self.write({'state': 'scheduled', 'remarks': False})
+
+    def action_draft(self):
+        self.write({'state': 'draft'})
+
+    def _apply(self):
+        """ Charges the surcharge on every fee in breach with one multi-create
+
+        The ledgers and registrations of the new entries are recomputed together when they are flushed.
+        """
+        self.ensure_one()
+        started = time.perf_counter()
+        breaches = self._get_breaches()
+        FeeEntry = self.env['academic.fee.entry']
+        FeeEntry.create([{'fee_id': self.penalty_fee_id.id,
+                          'registration_id': registration_id,
+                          'ledger_id': ledger_id,
+                          'entry_date': self.cutoff_date,
+                          'penalty_for_id': entry_id}
+                         for entry_id, registration_id, ledger_id, _faculty_id, _balance in breaches])
+        FeeEntry.flush()
+        self._summarise(breaches, False)
+        self.write({'state': 'done', 'end_date': fields.Datetime.now()})
+        _logger.info("Surcharge %s: %s fees of %s charged in %.2fs", self.name, len(breaches),
+                     self.session_id.name, time.perf_counter() - started)
+
+    def action_apply(self):
+        for run in self:
+            run._apply()
+
+    @api.model
+    def apply_scheduled(self):
+        """ Scheduled: charges the scheduled surcharges whose cutoff date has passed, one transaction each """
+        today = fields.Date.from_string(fields.Date.today())
+        for run in self.search([('state', '=', 'scheduled'), ('cutoff_date', '<', today)], order='cutoff_date'):
+            try:
+                run._apply()
+                self.env.cr.commit()
+            except Exception as e:
+                self.env.cr.rollback()
+                self.env.clear()
+                _logger.exception("Surcharge %s failed", run.name)
+                run.write({'state': 'failed', 'remarks': str(e)})
+                self.env.cr.commit()
+        return True
+
+
+class FeeSurchargeRunLine(models.Model):
+    _name = 'academic.surcharge.run.line'
+    _description = 'Late Payment Surcharge by Faculty'
+    _order = 'amount_outstanding desc'
+    _rec_name = 'faculty_id'
+
+    run_id = fields.Many2one('academic.surcharge.run', 'Surcharge', required=True, ondelete='cascade', index=1)
+    faculty_id = fields.Many2one('quickledger.faculty', 'Faculty', readonly=True)
+    entry_count = fields.Integer('Fees in Breach', readonly=True)
+    amount_outstanding = fields.Float('Amount Outstanding', readonly=True)
+    amount_surcharged = fields.Float('Surcharges', readonly=True)
@@ -1 +1,2 @@
-from . import ledger_entry_report_by_name
\ No newline at end of file
+from . import ledger_entry_report_by_name
+from . import student_transcript_report
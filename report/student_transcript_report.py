@@ -0,0 +1,77 @@
+from odoo import api, models
+import logging
+from ..models.models import truncate_gpa
+
+_logger = logging.getLogger(__name__)
+
+
+class ReportStudentTranscript(models.AbstractModel):
+    _name = 'report.quickledger.report_student_transcript'
+    _description = 'Student Transcript Report'
+
+    @api.model
+    def _get_transcripts(self, result_book_ids):
+        """ Approved results of a chunk of result books, grouped by session and semester, from a single query """
+        transcripts = {book_id: {'sessions': [], 'units': 0, 'points': 0.0, 'cgpa': 0.00, 'counted': {}}
+                       for book_id in result_book_ids}
+        if not result_book_ids:
+            return transcripts
+        self.env['student.result.entry'].flush(['student_result_id', 'session_id', 'semester_id', 'course_id',
+                                                'course_code', 'course_name', 'units', 'score', 'grade_id', 'points',
+                                                'status', 'school_id'])
+        self.env['quickledger.honour.scheme'].flush(['options', 'replacement_policy'])
+        self.env.cr.execute("""
+            SELECT r.student_result_id, ses.id, ses.name, sem.id, sem.name,
+                   r.course_code, r.course_name, COALESCE(r.units, 0), r.score, g.name, COALESCE(r.points, 0),
+                   r.course_id, CASE WHEN hs.options = 'allow_grade_replacement' THEN hs.replacement_policy END
+              FROM student_result_entry r
+              JOIN academic_session ses ON ses.id = r.session_id
+              LEFT JOIN quickledger_semester sem ON sem.id = r.semester_id
+              LEFT JOIN quickledger_grade g ON g.id = r.grade_id
+              LEFT JOIN quickledger_school s ON s.id = r.school_id
+              LEFT JOIN quickledger_honour_scheme hs ON hs.id = s.honour_scheme_id
+             WHERE r.student_result_id IN %s AND r.status = 'Approved'
+          ORDER BY r.student_result_id, ses.sequence, ses.code, sem.sequence, r.course_code
+        """, (tuple(result_book_ids),))
+
+        for book_id, session_id, session_name, semester_id, semester_name, code, name, units, score, grade, \
+                point, course_id, replacement in self.env.cr.fetchall():
+            transcript = transcripts[book_id]
+            sessions = transcript['sessions']
+            if not sessions or sessions[-1]['id'] != session_id:
+                sessions.append({'id': session_id, 'name': session_name, 'semesters': []})
+            semesters = sessions[-1]['semesters']
+            if not semesters or semesters[-1]['id'] != semester_id:
+                semesters.append({'id': semester_id, 'name': semester_name, 'lines': [], 'units': 0, 'points': 0.0})
+            semester = semesters[-1]
+            semester['lines'].append({'code': code, 'name': name, 'units': units, 'score': score,
+                                      'grade': grade, 'points': point * units})
+            semester['units'] += units
+            semester['points'] += point * units
+            # A resit replaces the counted attempt when the honour scheme allows grades replacement
+            counted = transcript['counted'].get(course_id)
+            if replacement and counted:
+                if replacement == 'best' and counted[0] >= point:
+                    point, units = counted
+                transcript['units'] -= counted[1]
+                transcript['points'] -= counted[0] * counted[1]
+            transcript['counted'][course_id] = (point, units)
+            transcript['units'] += units
+            transcript['points'] += point * units
+            semester['gpa'] = truncate_gpa(semester['points'], semester['units'])
+            semester['cgpa'] = truncate_gpa(transcript['points'], transcript['units'])
+
+        for transcript in transcripts.values():
+            transcript['cgpa'] = truncate_gpa(transcript['points'], transcript['units'])
+            del transcript['counted']
+        return transcripts
+
+    @api.model
+    def _get_report_values(self, docids, data=None):
+        docs = self.env['student.result'].browse(docids)
+        return {
+            'doc_ids': docids,
+            'doc_model': 'student.result',
+            'docs': docs,
+            'transcripts': self._get_transcripts(docs.ids),
+            }
@@ -0,0 +1,9 @@
+# -*- coding: utf-8 -*-
+
+from . import test_indexes
+from . import test_benchmarks
+from . import test_instrumentation
+from . import test_imports
+from . import test_photos
+from . import test_results
+from . import test_ledger
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+import json
+import logging
+import os
+import time
+
+from odoo import fields
+
+_logger = logging.getLogger(__name__)
+
+
+def percentile(values, rank):
+    """ Nearest-rank percentile of an unsorted list """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(rank / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+class BenchmarkRecorder(object):
+    """ Times a callable over a set of inputs and keeps one result row per (benchmark, scale) """
+
+    def __init__(self, env):
+        self.env = env
+        self.results = []
+
+    def measure(self, name, scale, batches, func, rows_per_batch=1):
+        cr = self.env.cr
+        timings = []
+        rows = 0
+        start_queries = cr.sql_log_count
+        start = time.perf_counter()
+        for batch in batches:
+            batch_start = time.perf_counter()
+            func(batch)
+            self.env['base'].flush()
+            timings.append(time.perf_counter() - batch_start)
+            rows += len(batch) if rows_per_batch is None else rows_per_batch
+        elapsed = time.perf_counter() - start
+        queries = cr.sql_log_count - start_queries
+        result = {
+            'name': name,
+            'scale': scale,
+            'calls': len(timings),
+            'rows': rows,
+            'seconds': round(elapsed, 4),
+            'rows_per_sec': round(rows / elapsed, 2) if elapsed else 0.0,
+            'latency_ms': {
+                'p50': round(percentile(timings, 50) * 1000, 3),
+                'p90': round(percentile(timings, 90) * 1000, 3),
+                'p95': round(percentile(timings, 95) * 1000, 3),
+                'p99': round(percentile(timings, 99) * 1000, 3),
+                'max': round(max(timings) * 1000, 3) if timings else 0.0,
+            },
+            'queries': queries,
+            'queries_per_row': round(queries / float(rows), 2) if rows else 0.0,
+        }
+        _logger.info("Benchmark %s @ %s: %s rows/sec, %s queries/row", name, scale, result['rows_per_sec'],
+                     result['queries_per_row'])
+        self.results.append(result)
+        return result
+
+    def dump(self, path=None):
+        path = path or os.environ.get('QUICKLEDGER_BENCHMARK_OUTPUT', 'quickledger_benchmark.json')
+        module = self.env['ir.module.module'].search([('name', '=', 'quickledger')], limit=1)
+        payload = {
+            'module_version': module.latest_version or module.installed_version,
+            'created': fields.Datetime.to_string(fields.Datetime.now()),
+            'results': self.results,
+        }
+        with open(path, 'w') as results_file:
+            json.dump(payload, results_file, indent=2, sort_keys=True)
+        _logger.info("Benchmark results written to %s", os.path.abspath(path))
+        return path
@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+from odoo.tests.common import SavepointCase
+
+
+def get_scale(name, default):
+    """ Data sizes can be raised from the environment, e.g. QUICKLEDGER_STUDENTS=200000 """
+    return int(os.environ.get('QUICKLEDGER_%s' % name, default))
+
+
+def get_scales(default="100,1000"):
+    """ Benchmark data scales, e.g. QUICKLEDGER_BENCHMARK_SCALES=1000,10000,100000 """
+    scales = os.environ.get('QUICKLEDGER_BENCHMARK_SCALES', default)
+    return [int(scale) for scale in scales.split(",") if scale.strip()]
+
+
+class QuickledgerCase(SavepointCase):
+    """ Creates the master data every quickledger record hangs off """
+
+    @classmethod
+    def setUpClass(cls):
+        super(QuickledgerCase, cls).setUpClass()
+        env = cls.env
+        cls.classification = env['quickledger.faculty.classification'].create({'name': 'Test Classification',
+                                                                                'code': 'TST'})
+        cls.faculty = env['quickledger.faculty'].create({'name': 'Test Faculty',
+                                                         'classification_id': cls.classification.id})
+        cls.department = env['quickledger.department'].create({'name': 'Test Department', 'code': 'TST',
+                                                               'faculty_id': cls.faculty.id})
+        cls.diploma_type = env['quickledger.diploma.type'].create({'code': 'TUG', 'name': 'Test Undergraduate'})
+        cls.diploma = env['quickledger.diploma'].create({'code': 'T.Sc', 'name': 'Test Bachelor',
+                                                         'type_id': cls.diploma_type.id})
+        cls.programme = env['quickledger.programme'].create({'department_id': cls.department.id,
+                                                             'faculty_id': cls.faculty.id,
+                                                             'diploma_id': cls.diploma.id})
+        cls.level = env['quickledger.level'].create({'name': 'T100', 'code': 'T100', 'sequence': 1,
+                                                     'type_id': cls.diploma_type.id})
+        cls.semester = env['quickledger.semester'].create({'sequence': 1, 'name': 'Test Semester',
+                                                           'code': 't1st'})
+        cls.sessions = env['academic.session'].create([{'sequence': i, 'name': 'Test %s' % (3000 + i),
+                                                        'code': '%s/%s' % (3000 + i, 3001 + i)}
+                                                       for i in range(10)])
+        cls.payment_types = env['payment.type'].create([{'name': 'Test Fee %s' % i} for i in range(20)])
+        cls.fees = env['academic.fee']
+        for payment_type in cls.payment_types:
+            cls.fees |= env['academic.fee'].create({'type_id': payment_type.id,
+                                                    'level_id': cls.level.id,
+                                                    'classification_id': cls.classification.id,
+                                                    'amount': 1000.00})
+        cls.courses = env['programme.course.entry']
+        for i in range(20):
+            course = env['programme.course'].create({'name': 'Test Course %s' % i, 'code': 'TST %s' % (100 + i),
+                                                     'semester_id': cls.semester.id,
+                                                     'diploma_id': cls.diploma.id})
+            cls.courses |= env['programme.course.entry'].create({'course_id': course.id,
+                                                                 'programme_id': cls.programme.id,
+                                                                 'level_id': cls.level.id,
+                                                                 'units': 2})
+        env['base'].flush()
+
+    @classmethod
+    def _create_students(cls, prefix, count):
+        """ Admits students through the ORM so they get their ledger and result book """
+        Student = cls.env['quickledger.student']
+        students = Student
+        for i in range(count):
+            students |= Student.create({'name': 'Test Student %s' % i,
+                                        'matriculation_number': '%s/%s' % (prefix, i),
+                                        'programme_id': cls.programme.id})
+        return students
+
+    @classmethod
+    def _registration_vals(cls, student, session):
+        return {'student_id': student.id,
+                'programme_id': student.programme_id.id,
+                'level_id': cls.level.id,
+                'semester_id': cls.semester.id,
+                'session_id': session.id}
+
+    @classmethod
+    def _insert_results(cls, students):
+        """ Approved results for every course, attached to the students' result books """
+        cls.env['base'].flush()
+        cls.env.cr.execute("""
+            INSERT INTO student_result_entry (entry_date, student_id, student_result_id, reg_number, programme_id,
+                                              session_id, semester_id, course_id, level_id, units, ca_score, score,
+                                              points, status, registration_id)
+                 SELECT CURRENT_DATE, b.student_id, b.id, s.matriculation_number, s.programme_id, %(session)s,
+                        %(semester)s, c.id, %(level)s, 2, 60, 60, 4, 'Approved', reg.id
+                   FROM student_result b
+                   JOIN quickledger_student s ON s.id = b.student_id
+             CROSS JOIN unnest(%(courses)s) AS c(id)
+              LEFT JOIN student_registration reg ON reg.student_id = b.student_id AND reg.session_id = %(session)s
+                  WHERE b.student_id IN %(students)s
+        """, {'session': cls.sessions[0].id, 'semester': cls.semester.id, 'level': cls.level.id,
+              'courses': cls.courses.ids, 'students': tuple(students.ids)})
+        cls.env['student.result.entry'].invalidate_cache()
+
+    @classmethod
+    def _add_result(cls, student, course, session, score, status='Approved', registration=None):
+        """ One result entry through the ORM, graded by the school's grading scheme """
+        return cls.env['student.result.entry'].create({
+            'student_result_id': student.result_book_ids.id,
+            'student_id': student.id,
+            'course_id': course.id,
+            'semester_id': cls.semester.id,
+            'level_id': cls.level.id,
+            'session_id': session.id,
+            'registration_id': registration.id if registration else False,
+            'ca_score': score,
+            'status': status})
+
+    @classmethod
+    def _bulk_insert_population(cls, students):
+        """ Loads a synthetic population straight into the tables, bypassing the ORM """
+        cr = cls.env.cr
+        programme = cls.programme
+        cr.execute("""
+            INSERT INTO quickledger_student (name, matriculation_number, programme_id, department_id, faculty_id,
+                                             diploma_id)
+                 SELECT 'Test Student ' || g, 'TST/' || g, %s, %s, %s, %s
+                   FROM generate_series(1, %s) g
+        """, (programme.id, programme.department_id.id, programme.faculty_id.id, programme.diploma_id.id, students))
+        cr.execute("""
+            INSERT INTO student_ledger (student_id, matriculation_number, programme_id, total_balance)
+                 SELECT id, matriculation_number, programme_id, id %% 1000
+                   FROM quickledger_student WHERE matriculation_number LIKE %s
+        """, ('TST/%',))
+        cr.execute("""
+            INSERT INTO student_registration (entry_date, student_id, matriculation_number, level_id, session_id,
+                                              semester_id, programme_id, faculty_id, department_id, state)
+                 SELECT CURRENT_DATE, s.id, s.matriculation_number, %s, sess.id, %s, s.programme_id, s.faculty_id,
+                        s.department_id, 'New'
+                   FROM quickledger_student s
+             CROSS JOIN unnest(%s) AS sess(id)
+                  WHERE s.matriculation_number LIKE 'TST/%%'
+        """, (cls.level.id, cls.semester.id, cls.sessions.ids))
+        cr.execute("""
+            INSERT INTO student_result_entry (entry_date, student_id, reg_number, programme_id, session_id,
+                                              semester_id, course_id, level_id, units, ca_score, score, status)
+                 SELECT CURRENT_DATE, s.id, s.matriculation_number, s.programme_id, %s, %s, c.id, %s, 2, 50, 50,
+                        'Approved'
+                   FROM quickledger_student s
+             CROSS JOIN unnest(%s) AS c(id)
+                  WHERE s.matriculation_number LIKE 'TST/%%'
+        """, (cls.sessions[0].id, cls.semester.id, cls.level.id, cls.courses.ids))
+        cr.execute("""
+            INSERT INTO academic_fee_entry (fee_id, type_id, amount_due, amount_paid, balance, entry_date,
+                                            registration_id, ledger_id, student_id, session_id, programme_id)
+                 SELECT (%(fees)s::int[])[1 + (r.id + k) %% 20], (%(types)s::int[])[1 + (r.id + k) %% 20],
+                        1000, 0, 1000, CURRENT_DATE, r.id, l.id, r.student_id, r.session_id, r.programme_id
+                   FROM student_registration r
+                   JOIN student_ledger l ON l.student_id = r.student_id
+             CROSS JOIN (VALUES (0), (7)) AS o(k)
+                  WHERE r.matriculation_number LIKE 'TST/%%'
+        """, {'fees': cls.fees.ids, 'types': [fee.type_id.id for fee in cls.fees]})
+
+    @classmethod
+    def _bulk_insert_staging(cls, rows):
+        """ Mostly processed staging queues with a thin claimable tail, as in production """
+        cr = cls.env.cr
+        status = """CASE WHEN g %% 50 = 0 THEN 'New' WHEN g %% 51 = 0 THEN 'Failed' ELSE 'Processed' END"""
+        cr.execute("""
+            INSERT INTO academic_legacy_student_result (session, course, level, dept, semester, matric, exam, test,
+                                                        total, status)
+                 SELECT '3000/3001', 'TST 100', 'T100', 'TST', 't1st', 'TST/' || g, 40, 10, 50, {}
+                   FROM generate_series(1, %s) g
+        """.format(status), (rows,))
+        cr.execute("""
+            INSERT INTO academic_legacy_student (name, matric, level, dept, status)
+                 SELECT 'Test Student ' || g, 'TST/' || g, 'T100', 'TST', {}
+                   FROM generate_series(1, %s) g
+        """.format(status), (rows,))
+        cr.execute("""
+            INSERT INTO academic_school_course (title, code, units, semester, level, department, diploma, status)
+                 SELECT 'Test Course ' || g, 'TST ' || g, '2', 't1st', 'T100', 'Test Department', 'T.Sc', {}
+                   FROM generate_series(1, %s) g
+        """.format(status), (rows,))
+        cr.execute("""
+            INSERT INTO legacy_payment (payment_date, level, dept, matric, session, amount, purpose, status)
+                 SELECT '01/01/00', 'T100', 'TST', 'TST/' || g, '3000/3001', '1000', 'Test Fee 1', {}
+                   FROM generate_series(1, %s) g
+        """.format(status), (rows,))
+
+
+class QuickledgerResultCase(QuickledgerCase):
+    """ Adds the grading and honour schemes of the school result entries default to """
+
+    @classmethod
+    def setUpClass(cls):
+        super(QuickledgerResultCase, cls).setUpClass()
+        env = cls.env
+        cls.grading_scheme = env['quickledger.grading.scheme'].create({'name': 'Test Grading', 'grading_ids': [
+            (0, 0, {'name': 'A', 'point': 5, 'min_grade': 70, 'max_grade': 100, 'is_pass_mark': True}),
+            (0, 0, {'name': 'C', 'point': 3, 'min_grade': 50, 'max_grade': 69.99, 'is_pass_mark': True}),
+            (0, 0, {'name': 'F', 'point': 0, 'min_grade': 0, 'max_grade': 49.99, 'is_pass_mark': False})]})
+        cls.honour_scheme = env['quickledger.honour.scheme'].create({'name': 'Test Honours',
+                                                                     'options': 'no_allow_replacement'})
+        cls.honours = env['quickledger.honour'].create([
+            {'name': 'Test First Class', 'lower_bound': 4.5, 'upper_bound': 5.0},
+            {'name': 'Test Second Class', 'lower_bound': 2.4, 'upper_bound': 4.49},
+            {'name': 'Test Pass', 'lower_bound': 0.0, 'upper_bound': 2.39}])
+        School = env['quickledger.school']
+        cls.school = School.search([('name', '=', 'Nnamdi Azikiwe University')], limit=1) or \
+            School.create({'name': 'Nnamdi Azikiwe University', 'code': 'NAU'})
+        cls.school.write({'grading_scheme_id': cls.grading_scheme.id, 'honour_scheme_id': cls.honour_scheme.id})
+        env['base'].flush()
+
+    def _set_replacement(self, options, policy='latest'):
+        self.honour_scheme.write({'options': options, 'replacement_policy': policy})
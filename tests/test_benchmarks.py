@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+
+from odoo import fields
+from odoo.tests import tagged
+
+from ..models.audit_log import buffered_audit
+from .benchmark import BenchmarkRecorder
+from .common import QuickledgerCase, get_scales
+
+
+def chunks(records, size):
+    for index in range(0, len(records), size):
+        yield records[index:index + size]
+
+
+@tagged('post_install', '-at_install', '-standard', 'quickledger_benchmark')
+class TestHotPathBenchmarks(QuickledgerCase):
+    """ Throughput of the module's hot paths, run with --test-tags quickledger_benchmark
+
+    Scales come from QUICKLEDGER_BENCHMARK_SCALES and the results are written to
+    QUICKLEDGER_BENCHMARK_OUTPUT so they can be compared between releases.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestHotPathBenchmarks, cls).setUpClass()
+        cls.recorder = BenchmarkRecorder(cls.env)
+        cls.scales = get_scales()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.recorder.dump()
+        super(TestHotPathBenchmarks, cls).tearDownClass()
+
+    def _registered_students(self, prefix, scale):
+        students = self._create_students(prefix, scale)
+        Registration = self.env['student.registration']
+        for student in students:
+            Registration.create(self._registration_vals(student, self.sessions[0]))
+        return students
+
+    def test_student_create(self):
+        Student = self.env['quickledger.student']
+        for scale in self.scales:
+            vals = [{'name': 'Bench Student %s' % i, 'matriculation_number': 'BSC%s/%s' % (scale, i),
+                     'programme_id': self.programme.id} for i in range(scale)]
+            self.recorder.measure('student_create', scale, [[v] for v in vals],
+                                  lambda batch: Student.create(batch[0]))
+
+    def test_student_create_multi(self):
+        Student = self.env['quickledger.student']
+        for scale in self.scales:
+            vals = [{'name': 'Bench Intake %s' % i, 'matriculation_number': 'BSM%s/%s' % (scale, i),
+                     'programme_id': self.programme.id} for i in range(scale)]
+            self.recorder.measure('student_create_multi', scale, list(chunks(vals, 500)), Student.create,
+                                  rows_per_batch=None)
+
+    def test_registration_create(self):
+        Registration = self.env['student.registration']
+        for scale in self.scales:
+            students = self._create_students('BRG%s' % scale, scale)
+            self.recorder.measure('registration_create', scale, students,
+                                  lambda student: Registration.create(
+                                      self._registration_vals(student, self.sessions[0])))
+
+    def test_register_courses(self):
+        Registration = self.env['student.registration']
+        for scale in self.scales:
+            students = self._create_students('BRC%s' % scale, scale)
+            registrations = Registration.browse()
+            for student in students:
+                vals = dict(self._registration_vals(student, self.sessions[1]), is_legacy=True)
+                registrations |= Registration.create(vals)
+            self.recorder.measure('register_courses', scale, list(chunks(registrations, 500)),
+                                  lambda batch: batch._create_course_entries(), rows_per_batch=None)
+
+    def test_score_sheet(self):
+        ResultEntry = self.env['student.result.entry']
+        for scale in self.scales:
+            students = self._registered_students('BSS%s' % scale, scale)
+            sheets = [{student.matriculation_number: {'ca_score': 30 + i % 40, 'test_score': 20}
+                       for i, student in enumerate(batch)} for batch in chunks(students, 500)]
+            self.recorder.measure('apply_score_sheet', scale, sheets,
+                                  lambda sheet: ResultEntry.apply_score_sheet(self.courses[0], self.sessions[0], sheet),
+                                  rows_per_batch=None)
+
+    def test_refresh_gpa(self):
+        Registration = self.env['student.registration']
+        for scale in self.scales:
+            students = self._registered_students('BGP%s' % scale, scale)
+            self._insert_results(students)
+            registrations = Registration.search([('student_id', 'in', students.ids)])
+            self.recorder.measure('refresh_gpa', scale, list(chunks(registrations, 500)),
+                                  lambda batch: batch._refresh_gpa(), rows_per_batch=None)
+
+    def test_publish_results(self):
+        Publication = self.env['student.result.publication']
+        for scale in self.scales:
+            students = self._registered_students('BPR%s' % scale, scale)
+            self._insert_results(students)
+            self.env.cr.execute("UPDATE student_result_entry SET status = 'Pending' WHERE student_id IN %s",
+                                (tuple(students.ids),))
+            publication = Publication.create({'name': 'Bench %s' % scale, 'session_id': self.sessions[0].id,
+                                              'semester_id': self.semester.id, 'programme_id': self.programme.id})
+            self.recorder.measure('publish_results', scale, [publication], lambda record: record._publish(),
+                                  rows_per_batch=scale)
+
+    def test_year_end_close(self):
+        Close = self.env['student.ledger.close']
+        for scale in self.scales:
+            self._registered_students('BYE%s' % scale, scale)
+            close = Close.create({'session_id': self.sessions[0].id, 'chunk_size': 500})
+            close.action_queue()
+            batches = range(-(-close.ledger_count // close.chunk_size) + 1)
+            self.recorder.measure('year_end_close', scale, batches, lambda _batch: close._close_next_chunk(),
+                                  rows_per_batch=close.chunk_size)
+            close.session_id.is_closed = False
+
+    def test_surcharges(self):
+        penalty_type = self.env['payment.type'].create({'name': 'Bench Late Payment', 'is_penalty': True})
+        penalty = self.env['academic.fee'].create({'type_id': penalty_type.id, 'level_id': self.level.id,
+                                                   'classification_id': self.classification.id, 'amount': 5000})
+        Run = self.env['academic.surcharge.run']
+        for scale in self.scales:
+            self._registered_students('BSU%s' % scale, scale)
+            run = Run.create({'name': 'Bench %s' % scale, 'session_id': self.sessions[0].id,
+                              'cutoff_date': fields.Date.today(), 'penalty_fee_id': penalty.id})
+            self.recorder.measure('surcharge_preview', scale, [run], lambda record: record.action_preview(),
+                                  rows_per_batch=scale)
+            self.recorder.measure('surcharge_apply', scale, [run], lambda record: record._apply(),
+                                  rows_per_batch=scale)
+
+    def test_reprice_fee(self):
+        Reprice = self.env['academic.fee.reprice']
+        for scale in self.scales:
+            self._registered_students('BRP%s' % scale, scale)
+            fee = self.fees[0]
+            reprice = Reprice.create({'fee_id': fee.id, 'session_id': self.sessions[0].id,
+                                      'amount': fee.amount + scale, 'update_fee': False})
+            self.recorder.measure('reprice_fee', scale, [reprice], lambda record: record.action_apply(),
+                                  rows_per_batch=scale)
+
+    def test_audited_score_sheet(self):
+        for scale in self.scales:
+            students = self._registered_students('BAS%s' % scale, scale)
+            sheets = [{student.matriculation_number: {'ca_score': 30 + i % 40, 'test_score': 20}
+                       for i, student in enumerate(batch)} for batch in chunks(students, 500)]
+
+            def apply(sheet):
+                with buffered_audit(self.env, 'Benchmark score sheet') as env:
+                    env['student.result.entry'].apply_score_sheet(self.courses[0], self.sessions[0], sheet)
+
+            self.recorder.measure('apply_score_sheet_audited', scale, sheets, apply, rows_per_batch=None)
+
+    def test_process_payment(self):
+        Wizard = self.env['academic.payment.wizard']
+        payment_type = self.payment_types[0]
+
+        def pay(student):
+            fees = student.ledger_id.fee_entry_ids.filtered(lambda f: f.session_id == self.sessions[0])
+            wizard = Wizard.create({'student_id': student.id,
+                                    'programme_id': student.programme_id.id,
+                                    'session_id': self.sessions[0].id,
+                                    'level_id': self.level.id,
+                                    'payment_date': fields.Date.today(),
+                                    'payment_id': payment_type.id,
+                                    'amount': 1500.00,
+                                    'outstanding_fee_ids': [(6, 0, fees.ids)]})
+            wizard.do_process_payment()
+
+        for scale in self.scales:
+            students = self._registered_students('BPY%s' % scale, scale)
+            self.recorder.measure('do_process_payment', scale, students, pay)
+
+    def test_importers(self):
+        for scale in self.scales:
+            students = self._create_students('BIM%s' % scale, scale)
+            LegacyResult = self.env['academic.legacy.student.result']
+            results = LegacyResult.browse()
+            for student in students:
+                results |= LegacyResult.create({'session': self.sessions[0].code, 'course': self.courses[0].code,
+                                                'level': self.level.code, 'dept': self.department.code,
+                                                'semester': self.semester.code,
+                                                'matric': student.matriculation_number,
+                                                'exam': 40, 'test': 20})
+            self.recorder.measure('legacy_result_action_process', scale, results,
+                                  lambda record: record.action_process())
+
+            LegacyStudent = self.env['academic.legacy.student']
+            admissions = LegacyStudent.create([{'name': 'Bench Admission %s' % i,
+                                                'matric': 'NAU/3000/%s%s' % (scale, i),
+                                                'level': self.level.code, 'dept': self.department.code}
+                                               for i in range(scale)])
+            self.recorder.measure('legacy_student_action_process', scale, admissions,
+                                  lambda record: record.action_process())
+            batch_admissions = LegacyStudent.create([{'name': 'Bench Batch Admission %s' % i,
+                                                      'matric': 'NAU/3000/B%s%s' % (scale, i),
+                                                      'level': self.level.code, 'dept': self.department.code}
+                                                     for i in range(scale)])
+            self.recorder.measure('legacy_student_process_batch', scale, list(chunks(batch_admissions, 350)),
+                                  lambda batch: batch._process_batch(), rows_per_batch=None)
+
+            SchoolCourse = self.env['academic.school.course']
+            courses = SchoolCourse.browse()
+            for i in range(scale):
+                courses |= SchoolCourse.create({'title': 'Bench Course %s' % i, 'code': 'BEN %s%s' % (scale, i),
+                                                'units': '2', 'semester': self.semester.code,
+                                                'level': self.level.code, 'department': self.department.name,
+                                                'diploma': self.diploma.code, 'option': False})
+            self.recorder.measure('school_course_action_process', scale, courses,
+                                  lambda record: record.action_process())
+            catalogue = SchoolCourse.create([{'title': 'Bench Catalogue %s' % i, 'code': 'BCT %s%s' % (scale, i),
+                                              'units': '2', 'semester': self.semester.code,
+                                              'level': self.level.code, 'department': self.department.name,
+                                              'diploma': self.diploma.code, 'option': False}
+                                             for i in range(scale)])
+            self.recorder.measure('school_course_process_batch', scale, list(chunks(catalogue, 350)),
+                                  lambda batch: batch._process_batch(), rows_per_batch=None)
+
+            LegacyPayment = self.env['legacy.payment']
+            payments = LegacyPayment.browse()
+            for student in students:
+                payments |= LegacyPayment.create({'name': student.name, 'payment_date': '01/01/20',
+                                                  'level': self.level.code, 'dept': self.department.code,
+                                                  'matric': student.matriculation_number,
+                                                  'session': self.sessions[0].code, 'amount': '500',
+                                                  'purpose': self.payment_types[0].name})
+            self.recorder.measure('legacy_payment_action_process', scale, payments,
+                                  lambda record: record.action_process())
+
+    def test_ledger_totals(self):
+        def pay(ledger):
+            fee = ledger.fee_entry_ids[:1]
+            fee.write({'amount_paid': (fee.amount_paid or 0.0) + 100})
+            fee.flush()
+
+        for scale in self.scales:
+            students = self._registered_students('BLC%s' % scale, scale)
+            ledgers = students.mapped('ledger_id')
+            self.recorder.measure('ledger_totals_delta', scale, ledgers, pay)
+            self.recorder.measure('ledger_totals_reconcile', scale, list(chunks(ledgers, 5000)),
+                                  lambda batch: batch._repair_totals(batch._find_drift()), rows_per_batch=None)
+
+    def test_compute_cgpa(self):
+        for scale in self.scales:
+            students = self._create_students('BCG%s' % scale, scale)
+            self._insert_results(students)
+            books = students.mapped('result_book_ids')
+            self.recorder.measure('compute_cgpa', scale, books, lambda book: book.compute_cgpa())
+
+    def test_classify_cohort(self):
+        for scale in self.scales:
+            students = self._create_students('BCL%s' % scale, scale)
+            self._insert_results(students)
+            books = students.mapped('result_book_ids')
+            self.recorder.measure('classify_cohort', scale, [books], lambda batch: batch.classify(),
+                                  rows_per_batch=None)
+
+    def test_ledger_reports(self):
+        reports = ['quickledger.action_report_student_ledger',
+                   'quickledger.action_report_student_ledger_detail',
+                   'quickledger.action_report_student_ledger_comprehensive']
+        for scale in self.scales:
+            ledgers = self._registered_students('BRP%s' % scale, scale).mapped('ledger_id')
+            batches = list(chunks(ledgers, 50))
+            for xmlid in reports:
+                report = self.env.ref(xmlid)
+                self.recorder.measure('report_%s' % xmlid.split('.')[1], scale, batches,
+                                      lambda batch: report.render_qweb_html(batch.ids), rows_per_batch=None)
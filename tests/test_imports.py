@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+from unittest.mock import patch
+
+from odoo.tests import tagged
+
+from .common import QuickledgerCase
+
+
+@tagged('post_install', '-at_install')
+class TestLegacyStudentImport(QuickledgerCase):
+
+    def _stage(self, *names, matric='NAU/3000/D1'):
+        return self.env['academic.legacy.student'].create([{'name': name, 'matric': matric,
+                                                            'level': self.level.code,
+                                                            'dept': self.department.code} for name in names])
+
+    def test_batch_admits_new_students(self):
+        rows = self._stage('Admitted One', matric='NAU/3000/A1') | self._stage('Admitted Two', matric='NAU/3000/A2')
+        self.assertTrue(rows._process_batch())
+        self.assertEqual(set(rows.mapped('status')), {'Processed'})
+        students = self.env['quickledger.student'].search([('matriculation_number', 'in', rows.mapped('matric'))])
+        self.assertEqual(len(students), 2)
+        self.assertTrue(all(students.mapped('ledger_id')))
+
+    def test_repeated_matric_waits_for_the_row_admitting_it(self):
+        first, repeat = self._stage('Repeated Matric', 'Repeated Matric')
+
+        def refuse(self, admissions, failures):
+            for record, _vals in admissions:
+                failures[record] = ValueError("Admission refused")
+            return self.browse()
+
+        with patch.object(type(first), '_create_admissions', refuse):
+            (first | repeat)._process_batch()
+        self.assertEqual(first.status, 'Failed')
+        self.assertEqual(repeat.status, 'Failed')
+        self.assertFalse(self.env['quickledger.student'].search([('matriculation_number', '=', first.matric)]))
+
+        (first | repeat)._process_batch()
+        self.assertEqual(first.status, 'Processed')
+        self.assertEqual(repeat.status, 'Processed')
+        self.assertEqual(self.env['quickledger.student'].search_count([('matriculation_number', '=', first.matric)]),
+                         1)
+
+
+@tagged('post_install', '-at_install')
+class TestLegacyPaymentImport(QuickledgerCase):
+
+    def _stage(self, student, amount, purpose=None):
+        return self.env['legacy.payment'].create({'name': student.name, 'payment_date': '01/01/20',
+                                                  'level': self.level.code, 'dept': self.department.code,
+                                                  'matric': student.matriculation_number,
+                                                  'session': self.sessions[0].code, 'amount': amount,
+                                                  'purpose': purpose or self.payment_types[0].name})
+
+    def test_payment_is_allocated_to_its_fee(self):
+        student = self._create_students('TLP', 1)
+        row = self._stage(student, '500')
+        self.assertTrue(row.action_process())
+        self.assertEqual(row.status, 'Processed')
+        fee = student.ledger_id.fee_entry_ids.filtered(lambda f: f.type_id == self.payment_types[0])
+        self.assertEqual(fee.amount_paid, 500.00)
+        payment = self.env['academic.payment.entry'].search([('student_id', '=', student.id)])
+        self.assertEqual((payment.amount, payment.fee_ids), (500.00, fee))
+        self.assertFalse(student.ledger_id._find_drift())
+
+    def test_overpayment_fails(self):
+        student = self._create_students('TLO', 1)
+        row = self._stage(student, '5000')
+        self.assertFalse(row.action_process())
+        self.assertEqual(row.status, 'Failed')
+        self.assertFalse(self.env['academic.payment.entry'].search([('student_id', '=', student.id)]))
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+from odoo.tests import tagged
+
+from .common import QuickledgerCase, get_scale
+
+
+@tagged('post_install', '-at_install', 'quickledger_indexes')
+class TestHotPathIndexes(QuickledgerCase):
+    """ EXPLAIN the domains the module searches on and reject sequential scans """
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestHotPathIndexes, cls).setUpClass()
+        cls._bulk_insert_population(get_scale('EXPLAIN_STUDENTS', 5000))
+        cls._bulk_insert_staging(get_scale('EXPLAIN_STAGING_ROWS', 20000))
+        for table in ('quickledger_student', 'student_ledger', 'student_registration', 'student_result_entry',
+                      'academic_fee_entry', 'academic_legacy_student_result', 'academic_legacy_student',
+                      'academic_school_course', 'legacy_payment'):
+            cls.env.cr.execute("ANALYZE %s" % table)
+        cls.env.cr.execute("SELECT id FROM quickledger_student WHERE matriculation_number = 'TST/42'")
+        cls.student_id = cls.env.cr.fetchone()[0]
+
+    def _explain(self, model_name, domain):
+        Model = self.env[model_name]
+        query = Model._where_calc(domain)
+        order_by = Model._generate_order_by(None, query)
+        from_clause, where_clause, params = query.get_sql()
+        self.env.cr.execute("EXPLAIN SELECT {}.id FROM {} WHERE {}{}".format(
+            Model._table, from_clause, where_clause or 'TRUE', order_by), params)
+        return "\n".join(row[0] for row in self.env.cr.fetchall())
+
+    def assertIndexed(self, model_name, domain):
+        plan = self._explain(model_name, domain)
+        table = self.env[model_name]._table
+        self.assertNotIn('Seq Scan on {}'.format(table), plan,
+                         "{} {} falls back to a sequential scan:\n{}".format(model_name, domain, plan))
+
+    def test_registration_lookup(self):
+        self.assertIndexed('student.registration', [('student_id', '=', self.student_id),
+                                                    ('session_id', '=', self.sessions[3].id),
+                                                    ('semester_id', '=', self.semester.id)])
+
+    def test_result_entry_lookup(self):
+        self.assertIndexed('student.result.entry', [('student_id', '=', self.student_id),
+                                                    ('course_id', '=', self.courses[5].id),
+                                                    ('semester_id', '=', self.semester.id),
+                                                    ('session_id', '=', self.sessions[0].id)])
+
+    def test_ledger_by_student(self):
+        self.assertIndexed('student.ledger', [('student_id', '=', self.student_id)])
+
+    def test_fee_entries_by_type_and_session(self):
+        self.assertIndexed('academic.fee.entry', [('type_id', '=', self.fees[3].type_id.id),
+                                                  ('session_id', '=', self.sessions[2].id)])
+
+    def test_staging_queues_by_status(self):
+        for model_name in ('academic.legacy.student.result', 'academic.legacy.student',
+                           'academic.school.course', 'legacy.payment'):
+            for status in ('New', 'Failed'):
+                self.assertIndexed(model_name, self.env[model_name]._claimable_domain(status))
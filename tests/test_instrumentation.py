@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+
+from odoo.tests import tagged
+from odoo.tests.common import TransactionCase
+
+from ..models import instrumentation
+
+
+@tagged('post_install', '-at_install')
+class TestInstrumentation(TransactionCase):
+
+    def setUp(self):
+        super(TestInstrumentation, self).setUp()
+        self.Instrumentation = self.env['quickledger.instrumentation']
+        instrumentation.snapshot(reset=True)
+        self.addCleanup(instrumentation.snapshot, reset=True)
+        self.addCleanup(self.Instrumentation.clear_caches)
+        # flush() writes on a cursor of its own, which must share the test transaction
+        self.registry.enter_test_mode(self.cr)
+        self.addCleanup(self.registry.leave_test_mode)
+
+    def test_enable_is_seen_without_a_restart(self):
+        self.Instrumentation.action_disable()
+        self.assertFalse(self.Instrumentation._is_enabled())
+        self.Instrumentation.action_enable()
+        self.assertTrue(self.Instrumentation._is_enabled())
+
+    def test_counters_cover_every_process(self):
+        self.env.cr.execute("""
+            INSERT INTO quickledger_instrumentation_stat (pid, name, calls, records, seconds, max_seconds, queries)
+                 VALUES (-1, 'test.method', 3, 30, 0.3, 0.2, 9)
+        """)
+        instrumentation.record('test.method', 0.5, 4, 10)
+        stat = self.Instrumentation._get_stats()['test.method']
+        self.assertEqual(stat['calls'], 4)
+        self.assertEqual(stat['records'], 40)
+        self.assertEqual(stat['queries'], 13)
+        self.assertAlmostEqual(stat['seconds'], 0.8)
+        self.assertAlmostEqual(stat['max_seconds'], 0.5)
+
+    def test_flush_adds_to_the_rows_of_this_process(self):
+        instrumentation.record('test.flushed', 0.1, 2, 5)
+        instrumentation.flush(self.env.registry)
+        instrumentation.record('test.flushed', 0.1, 2, 5)
+        instrumentation.flush(self.env.registry)
+        self.assertFalse(instrumentation.snapshot())
+        self.env.cr.execute("SELECT calls, records, queries FROM quickledger_instrumentation_stat "
+                            "WHERE name = 'test.flushed'")
+        self.assertEqual(self.env.cr.fetchall(), [(2, 10, 4)])
+
+    def test_dump_resets_every_process(self):
+        instrumentation.record('test.dumped', 0.1, 2, 5)
+        instrumentation.flush(self.env.registry)
+        self.Instrumentation.dump_stats()
+        self.assertNotIn('test.dumped', self.Instrumentation._get_stats())
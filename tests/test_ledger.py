@@ -0,0 +1,419 @@
+# -*- coding: utf-8 -*-
+
+from unittest.mock import patch
+
+from odoo import fields, sql_db
+from odoo.exceptions import UserError
+from odoo.tests import tagged
+
+from .common import QuickledgerCase
+from ..models.ledger_audit import _audit_chunk
+from ..models.ledger_totals import has_drifted
+
+
+@tagged('post_install', '-at_install')
+class TestClosedSession(QuickledgerCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestClosedSession, cls).setUpClass()
+        cls.student = cls._create_students('TCS', 1)
+        cls.env['student.registration'].create(cls._registration_vals(cls.student, cls.sessions[0]))
+        cls.ledger = cls.student.ledger_id
+        cls.fee_entries = cls.ledger.fee_entry_ids.filtered(lambda f: f.session_id == cls.sessions[0])
+        cls.env['student.ledger.close'].create({'session_id': cls.sessions[0].id}).action_queue()
+
+    def test_fees_of_a_closed_session_are_paid(self):
+        balance = self.ledger.total_balance
+        wizard = self.env['academic.payment.wizard'].create({'student_id': self.student.id,
+                                                             'programme_id': self.programme.id,
+                                                             'session_id': self.sessions[0].id,
+                                                             'level_id': self.level.id,
+                                                             'payment_date': fields.Date.today(),
+                                                             'amount': 1500.00,
+                                                             'outstanding_fee_ids': [(6, 0, self.fee_entries.ids)]})
+        payment = wizard.do_process_payment()
+        self.assertEqual(sum(payment.fee_ids.mapped('amount_paid')), 1500.00)
+        self.assertEqual(self.ledger.total_balance, balance - 1500.00)
+        self.assertFalse(self.ledger._find_drift())
+
+    def test_billing_of_a_closed_session_is_locked(self):
+        fee = self.fee_entries[0]
+        with self.assertRaises(UserError):
+            fee.write({'amount_due': 2000.00})
+        with self.assertRaises(UserError):
+            fee.write({'fee_id': self.fee_entries[1].fee_id.id})
+        with self.assertRaises(UserError):
+            fee.unlink()
+        with self.assertRaises(UserError):
+            self.env['academic.fee.entry'].create({'registration_id': fee.registration_id.id,
+                                                   'fee_id': fee.fee_id.id,
+                                                   'ledger_id': self.ledger.id})
+
+
+@tagged('post_install', '-at_install')
+class TestFeeReprice(QuickledgerCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestFeeReprice, cls).setUpClass()
+        cls.students = cls._create_students('TFR', 3)
+        Registration = cls.env['student.registration']
+        for student in cls.students:
+            Registration.create(cls._registration_vals(student, cls.sessions[0]))
+        cls.ledgers = cls.students.mapped('ledger_id')
+        cls.fee = cls.ledgers.mapped('fee_entry_ids.fee_id')[:1]
+        cls.entries = cls.ledgers.mapped('fee_entry_ids').filtered(lambda f: f.fee_id == cls.fee)
+
+    def _reprice(self, amount, update_fee=True):
+        reprice = self.env['academic.fee.reprice'].create({'fee_id': self.fee.id, 'session_id': self.sessions[0].id,
+                                                           'amount': amount, 'update_fee': update_fee})
+        reprice.action_apply()
+        return reprice
+
+    def test_entries_paid_beyond_the_new_amount_are_kept(self):
+        overpaid, part_paid, unpaid = self.entries
+        overpaid.write({'amount_paid': 800.00})
+        part_paid.write({'amount_paid': 300.00})
+        reprice = self._reprice(500.00)
+        self.assertEqual(overpaid.amount_due, 1000.00)
+        self.assertEqual(overpaid.balance, 200.00)
+        self.assertEqual((part_paid.amount_due, part_paid.balance), (500.00, 200.00))
+        self.assertEqual((unpaid.amount_due, unpaid.balance), (500.00, 500.00))
+        self.assertEqual((reprice.entry_count, reprice.amount_change), (2, -1000.00))
+        self.assertFalse(self.ledgers._find_drift())
+
+    def test_previous_amount_is_the_billed_one(self):
+        first = self._reprice(1200.00, update_fee=False)
+        self.assertEqual(first.old_amount, 1000.00)
+        self.assertEqual(self.fee.amount, 1000.00)
+        second = self._reprice(1500.00, update_fee=False)
+        self.assertEqual(second.old_amount, 1200.00)
+        self.assertEqual((second.entry_count, second.amount_change), (3, 900.00))
+        self.assertEqual(set(self.entries.mapped('amount_due')), {1500.00})
+        self.assertFalse(self.ledgers._find_drift())
+
+    def test_registration_charges_follow_the_new_amount(self):
+        overpaid = self.entries[0]
+        overpaid.write({'amount_paid': 800.00})
+        registrations = self.entries.mapped('registration_id')
+        charges = {registration: registration.total_charges for registration in registrations}
+        self._reprice(500.00)
+        for registration in registrations:
+            expected = charges[registration] - (0.00 if registration == overpaid.registration_id else 500.00)
+            self.assertEqual(registration.total_charges, expected)
+            self.assertEqual(registration.total_charges, sum(registration.fee_entry_ids.mapped('amount_due')))
+            self.assertEqual(registration.student_id.ledger_id.current_charges, expected)
+
+
+@tagged('post_install', '-at_install')
+class TestLedgerTotals(QuickledgerCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestLedgerTotals, cls).setUpClass()
+        cls.students = cls._create_students('TLT', 2)
+        Registration = cls.env['student.registration']
+        cls.registrations = Registration.browse()
+        for student in cls.students:
+            cls.registrations |= Registration.create(cls._registration_vals(student, cls.sessions[0]))
+        cls.ledgers = cls.students.mapped('ledger_id')
+
+    def assertNoDrift(self):
+        self.assertFalse(self.ledgers._find_drift())
+
+    def _fee(self, ledger=None):
+        registration = self.registrations[0]
+        return self.env['academic.fee.entry'].create({'registration_id': registration.id,
+                                                      'fee_id': self.fees[0].id,
+                                                      'ledger_id': (ledger or registration.student_id.ledger_id).id})
+
+    def _payment(self, amount):
+        student = self.students[0]
+        return self.env['academic.payment.entry'].create({'student_id': student.id,
+                                                          'ledger_id': student.ledger_id.id,
+                                                          'level_id': self.level.id,
+                                                          'session_id': self.sessions[0].id,
+                                                          'amount': amount})
+
+    def test_fee_create_and_unlink(self):
+        self.assertNoDrift()
+        fee = self._fee()
+        self.assertNoDrift()
+        fee.unlink()
+        self.assertNoDrift()
+
+    def test_fee_payments(self):
+        fee = self._fee()
+        fee.write({'amount_paid': 400.00})
+        self.assertNoDrift()
+        fee.write({'amount_paid': 1000.00})
+        self.assertNoDrift()
+        fee.write({'amount_paid': 0.00})
+        self.assertNoDrift()
+
+    def test_fee_moved_to_another_ledger(self):
+        fee = self._fee()
+        fee.write({'amount_paid': 250.00})
+        fee.write({'ledger_id': self.ledgers[1].id})
+        self.assertNoDrift()
+
+    def test_payment_create_write_and_unlink(self):
+        payment = self._payment(700.00)
+        self.assertNoDrift()
+        payment.write({'amount': 900.00})
+        self.assertNoDrift()
+        payment.write({'ledger_id': self.ledgers[1].id})
+        self.assertNoDrift()
+        payment.unlink()
+        self.assertNoDrift()
+
+    def test_balance_brought_forward(self):
+        student = self.students[0]
+        student.write({'balance_brought_forward': 2500.00})
+        self.assertNoDrift()
+        # Counted whatever its sign
+        student.write({'balance_brought_forward': -1500.00})
+        self.assertNoDrift()
+        student.write({'balance_brought_forward': 0.00})
+        self.assertNoDrift()
+
+    def test_reconcile_repairs_drift(self):
+        drifted, kept = self.ledgers
+        expected = kept.total_balance
+        self.env['base'].flush()
+        self.env.cr.execute("UPDATE student_ledger SET total_balance = total_balance + 123.45, total_amount_due = 0 "
+                            "WHERE id = %s", (drifted.id,))
+        self.ledgers.invalidate_cache()
+        self.assertEqual(list(self.ledgers._find_drift()), [drifted.id])
+        with patch.object(self.env.cr, 'commit'):
+            self.env['student.ledger'].reconcile_totals(chunk_size=1)
+        self.assertNoDrift()
+        self.assertEqual(kept.total_balance, expected)
+
+
+@tagged('post_install', '-at_install')
+class TestLedgerDrift(QuickledgerCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestLedgerDrift, cls).setUpClass()
+        cls.students = cls._create_students('TLD', 2)
+        Registration = cls.env['student.registration']
+        for student in cls.students:
+            Registration.create(cls._registration_vals(student, cls.sessions[0]))
+        cls.ledgers = cls.students.mapped('ledger_id')
+
+    def _shift(self, ledger, column, amount):
+        self.env['base'].flush()
+        self.env.cr.execute('UPDATE student_ledger SET "{0}" = COALESCE("{0}", 0) + %s WHERE id = %s'.format(column),
+                            (amount, ledger.id))
+        self.ledgers.invalidate_cache()
+
+    def test_has_drifted(self):
+        row = (1, 1000, 400, 600, 1000, 400, 600, 400)
+        self.assertFalse(has_drifted(row))
+        self.assertFalse(has_drifted((1, 1000.004, 400, 600, 1000, 400, 600, 400)))
+        for column in range(1, 4):
+            shifted = list(row)
+            shifted[column] += 0.01
+            self.assertTrue(has_drifted(shifted))
+
+    def test_find_drift(self):
+        drifted, kept = self.ledgers
+        expected = (drifted.total_amount_due, drifted.total_amount_paid, drifted.total_balance)
+        self.assertFalse(self.ledgers._find_drift())
+        for column in ('total_amount_due', 'total_amount_paid', 'total_balance'):
+            self._shift(drifted, column, 0.004)
+            self.assertFalse(self.ledgers._find_drift())
+            self._shift(drifted, column, 0.006)
+            drift = self.ledgers._find_drift()
+            self.assertEqual(list(drift), [drifted.id])
+            self.assertEqual(tuple(float(total) for total in drift[drifted.id]), expected)
+            self._shift(drifted, column, -0.01)
+        self.assertFalse(self.ledgers._find_drift())
+
+    def test_audit_chunk_runs_in_its_own_process(self):
+        # The process sees committed data only, so none of the ledgers of this test
+        connection_info = sql_db.connection_info_for(self.env.cr.dbname)[1]
+        self.assertEqual(_audit_chunk(connection_info, -1, 0), [])
+        with self.assertRaises(RuntimeError):
+            _audit_chunk(dict(connection_info, database='quickledger_no_such_database'), -1, 0)
+
+
+@tagged('post_install', '-at_install')
+class TestYearEndClose(QuickledgerCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestYearEndClose, cls).setUpClass()
+        cls.students = cls._create_students('TYE', 3)
+        Registration = cls.env['student.registration']
+        for session in cls.sessions[:3]:
+            for student in cls.students:
+                Registration.create(cls._registration_vals(student, session))
+        cls.ledgers = cls.students.mapped('ledger_id')
+
+    def _close(self, session, chunk_size=1):
+        close = self.env['student.ledger.close'].create({'session_id': session.id, 'chunk_size': chunk_size})
+        close.action_queue()
+        return close
+
+    def _ledger_ids(self):
+        self.env['base'].flush()
+        self.env.cr.execute("SELECT id FROM student_ledger ORDER BY id")
+        return [row[0] for row in self.env.cr.fetchall()]
+
+    def _process_queue(self):
+        cr = self.env.cr
+        with patch.object(cr, 'commit'), patch.object(cr, 'rollback'):
+            self.env['student.ledger.close'].process_queue()
+
+    def test_closing_balances(self):
+        student, ledger = self.students[0], self.ledgers[0]
+        student.write({'balance_brought_forward': -300.00})
+        fees = ledger.fee_entry_ids
+        fees.filtered(lambda f: f.session_id == self.sessions[0])[:1].write({'amount_paid': 400.00})
+        fees.filtered(lambda f: f.session_id == self.sessions[2])[:1].write({'amount_paid': 1000.00})
+        close = self._close(self.sessions[1], chunk_size=10000)
+        while close.state == 'queued':
+            close._close_next_chunk()
+        # Fees of the later session are neither carried forward nor charged
+        closed = fees.filtered(lambda f: f.session_id.sequence <= self.sessions[1].sequence)
+        self.assertEqual(ledger.balance_carried_forward, 300.00 + sum(closed.mapped('balance')))
+        self.assertEqual(ledger.current_charges,
+                         sum(fees.filtered(lambda f: f.session_id == self.sessions[1]).mapped('amount_due')))
+        self.assertEqual(close.closed_count, len(self._ledger_ids()))
+
+    def test_chunks_move_the_checkpoint(self):
+        ledger_ids = self._ledger_ids()
+        close = self._close(self.sessions[0])
+        close._close_next_chunk()
+        self.assertEqual((close.last_ledger_id, close.closed_count), (ledger_ids[0], 1))
+        close._close_next_chunk()
+        self.assertEqual((close.last_ledger_id, close.closed_count), (ledger_ids[1], 2))
+        self.assertEqual(close.state, 'queued')
+
+    def test_failed_close_resumes_from_its_checkpoint(self):
+        ledger_ids = self._ledger_ids()
+        close = self._close(self.sessions[0])
+        Close = type(close)
+        close_next_chunk = Close._close_next_chunk
+        checkpoints = []
+
+        def fail_second_chunk(self):
+            checkpoints.append(self.last_ledger_id)
+            if len(checkpoints) == 2:
+                raise ValueError("Chunk failed")
+            return close_next_chunk(self)
+
+        with patch.object(Close, '_close_next_chunk', fail_second_chunk):
+            self._process_queue()
+        self.assertEqual((close.state, close.remarks), ('failed', 'Chunk failed'))
+        self.assertEqual((close.last_ledger_id, close.closed_count), (ledger_ids[0], 1))
+
+        close.action_queue()
+        self.assertEqual((close.state, close.last_ledger_id), ('queued', ledger_ids[0]))
+        del checkpoints[:]
+
+        def resume(self):
+            checkpoints.append(self.last_ledger_id)
+            return close_next_chunk(self)
+
+        with patch.object(Close, '_close_next_chunk', resume):
+            self._process_queue()
+        self.assertEqual(checkpoints[0], ledger_ids[0])
+        self.assertEqual(close.state, 'done')
+        self.assertEqual((close.last_ledger_id, close.closed_count), (ledger_ids[-1], len(ledger_ids)))
+
+
+@tagged('post_install', '-at_install')
+class TestSurcharge(QuickledgerCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestSurcharge, cls).setUpClass()
+        env = cls.env
+        cls.other_faculty = env['quickledger.faculty'].create({'name': 'Test Other Faculty',
+                                                               'classification_id': cls.classification.id})
+        other_department = env['quickledger.department'].create({'name': 'Test Other Department', 'code': 'TSO',
+                                                                 'faculty_id': cls.other_faculty.id})
+        other_programme = env['quickledger.programme'].create({'department_id': other_department.id,
+                                                               'faculty_id': cls.other_faculty.id,
+                                                               'diploma_id': cls.diploma.id})
+        cls.student = cls._create_students('TSC', 1)
+        cls.outsider = env['quickledger.student'].create({'name': 'Test Outsider', 'matriculation_number': 'TSC/X',
+                                                          'programme_id': other_programme.id})
+        Registration = env['student.registration']
+        cls.registration = Registration.create(cls._registration_vals(cls.student, cls.sessions[0]))
+        cls.other_registration = Registration.create(cls._registration_vals(cls.outsider, cls.sessions[0]))
+        # Settle the fees billed on registration, the tests bill their own
+        for fee in (cls.registration | cls.other_registration).mapped('fee_entry_ids'):
+            fee.write({'amount_paid': fee.amount_due})
+        PaymentType = env['payment.type']
+        cls.terms = {}
+        for term in ('25', '50', '100'):
+            payment_type = PaymentType.create({'name': 'Test Term %s' % term})
+            cls.terms[term] = env['academic.fee'].create({'type_id': payment_type.id, 'amount': 1000.00,
+                                                          'term_id': term})
+        penalty_type = PaymentType.create({'name': 'Test Surcharge', 'is_penalty': True})
+        cls.penalty_fee = env['academic.fee'].create({'type_id': penalty_type.id, 'amount': 50.00})
+
+    @classmethod
+    def _bill(cls, fee, amount_paid, registration=None):
+        registration = registration or cls.registration
+        entry = cls.env['academic.fee.entry'].create({'registration_id': registration.id, 'fee_id': fee.id,
+                                                      'ledger_id': registration.student_id.ledger_id.id})
+        if amount_paid:
+            entry.write({'amount_paid': amount_paid})
+        return entry
+
+    def _run(self):
+        return self.env['academic.surcharge.run'].create({'name': 'Test Surcharge', 'session_id': self.sessions[0].id,
+                                                          'penalty_fee_id': self.penalty_fee.id})
+
+    def _surcharges(self):
+        return self.env['academic.fee.entry'].search([('fee_id', '=', self.penalty_fee.id)])
+
+    def test_term_thresholds(self):
+        short = self._bill(self.terms['25'], 249.99) | self._bill(self.terms['50'], 499.99) | \
+            self._bill(self.terms['100'], 999.99)
+        # Paid exactly the share of the term
+        self._bill(self.terms['25'], 250.00)
+        self._bill(self.terms['50'], 500.00)
+        self._bill(self.terms['100'], 1000.00)
+        self.assertEqual([row[0] for row in self._run()._get_breaches()], short.ids)
+
+    def test_preview_charges_nothing(self):
+        self._bill(self.terms['25'], 100.00)
+        self._bill(self.terms['100'], 600.00)
+        self._bill(self.terms['50'], 0.00, self.other_registration)
+        run = self._run()
+        run.action_preview()
+        self.assertFalse(self._surcharges())
+        self.assertEqual((run.entry_count, run.amount_outstanding, run.amount_surcharged, run.is_preview),
+                         (3, 2300.00, 150.00, True))
+        lines = {line.faculty_id: (line.entry_count, line.amount_outstanding, line.amount_surcharged)
+                 for line in run.line_ids}
+        self.assertEqual(lines, {self.faculty: (2, 1300.00, 100.00), self.other_faculty: (1, 1000.00, 50.00)})
+        self.assertEqual(run.state, 'draft')
+
+    def test_apply_charges_each_breach_once(self):
+        breached = self._bill(self.terms['25'], 100.00) | self._bill(self.terms['50'], 0.00, self.other_registration)
+        self._bill(self.terms['100'], 1000.00)
+        ledgers = (self.student | self.outsider).mapped('ledger_id')
+        balance = sum(ledgers.mapped('total_balance'))
+        run = self._run()
+        run._apply()
+        surcharges = self._surcharges()
+        self.assertEqual(surcharges.mapped('penalty_for_id'), breached)
+        self.assertEqual(set(surcharges.mapped('amount_due')), {50.00})
+        self.assertEqual((run.state, run.entry_count, run.is_preview), ('done', 2, False))
+        self.assertEqual(sum(ledgers.mapped('total_balance')), balance + 100.00)
+        self.assertFalse(ledgers._find_drift())
+
+        # Neither the surcharged fees nor the unpaid surcharges themselves are charged again
+        again = self._run()
+        again._apply()
+        self.assertEqual(again.entry_count, 0)
+        self.assertEqual(self._surcharges(), surcharges)
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+import base64
+import io
+import zipfile
+
+from PIL import Image
+
+from odoo.tests import tagged
+
+from ..models.models import resize_photo
+from .common import QuickledgerCase
+
+
+def make_photo(width, height):
+    data = io.BytesIO()
+    Image.new('RGB', (width, height), 'navy').save(data, 'PNG')
+    return data.getvalue()
+
+
+@tagged('post_install', '-at_install')
+class TestPassportPhotos(QuickledgerCase):
+
+    def _size(self, image):
+        return Image.open(io.BytesIO(base64.b64decode(image))).size
+
+    def test_resize_photo(self):
+        vals = resize_photo(base64.b64encode(make_photo(2048, 1024)))
+        self.assertEqual(self._size(vals['image']), (1024, 512))
+        self.assertEqual(self._size(vals['image_medium']), (128, 64))
+        self.assertEqual(self._size(vals['image_small']), (64, 32))
+        self.assertEqual(resize_photo(False), {'image': False, 'image_medium': False, 'image_small': False})
+
+    def test_upload_archive(self):
+        students = self._create_students('PHT', 2)
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w') as zf:
+            zf.writestr('PHT_0.png', make_photo(300, 400))
+            zf.writestr('photos/PHT-1.png', b'not an image')
+            zf.writestr('NOBODY_1.png', make_photo(300, 400))
+            zf.writestr('notes.txt', b'ignored')
+        wizard = self.env['student.photo.wizard'].create({'data': base64.b64encode(archive.getvalue()),
+                                                          'filename': 'photos.zip', 'workers': 1})
+        wizard.do_upload()
+        self.assertEqual(wizard.loaded_count, 1)
+        self.assertEqual(wizard.skipped_count, 2)
+        self.assertIn('NOBODY/1', wizard.remarks)
+        self.assertIn('PHT-1.png', wizard.remarks)
+        self.assertEqual(self._size(students[0].image_small), (48, 64))
+        self.assertFalse(students[1].image)
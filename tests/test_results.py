@@ -0,0 +1,362 @@
+# -*- coding: utf-8 -*-
+
+import base64
+from unittest.mock import patch
+
+from odoo.tests import tagged
+
+from .common import QuickledgerResultCase
+
+
+@tagged('post_install', '-at_install')
+class TestGradeReplacement(QuickledgerResultCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestGradeReplacement, cls).setUpClass()
+        cls.student = cls._create_students('TGR', 1)
+        cls.book = cls.student.result_book_ids
+        retaken, improved = cls.courses[0], cls.courses[1]
+        # Failed then passed on retake: F (0) then C (3)
+        cls._add_result(cls.student, retaken, cls.sessions[0], 30)
+        cls._add_result(cls.student, retaken, cls.sessions[1], 55)
+        # Passed, then resat for a worse grade: A (5) then C (3)
+        cls._add_result(cls.student, improved, cls.sessions[0], 75)
+        cls._add_result(cls.student, improved, cls.sessions[1], 55)
+
+    def _transcript(self):
+        return self.env['report.quickledger.report_student_transcript']._get_transcripts(self.book.ids)[self.book.id]
+
+    def assertCgpa(self, cgpa):
+        self.assertEqual(self.book.compute_cgpa(), cgpa)
+        transcript = self._transcript()
+        self.assertEqual(transcript['cgpa'], cgpa)
+        self.assertEqual(transcript['sessions'][-1]['semesters'][-1]['cgpa'], cgpa)
+
+    def test_every_attempt_counts_without_replacement(self):
+        self._set_replacement('no_allow_replacement')
+        # (0 + 3 + 5 + 3) * 2 units / 8 units
+        self.assertCgpa(2.75)
+
+    def test_latest_attempt_replaces(self):
+        self._set_replacement('allow_grade_replacement', 'latest')
+        self.assertCgpa(3.0)
+
+    def test_best_attempt_replaces(self):
+        self._set_replacement('allow_grade_replacement', 'best')
+        self.assertCgpa(4.0)
+
+    def test_running_cgpa_of_the_first_session(self):
+        self._set_replacement('allow_grade_replacement', 'latest')
+        first_session = self._transcript()['sessions'][0]['semesters'][-1]
+        # F (0) and A (5) over 4 units
+        self.assertEqual(first_session['cgpa'], 2.5)
+        self.assertEqual(first_session['gpa'], 2.5)
+
+
+@tagged('post_install', '-at_install')
+class TestCarryOvers(QuickledgerResultCase):
+
+    def test_latest_approved_attempt_decides(self):
+        student = self._create_students('TCO', 1)
+        passed_on_retake, failed_on_resit, pass_pending = self.courses[:3]
+        self._add_result(student, passed_on_retake, self.sessions[0], 30)
+        self._add_result(student, passed_on_retake, self.sessions[1], 60)
+        self._add_result(student, failed_on_resit, self.sessions[0], 60)
+        failed = self._add_result(student, failed_on_resit, self.sessions[1], 30)
+        pending_fail = self._add_result(student, pass_pending, self.sessions[0], 30)
+        self._add_result(student, pass_pending, self.sessions[1], 60, status='Pending')
+
+        carry_overs = self.env['student.result.entry']._get_carry_overs(student.ids)
+        self.assertEqual(carry_overs, {student.id: {failed_on_resit.id: failed.id,
+                                                    pass_pending.id: pending_fail.id}})
+        self.assertEqual(self.env['student.result.entry']._get_carry_overs(student.ids, self.semester.id),
+                         carry_overs)
+
+    def test_outstanding_courses_of_the_result_book(self):
+        student = self._create_students('TCB', 1)
+        self._add_result(student, self.courses[0], self.sessions[0], 30)
+        self._add_result(student, self.courses[1], self.sessions[0], 80)
+        self.assertEqual(student.result_book_ids.outstanding_course_ids, self.courses[0])
+
+
+@tagged('post_install', '-at_install')
+class TestCourseRegistration(QuickledgerResultCase):
+
+    def _course_at_next_level(self):
+        level = self.env['quickledger.level'].create({'name': 'T200', 'code': 'T200', 'sequence': 2,
+                                                      'type_id': self.diploma_type.id})
+        course = self.env['programme.course'].create({'name': 'Test Resit Course', 'code': 'TST 200',
+                                                      'semester_id': self.semester.id,
+                                                      'diploma_id': self.diploma.id})
+        return self.env['programme.course.entry'].create({'course_id': course.id, 'programme_id': self.programme.id,
+                                                          'level_id': level.id, 'units': 2})
+
+    def test_level_courses_and_carry_overs(self):
+        student = self._create_students('TRC', 1)
+        failed = self._course_at_next_level()
+        self._add_result(student, failed, self.sessions[0], 30)
+        registration = self.env['student.registration'].create(self._registration_vals(student, self.sessions[1]))
+        self.assertEqual(registration.entry_ids.filtered('is_brought_forward').mapped('course_id'), failed)
+        self.assertEqual(registration.entry_ids.filtered(lambda e: not e.is_brought_forward).mapped('course_id'),
+                         self.courses)
+
+    def test_registration_without_semester(self):
+        student = self._create_students('TRN', 1)
+        self._add_result(student, self.courses[0], self.sessions[0], 30)
+        vals = dict(self._registration_vals(student, self.sessions[1]), semester_id=False)
+        registration = self.env['student.registration'].create(vals)
+        self.assertFalse(registration.semester_id)
+        self.assertFalse(registration.entry_ids.filtered('is_brought_forward'))
+
+    def test_registering_again_adds_nothing(self):
+        student = self._create_students('TRA', 1)
+        registration = self.env['student.registration'].create(self._registration_vals(student, self.sessions[1]))
+        count = len(registration.entry_ids)
+        registration.action_register_courses()
+        registration.invalidate_cache(['entry_ids'])
+        self.assertEqual(len(registration.entry_ids), count)
+
+
+@tagged('post_install', '-at_install')
+class TestScoreSheet(QuickledgerResultCase):
+
+    def _register(self, prefix, count, session=None):
+        students = self._create_students(prefix, count)
+        Registration = self.env['student.registration']
+        registrations = Registration.browse()
+        for student in students:
+            registrations |= Registration.create(self._registration_vals(student, session or self.sessions[0]))
+        return students, registrations
+
+    def test_scoring_submits_drafts_only(self):
+        students, registrations = self._register('TSD', 1)
+        draft = self._add_result(students, self.courses[0], self.sessions[0], 0, 'Draft', registrations)
+        approved = self._add_result(students, self.courses[1], self.sessions[0], 40, 'Approved', registrations)
+        (draft | approved).write({'ca_score': 65})
+        self.assertEqual(draft.status, 'Pending')
+        self.assertEqual(approved.status, 'Approved')
+        self.assertEqual((draft | approved).mapped('score'), [65.0, 65.0])
+        self.assertEqual([entry.grade_id.name for entry in draft | approved], ['C', 'C'])
+
+    def test_upload_matches_creates_and_skips(self):
+        students, registrations = self._register('TSS', 2)
+        scored, unscored = students
+        entry = self._add_result(scored, self.courses[0], self.sessions[0], 0, 'Draft', registrations[0])
+        rows = {scored.matriculation_number.lower(): {'ca_score': 45, 'test_score': 30},
+                unscored.matriculation_number: {'ca_score': 40},
+                'NOBODY/1': {'ca_score': 90}}
+        summary = self.env['student.result.entry'].apply_score_sheet(self.courses[0], self.sessions[0], rows)
+        self.assertEqual(summary, {'updated': 1, 'created': 1, 'unmatched': ['NOBODY/1']})
+
+        self.assertEqual(entry.status, 'Pending')
+        self.assertEqual(entry.score, 75)
+        self.assertEqual(entry.grade_id.name, 'A')
+        created = self.env['student.result.entry'].search([('student_id', '=', unscored.id),
+                                                           ('course_id', '=', self.courses[0].id),
+                                                           ('session_id', '=', self.sessions[0].id)])
+        self.assertEqual(created.status, 'Pending')
+        self.assertEqual(created.registration_id, registrations[1])
+        self.assertEqual(created.student_result_id, unscored.result_book_ids)
+        self.assertEqual(created.grade_id.name, 'F')
+
+    def test_upload_is_audited(self):
+        students, registrations = self._register('TSA', 2)
+        scored, unscored = students
+        entry = self._add_result(scored, self.courses[0], self.sessions[0], 0, 'Draft', registrations[0])
+        sheet = "reg_number,exam,test\n{},45,30\n{},40,0\nNOBODY/1,90,0\n".format(scored.matriculation_number,
+                                                                                 unscored.matriculation_number)
+        wizard = self.env['student.score.sheet.wizard'].create({'course_id': self.courses[0].id,
+                                                                'session_id': self.sessions[0].id,
+                                                                'data': base64.b64encode(sheet.encode())})
+        wizard.do_upload()
+        created = self.env['student.result.entry'].search([('student_id', '=', unscored.id),
+                                                           ('course_id', '=', self.courses[0].id),
+                                                           ('session_id', '=', self.sessions[0].id)])
+        logs = self.env['quickledger.audit.log'].search([
+            ('operation', '=', "Score sheet {} {}".format(self.courses[0].code, self.sessions[0].code)),
+            ('model', '=', 'student.result.entry')])
+        self.assertEqual(set(logs.mapped('res_id')), {entry.id, created.id})
+
+        def changes(record):
+            return {log.field_name: (log.old_value, log.new_value) for log in logs if log.res_id == record.id}
+
+        updated = changes(entry)
+        self.assertEqual(updated['Examination Score'], ('0.0', '45.0'))
+        self.assertEqual(updated['Test Score'], ('0.0', '30.0'))
+        self.assertEqual(updated['Status'], ('Draft', 'Pending Approval'))
+        self.assertNotIn('Practicals Score', updated)
+        self.assertEqual(logs.filtered(lambda log: log.res_id == entry.id).mapped('student_id'), scored)
+        inserted = changes(created)
+        self.assertEqual(inserted['Examination Score'], ('', '40.0'))
+        self.assertEqual(inserted['Test Score'], ('', '0.0'))
+        self.assertEqual(inserted['Status'], ('', 'Pending Approval'))
+        self.assertEqual(logs.filtered(lambda log: log.res_id == created.id).mapped('student_id'), unscored)
+
+
+@tagged('post_install', '-at_install')
+class TestRegistrationGpa(QuickledgerResultCase):
+
+    def setUp(self):
+        super(TestRegistrationGpa, self).setUp()
+        self.student = self._create_students('TGP', 1)
+        self.registration = self.env['student.registration'].create(
+            self._registration_vals(self.student, self.sessions[0]))
+
+    def _add(self, course, score):
+        return self._add_result(self.student, course, self.sessions[0], score, registration=self.registration)
+
+    def assertGpa(self, gpa):
+        self.assertEqual(self.registration.gpa, gpa)
+        self.assertEqual(self.env['quickledger.honour'].compute_gpa(self.registration.result_ids), gpa)
+
+    def test_gpa_follows_its_entries(self):
+        first = self._add(self.courses[0], 75)
+        self.assertGpa(5.0)
+        second = self._add(self.courses[1], 55)
+        self.assertGpa(4.0)
+        third = self._add(self.courses[2], 30)
+        # 16 points over 6 units, truncated
+        self.assertGpa(2.66)
+        third.write({'ca_score': 50})
+        self.assertGpa(3.66)
+        second.write({'status': 'Pending'})
+        self.assertGpa(4.0)
+        first.unlink()
+        self.assertGpa(3.0)
+
+    def test_score_sheet_refreshes_once(self):
+        other = self._create_students('TGQ', 1)
+        self.env['student.registration'].create(self._registration_vals(other, self.sessions[0]))
+        self._add(self.courses[0], 0)
+        rows = {self.student.matriculation_number: {'ca_score': 75}, other.matriculation_number: {'ca_score': 55}}
+        Registration = type(self.registration)
+        with patch.object(Registration, '_refresh_gpa', autospec=True,
+                          side_effect=Registration._refresh_gpa) as refresh_gpa:
+            self.env['student.result.entry'].apply_score_sheet(self.courses[0], self.sessions[0], rows)
+        self.assertEqual(refresh_gpa.call_count, 1)
+        self.assertEqual(len(refresh_gpa.call_args[0][0]), 2)
+
+
+@tagged('post_install', '-at_install')
+class TestClassification(QuickledgerResultCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestClassification, cls).setUpClass()
+        # Banded against the test honours only, whatever the database holds
+        cls.env['quickledger.honour'].search([('id', 'not in', cls.honours.ids)]).unlink()
+        cls.first, cls.second, cls.failed, cls.later = cls._create_students('TCL', 4)
+        Registration = cls.env['student.registration']
+        for student in (cls.first, cls.second, cls.failed):
+            Registration.create(cls._registration_vals(student, cls.sessions[0]))
+        Registration.create(cls._registration_vals(cls.later, cls.sessions[1]))
+        for student, session, scores in ((cls.first, cls.sessions[0], [75, 80]),
+                                         (cls.second, cls.sessions[0], [75, 55, 55]),
+                                         (cls.failed, cls.sessions[0], [30, 20]),
+                                         (cls.later, cls.sessions[1], [55])):
+            for course, score in zip(cls.courses, scores):
+                cls._add_result(student, course, session, score)
+
+    def _books(self, *students):
+        return self.env['quickledger.student'].concat(*students).mapped('result_book_ids')
+
+    def test_search_cohort(self):
+        Book = self.env['student.result']
+        self.assertEqual(Book._search_cohort(self.programme), self._books(self.first, self.second, self.failed,
+                                                                          self.later))
+        self.assertEqual(Book._search_cohort(self.programme, self.sessions[0]),
+                         self._books(self.first, self.second, self.failed))
+        self.assertEqual(Book._search_cohort(self.programme, self.sessions[1], self.level), self._books(self.later))
+        self.assertFalse(Book._search_cohort(self.programme, self.sessions[2], self.level))
+
+    def test_classify(self):
+        books = self._books(self.first, self.second, self.failed)
+        summary = books.classify()
+        self.assertEqual(summary, {'Test First Class': 1, 'Test Second Class': 1, 'Unclassified': 1})
+        first, second, failed = books
+        self.assertEqual((first.cgpa, first.honours_id.name), (5.0, 'Test First Class'))
+        # 22 points over 6 units, truncated
+        self.assertEqual((second.cgpa, second.honours_id.name), (3.66, 'Test Second Class'))
+        self.assertEqual((failed.cgpa, failed.honours_id), (0.0, self.env['quickledger.honour']))
+        self.assertEqual(self._books(self.later).cgpa, 0.0)
+
+    def test_wizard_classifies_the_cohort(self):
+        wizard = self.env['student.classification.wizard'].create({'programme_id': self.programme.id,
+                                                                   'session_id': self.sessions[1].id,
+                                                                   'level_id': self.level.id})
+        wizard.do_classify()
+        self.assertEqual((wizard.student_count, wizard.summary), (1, 'Test Second Class: 1'))
+        later = self._books(self.later)
+        self.assertEqual((later.cgpa, later.honours_id.name), (3.0, 'Test Second Class'))
+        self.assertEqual(self._books(self.first).cgpa, 0.0)
+
+
+@tagged('post_install', '-at_install')
+class TestResultPublication(QuickledgerResultCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestResultPublication, cls).setUpClass()
+        env = cls.env
+        env['quickledger.honour'].search([('id', 'not in', cls.honours.ids)]).unlink()
+        cls.other_faculty = env['quickledger.faculty'].create({'name': 'Test Other Faculty',
+                                                               'classification_id': cls.classification.id})
+        other_department = env['quickledger.department'].create({'name': 'Test Other Department', 'code': 'TSO',
+                                                                 'faculty_id': cls.other_faculty.id})
+        cls.other_programme = env['quickledger.programme'].create({'department_id': other_department.id,
+                                                                   'faculty_id': cls.other_faculty.id,
+                                                                   'diploma_id': cls.diploma.id})
+        cls.student, cls.orphan = cls._create_students('TRP', 2)
+        cls.outsider = env['quickledger.student'].create({'name': 'Test Outsider', 'matriculation_number': 'TRP/X',
+                                                          'programme_id': cls.other_programme.id})
+        Registration = env['student.registration']
+        cls.registration = Registration.create(cls._registration_vals(cls.student, cls.sessions[0]))
+        cls.pending = cls._add_result(cls.student, cls.courses[0], cls.sessions[0], 75, 'Pending', cls.registration)
+        cls.pending |= cls._add_result(cls.student, cls.courses[1], cls.sessions[0], 55, 'Pending', cls.registration)
+        cls.draft = cls._add_result(cls.student, cls.courses[2], cls.sessions[0], 30, 'Draft', cls.registration)
+        cls.later = cls._add_result(cls.student, cls.courses[3], cls.sessions[1], 75, 'Pending')
+        cls.outside = cls._add_result(cls.outsider, cls.courses[0], cls.sessions[0], 75, 'Pending')
+        cls.unassigned = cls._add_result(cls.orphan, cls.courses[0], cls.sessions[0], 75, 'Pending')
+        env['base'].flush()
+        env.cr.execute("UPDATE student_result_entry SET programme_id = NULL WHERE id = %s", (cls.unassigned.id,))
+        cls.unassigned.invalidate_cache()
+
+    def _publish(self, **scope):
+        publication = self.env['student.result.publication'].create(dict(scope, name='Test Publication',
+                                                                         session_id=self.sessions[0].id,
+                                                                         semester_id=self.semester.id))
+        publication._publish()
+        return publication
+
+    def assertStatus(self, results, status):
+        self.assertEqual(set(results.mapped('status')), {status})
+
+    def test_faculty_scope(self):
+        publication = self._publish(faculty_id=self.faculty.id)
+        self.assertEqual(publication.result_count, 2)
+        self.assertStatus(self.pending, 'Approved')
+        self.assertStatus(self.outside | self.unassigned | self.later, 'Pending')
+        self.assertStatus(self.draft, 'Draft')
+
+    def test_programme_scope(self):
+        publication = self._publish(programme_id=self.other_programme.id)
+        self.assertEqual(publication.result_count, 1)
+        self.assertStatus(self.outside, 'Approved')
+        self.assertStatus(self.pending | self.unassigned | self.later, 'Pending')
+
+    def test_unscoped_approves_results_without_programme(self):
+        publication = self._publish()
+        self.assertEqual(publication.result_count, 4)
+        self.assertStatus(self.pending | self.outside | self.unassigned, 'Approved')
+        self.assertStatus(self.later, 'Pending')
+        self.assertStatus(self.draft, 'Draft')
+
+    def test_publish_refreshes_gpa_and_cgpa(self):
+        self.assertEqual(self.registration.gpa, 0.0)
+        publication = self._publish(faculty_id=self.faculty.id)
+        self.assertEqual((publication.student_count, publication.registration_count), (1, 1))
+        self.assertEqual(self.registration.gpa, 4.0)
+        book = self.student.result_book_ids
+        self.assertEqual((book.cgpa, book.honours_id.name), (4.0, 'Test Second Class'))
+        self.assertEqual(publication.summary, 'Test Second Class: 1')
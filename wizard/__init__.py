@@ -1,3 +1,6 @@
 # -*- coding: utf-8 -*-
 from . import academic_payment_wizard
 from . import ledger_entry_wizard
+from . import student_photo_wizard
+from . import student_classification_wizard
+from . import student_score_sheet_wizard
@@ -3,6 +3,7 @@ from datetime import datetime
 from odoo import exceptions
 from odoo.exceptions import UserError, ValidationError
 import logging
+from ..models.instrumentation import instrumented
 
 _logger = logging.getLogger(__name__)
 
@@ -110,6 +111,7 @@ class AcademicPaymentWizard(models.TransientModel):
                 if not payment.teller_number:
                     raise ValidationError('Please provide Teller Number')
     
+    @instrumented('academic.payment.wizard.do_process_payment')
     def do_process_payment(self):
         self.ensure_one()
         AcademicPaymentEntry = self.env['academic.payment.entry']
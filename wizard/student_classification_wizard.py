@@ -0,0 +1,37 @@
+from odoo import fields, models
+from ..models.audit_log import buffered_audit
+import logging
+import time
+
+_logger = logging.getLogger(__name__)
+
+
+class StudentClassificationWizard(models.TransientModel):
+    _description = 'Class of Degree Wizard'
+    _name = 'student.classification.wizard'
+
+    programme_id = fields.Many2one('quickledger.programme', 'Programme', required=True)
+    session_id = fields.Many2one('academic.session', 'Session', required=True)
+    level_id = fields.Many2one('quickledger.level', 'Level', help="Only students registered at this level")
+    state = fields.Selection([('draft', 'Draft'), ('done', 'Done')], default='draft')
+    student_count = fields.Integer('Students Classified', readonly=True)
+    summary = fields.Text('Class of Degree', readonly=True)
+
+    def do_classify(self):
+        self.ensure_one()
+        started = time.perf_counter()
+        books = self.env['student.result']._search_cohort(self.programme_id, self.session_id, self.level_id)
+        with buffered_audit(self.env, "Class of degree {} {}".format(self.programme_id.name,
+                                                                     self.session_id.code)) as env:
+            summary = books.with_env(env).classify()
+        _logger.info("Classified %s students of %s %s in %.2fs", len(books), self.programme_id.name,
+                     self.session_id.code, time.perf_counter() - started)
+        self.write({'state': 'done', 'student_count': len(books),
+                    'summary': "\n".join("{}: {}".format(name, count) for name, count in sorted(summary.items()))})
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'new',
+        }
@@ -0,0 +1,121 @@
+from odoo import api, fields, models
+from odoo.exceptions import UserError
+from concurrent.futures import ProcessPoolExecutor
+import base64
+import io
+import logging
+import multiprocessing
+import os
+import zipfile
+from odoo.tools import image_process
+from ..models.models import PHOTO_SIZES
+
+_logger = logging.getLogger(__name__)
+
+PHOTO_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.bmp')
+
+
+def _matric_from_filename(filename):
+    """ NAU_2001_484557.jpg and NAU-2001-484557.jpg both stand for NAU/2001/484557 """
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    return stem.strip().upper().replace('_', '/').replace('-', '/')
+
+
+def _resize_batch(executor, names, datas):
+    """ (filename, photo values, error) of a batch of photos resized in the pool, one task per photo and size
+
+    The tasks run odoo.tools.image_process itself, which a spawned interpreter imports without the addons path
+    or a registry.
+    """
+    tasks = []
+    for name, data in zip(names, datas):
+        source = base64.b64encode(data)
+        tasks.append((name, {field: executor.submit(image_process, source, size)
+                             for field, size in PHOTO_SIZES.items()}))
+    for name, futures in tasks:
+        try:
+            yield name, {field: future.result() for field, future in futures.items()}, None
+        except Exception as e:
+            yield name, None, str(e)
+
+
+class StudentPhotoWizard(models.TransientModel):
+    _description = 'Passport Photo Upload'
+    _name = 'student.photo.wizard'
+
+    @api.model
+    def _default_workers(self):
+        return max(1, (os.cpu_count() or 2) - 1)
+
+    data = fields.Binary('Zip File', attachment=False)
+    filename = fields.Char('File Name')
+    workers = fields.Integer('Worker Processes', default=_default_workers)
+    batch_size = fields.Integer('Photos per Batch', default=200)
+    state = fields.Selection([('draft', 'Draft'), ('done', 'Done')], default='draft')
+    loaded_count = fields.Integer('Photos Loaded', readonly=True)
+    skipped_count = fields.Integer('Photos Skipped', readonly=True)
+    remarks = fields.Text('Remarks', readonly=True)
+
+    def _map_students(self, filenames):
+        """ Students keyed by upper-cased matric number for the photos in the archive, in one query """
+        matrics = tuple(set(_matric_from_filename(name) for name in filenames))
+        if not matrics:
+            return {}
+        self.env.cr.execute("""
+            SELECT upper(matriculation_number), id
+              FROM quickledger_student
+             WHERE upper(matriculation_number) IN %s
+        """, (matrics,))
+        return dict(self.env.cr.fetchall())
+
+    def _store_photos(self, results, students, skipped):
+        Student = self.env['quickledger.student']
+        loaded = 0
+        for filename, vals, error in results:
+            if error:
+                skipped.append("{}: {}".format(filename, error))
+                continue
+            Student.browse(students[_matric_from_filename(filename)]).write(vals)
+            loaded += 1
+        Student.flush()
+        Student.invalidate_cache(['image', 'image_medium', 'image_small'])
+        return loaded
+
+    def do_upload(self):
+        self.ensure_one()
+        if not self.data:
+            raise UserError("Select the zip file of passport photos to upload")
+        try:
+            archive = zipfile.ZipFile(io.BytesIO(base64.b64decode(self.data)))
+        except zipfile.BadZipFile:
+            raise UserError("{} is not a zip archive".format(self.filename or "The file"))
+
+        members = [info for info in archive.infolist() if not info.is_dir()
+                   and not info.filename.startswith('__MACOSX')
+                   and info.filename.lower().endswith(PHOTO_EXTENSIONS)]
+        students = self._map_students([info.filename for info in members])
+        skipped = ["{}: no student with matric number {}".format(info.filename, _matric_from_filename(info.filename))
+                   for info in members if _matric_from_filename(info.filename) not in students]
+        members = [info for info in members if _matric_from_filename(info.filename) in students]
+
+        loaded = 0
+        batch_size = max(1, self.batch_size)
+        # Spawned, not forked: a fork of a request worker would inherit its cursors, locks and threads
+        with ProcessPoolExecutor(max_workers=max(1, self.workers),
+                                 mp_context=multiprocessing.get_context('spawn')) as executor:
+            for index in range(0, len(members), batch_size):
+                batch = members[index:index + batch_size]
+                names = [info.filename for info in batch]
+                datas = [archive.read(info) for info in batch]
+                loaded += self._store_photos(_resize_batch(executor, names, datas), students, skipped)
+                _logger.info("Passport photos: %s/%s stored", min(index + batch_size, len(members)), len(members))
+
+        self.write({'state': 'done', 'data': False, 'loaded_count': loaded, 'skipped_count': len(skipped),
+                    'remarks': "\n".join(skipped)})
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'new',
+        }
@@ -0,0 +1,78 @@
+from odoo import api, fields, models
+from odoo.exceptions import UserError
+from ..models.audit_log import buffered_audit
+import base64
+import csv
+import io
+import logging
+import time
+
+_logger = logging.getLogger(__name__)
+
+# Score sheet column -> result entry field, the same keys add_student_result_entry takes
+SCORE_COLUMNS = {'exam': 'ca_score', 'test': 'test_score', 'practicals': 'practicals_score'}
+
+
+class StudentScoreSheetWizard(models.TransientModel):
+    _description = 'Score Sheet Upload'
+    _name = 'student.score.sheet.wizard'
+
+    course_id = fields.Many2one('programme.course.entry', 'Course', required=True)
+    session_id = fields.Many2one('academic.session', 'Session', required=True)
+    data = fields.Binary('Score Sheet', attachment=False)
+    filename = fields.Char('File Name')
+    state = fields.Selection([('draft', 'Draft'), ('done', 'Done')], default='draft')
+    updated_count = fields.Integer('Results Updated', readonly=True)
+    created_count = fields.Integer('Results Created', readonly=True)
+    skipped_count = fields.Integer('Rows Skipped', readonly=True)
+    remarks = fields.Text('Remarks', readonly=True)
+
+    @api.model
+    def _read_rows(self, content):
+        """ {reg #: {field: score}} of a CSV sheet with a reg_number column and any of exam, test, practicals """
+        try:
+            text = content.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            text = content.decode('latin-1')
+        reader = csv.DictReader(io.StringIO(text))
+        columns = {name.strip().lower(): name for name in reader.fieldnames or [] if name}
+        if 'reg_number' not in columns:
+            raise UserError("The score sheet needs a reg_number column")
+        if not set(columns) & set(SCORE_COLUMNS):
+            raise UserError("The score sheet needs at least one of the columns {}".format(", ".join(SCORE_COLUMNS)))
+
+        rows, skipped = {}, []
+        for line, row in enumerate(reader, start=2):
+            reg_number = (row.get(columns['reg_number']) or '').strip().upper()
+            if not reg_number:
+                continue
+            try:
+                rows[reg_number] = {field: float((row.get(columns[column]) or '').strip() or 0)
+                                    for column, field in SCORE_COLUMNS.items() if column in columns}
+            except ValueError:
+                skipped.append("Line {}: {} has a score that is not a number".format(line, reg_number))
+        return rows, skipped
+
+    def do_upload(self):
+        self.ensure_one()
+        if not self.data:
+            raise UserError("Select the score sheet to upload")
+        started = time.perf_counter()
+        rows, skipped = self._read_rows(base64.b64decode(self.data))
+        with buffered_audit(self.env, "Score sheet {} {}".format(self.course_id.code, self.session_id.code)) as env:
+            summary = env['student.result.entry'].apply_score_sheet(self.course_id, self.session_id, rows)
+        skipped += ["{}: not registered for {} in {}".format(reg_number, self.course_id.code, self.session_id.code)
+                    for reg_number in summary['unmatched']]
+        _logger.info("Score sheet %s %s: %s updated, %s created, %s skipped in %.2fs", self.course_id.code,
+                     self.session_id.code, summary['updated'], summary['created'], len(skipped),
+                     time.perf_counter() - started)
+        self.write({'state': 'done', 'data': False, 'updated_count': summary['updated'],
+                    'created_count': summary['created'], 'skipped_count': len(skipped),
+                    'remarks': "\n".join(skipped)})
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'new',
+        }